@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from reviews.models import ADMIN, MODERATOR, USER, User
+
+TOKEN_VERSION_CLAIM = 'ver'
+USER_CLAIMS = ('username', 'role', 'is_staff', 'is_superuser')
+
+
+class ClaimsAccessToken(AccessToken):
+    '''Access-токен, несущий всё, что нужно проверкам прав.'''
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class ClaimsUser(TokenUser):
+    '''Пользователь из подписанных claims, без запроса к базе.'''
+
+    @cached_property
+    def role(self):
+        return self.token.get('role', USER)
+
+    @property
+    def is_admin(self):
+        return self.role == ADMIN or self.is_staff
+
+    @property
+    def is_moderator(self):
+        return self.role == MODERATOR
+
+
+class TokenCache:
+    '''LRU проверенных токенов процесса, ключ - сырой токен.
+
+    Запись живёт не дольше exp токена; размер задаёт JWT_CACHE_SIZE,
+    0 отключает кеш.
+    '''
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(raw_token)
+                self.hits += 1
+                return entry[1:]
+            if entry is not None:
+                del self._entries[raw_token]
+            self.misses += 1
+            return None
+
+    def set(self, raw_token, validated_token, user):
+        maxsize = settings.JWT_CACHE_SIZE
+        if maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[raw_token] = (
+                validated_token['exp'], validated_token, user
+            )
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+
+token_cache = TokenCache()
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    '''Строит request.user из claims токена.
+
+    Актуальность прав проверяется по версии токена пользователя, которая
+    берётся из кеша: смена роли увеличивает версию, и старые токены
+    перестают приниматься. Токены без claims (выданные раньше)
+    обрабатываются как обычно - с загрузкой пользователя из базы.
+
+    Разобранные и проверенные токены кешируются в token_cache, так что
+    повторный запрос с тем же токеном не тратит время на подпись.
+    '''
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = token_cache.get(raw_token)
+        if cached is None:
+            validated_token = self.get_validated_token(raw_token)
+            user = self.get_user(validated_token)
+            token_cache.set(
+                raw_token,
+                validated_token,
+                user if isinstance(user, ClaimsUser) else None,
+            )
+            return user, validated_token
+
+        validated_token, user = cached
+        if user is None:
+            return self.get_user(validated_token), validated_token
+        self.check_token_version(validated_token)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        if (
+            TOKEN_VERSION_CLAIM not in validated_token
+            or api_settings.USER_ID_CLAIM not in validated_token
+        ):
+            return super().get_user(validated_token)
+        self.check_token_version(validated_token)
+        return ClaimsUser(validated_token)
+
+    def check_token_version(self, validated_token):
+        current_version = User.get_token_version(
+            validated_token[api_settings.USER_ID_CLAIM]
+        )
+        if current_version is None:
+            raise AuthenticationFailed(
+                'Пользователь не найден', code='user_not_found'
+            )
+        if validated_token[TOKEN_VERSION_CLAIM] != current_version:
+            raise AuthenticationFailed(
+                'Токен устарел, получите новый', code='token_outdated'
+            )
@@ -25,7 +25,9 @@ class TitleFilter(filters.FilterSet):
     search = filters.CharFilter(method='filter_search')
 
     ordering = filters.OrderingFilter(
-        fields=('name', 'year', 'rating', 'id'),
+        fields=(
+            'name', 'year', 'rating', 'weighted_rating', 'trending_score', 'id'
+        ),
     )
 
     class Meta:
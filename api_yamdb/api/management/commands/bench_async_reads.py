@@ -0,0 +1,124 @@
+import asyncio
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+
+ASYNC_PREFIX = '/api/v1/async/'
+SYNC_PREFIX = '/api/v1/'
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочное сравнение синхронных и асинхронных обработчиков '
+        'чтения: пропускная способность, задержки и пиковая память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='titles/',
+            help='Путь относительно /api/v1/, например titles/1/reviews/.',
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Число потоков-воркеров для синхронного варианта.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=64,
+            help='Число одновременных запросов в асинхронном варианте.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'].lstrip('/')
+        total = options['requests']
+        results = (
+            (
+                f"sync x{options['threads']}",
+                self.measure(
+                    self.run_sync, SYNC_PREFIX + path, total,
+                    options['threads'],
+                ),
+            ),
+            (
+                f"async x{options['concurrency']}",
+                self.measure(
+                    self.run_async, ASYNC_PREFIX + path, total,
+                    options['concurrency'],
+                ),
+            ),
+        )
+        self.stdout.write(
+            f"{'режим':<12}{'запр/с':>10}{'p50, мс':>10}{'p95, мс':>10}"
+            f"{'пик, МиБ':>10}{'запр/с/МиБ':>12}"
+        )
+        for name, (rps, latencies, peak) in results:
+            p50, p95 = self.percentiles(latencies)
+            self.stdout.write(
+                f'{name:<12}{rps:>10.1f}{p50:>10.1f}{p95:>10.1f}'
+                f'{peak:>10.2f}{rps / peak:>12.1f}'
+            )
+
+    def measure(self, runner, url, total, workers):
+        '''Прогоняет нагрузку, считая пик памяти Python через tracemalloc.
+
+        Сравнивать режимы честно при одинаковом пике: подберите
+        --threads и --concurrency так, чтобы колонки «пик» совпали.
+        '''
+        tracemalloc.start()
+        started = time.perf_counter()
+        latencies = runner(url, total, workers)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return total / elapsed, latencies, peak / 2 ** 20
+
+    def run_sync(self, url, total, workers):
+        def worker(count):
+            client = Client()
+            latencies = []
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    client.get(url)
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            return latencies
+
+        shares = [total // workers + (n < total % workers)
+                  for n in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [
+                latency
+                for latencies in executor.map(worker, shares)
+                for latency in latencies
+            ]
+
+    def run_async(self, url, total, concurrency):
+        async def load():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one():
+                async with semaphore:
+                    started = time.perf_counter()
+                    await client.get(url)
+                    return time.perf_counter() - started
+
+            return await asyncio.gather(*(one() for _ in range(total)))
+
+        return asyncio.run(load())
+
+    def percentiles(self, latencies):
+        cuts = statistics.quantiles(latencies, n=20)
+        return cuts[9] * 1000, cuts[18] * 1000
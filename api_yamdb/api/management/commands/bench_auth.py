@@ -0,0 +1,75 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.request import Request
+
+from api.authentication import (
+    ClaimsAccessToken,
+    StatelessJWTAuthentication,
+    token_cache,
+)
+from reviews.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер накладных расходов аутентификации на запрос: с кешем '
+        'проверенных JWT и без него'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='Чей токен использовать; по умолчанию первый активный.',
+        )
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument(
+            '--tokens',
+            type=int,
+            default=16,
+            help='Сколько разных токенов чередовать, как от разных клиентов.',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.first()
+        if user is None:
+            raise CommandError('Не найден активный пользователь.')
+
+        factory = RequestFactory()
+        requests = [
+            Request(factory.get(
+                '/', HTTP_AUTHORIZATION=(
+                    f'Bearer {ClaimsAccessToken.for_user(user)}'
+                )
+            ))
+            for _ in range(max(options['tokens'], 1))
+        ]
+        self.stdout.write(f"{'режим':<12}{'мкс/запрос':>12}{'p95, мкс':>10}")
+        for name, size in (('без кеша', 0), ('с кешем', 4096)):
+            token_cache.clear()
+            with override_settings(JWT_CACHE_SIZE=size):
+                latencies = self.measure(requests, options['requests'])
+            p95 = statistics.quantiles(latencies, n=20)[18]
+            self.stdout.write(
+                f'{name:<12}{statistics.fmean(latencies):>12.1f}'
+                f'{p95:>10.1f}'
+            )
+        self.stdout.write(
+            'Кеш токенов: попадания {hits}, промахи {misses}, '
+            'записей {size}'.format(**token_cache.stats())
+        )
+
+    def measure(self, requests, total):
+        authenticator = StatelessJWTAuthentication()
+        latencies = []
+        for number in range(total):
+            request = requests[number % len(requests)]
+            started = time.perf_counter()
+            authenticator.authenticate(request)
+            latencies.append((time.perf_counter() - started) * 1e6)
+        return latencies
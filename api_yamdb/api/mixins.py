@@ -1,6 +1,32 @@
-from rest_framework import mixins
+from contextlib import ExitStack, nullcontext
+from functools import cached_property
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from rest_framework import mixins, permissions, status
+from rest_framework.exceptions import MethodNotAllowed, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
 from rest_framework.viewsets import GenericViewSet
 
+from api_yamdb.db_routers import (
+    read_from,
+    replica_configured,
+    use_title_shard,
+)
+from reviews.deletion import schedule_deletion
+
+ASYNC_CHUNK_SIZE = 500
+STREAM_CHUNK_SIZE = 500
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+EXPAND_DEFAULT_LIMIT = 3
+
 
 class ModelMixinSet(
     mixins.CreateModelMixin,
@@ -13,3 +39,461 @@ class ModelMixinSet(
 
 class CreateViewSet(mixins.CreateModelMixin, GenericViewSet):
     pass
+
+
+class RequestContextMixin:
+    '''Держит контексты (реплика, шард) открытыми до конца запроса.
+
+    Контексты задают контекстные переменные, поэтому входить в них нужно
+    там же, где выполняется обработчик; строит их prepare_request - он
+    может обращаться к кешу и в асинхронном варианте уходит в поток.
+    '''
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.request_contexts:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        self.enter_request_contexts(
+            self.prepare_request(request, *args, **kwargs)
+        )
+
+    def prepare_request(self, request, *args, **kwargs):
+        '''Проверки DRF (права, троттлинг) и контексты запроса.'''
+        super().initial(request, *args, **kwargs)
+        return self.get_request_contexts(request)
+
+    def get_request_contexts(self, request):
+        return []
+
+    def enter_request_contexts(self, contexts):
+        for context in contexts:
+            self.request_contexts.enter_context(context)
+
+
+class ReplicaReadMixin(RequestContextMixin):
+    '''Отправляет безопасные запросы в реплику для чтения.
+
+    После успешной записи клиент на REPLICA_STICKY_SECONDS закрепляется
+    за основной базой, чтобы сразу видеть свои изменения.
+    '''
+
+    def get_request_contexts(self, request):
+        return [
+            *super().get_request_contexts(request),
+            self.get_read_database_context(request),
+        ]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (
+            replica_configured()
+            and request.method not in permissions.SAFE_METHODS
+            and response.status_code < 400
+        ):
+            cache.set(
+                self.get_replica_pin_key(request),
+                True,
+                settings.REPLICA_STICKY_SECONDS,
+            )
+        return response
+
+    def get_read_database_context(self, request):
+        if (
+            replica_configured()
+            and request.method in permissions.SAFE_METHODS
+            and not cache.get(self.get_replica_pin_key(request))
+        ):
+            return read_from(settings.REPLICA_DATABASE_ALIAS)
+        return nullcontext()
+
+    def get_replica_pin_key(self, request):
+        if request.user.is_authenticated:
+            client = f'user:{request.user.pk}'
+        else:
+            client = f"ip:{request.META.get('REMOTE_ADDR')}"
+        return f'replica-pin:{client}'
+
+
+class TitleShardMixin(RequestContextMixin):
+    '''Направляет запросы вложенных в произведение ресурсов в его шард.'''
+
+    def get_request_contexts(self, request):
+        return [
+            use_title_shard(self.kwargs.get('title_pk')),
+            *super().get_request_contexts(request),
+        ]
+
+
+class AsyncReadMixin(RequestContextMixin):
+    '''Асинхронные list/retrieve на async ORM для работы под ASGI.
+
+    Права, фильтры, пагинация и сериализаторы берутся те же, что и у
+    синхронного ViewSet; в поток уходят аутентификация, проверки DRF,
+    OPTIONS и проверка прав на объект.
+    '''
+
+    @classmethod
+    def as_async_view(cls, action, **initkwargs):
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            self.action_map = {'get': action, 'head': action}
+            return await self.adispatch(request, *args, **kwargs)
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        return view
+
+    async def adispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        with ExitStack() as self.request_contexts:
+            try:
+                if self.action is None:
+                    raise MethodNotAllowed(request.method)
+                await sync_to_async(lambda: request.user)()
+                self.enter_request_contexts(
+                    await sync_to_async(self.prepare_request)(
+                        request, *args, **kwargs
+                    )
+                )
+                handler = getattr(self, f'a{self.action}', None)
+                if handler is None:
+                    raise MethodNotAllowed(request.method)
+                response = await handler(request, *args, **kwargs)
+            except Exception as exc:
+                response = self.handle_exception(exc)
+            self.response = self.finalize_response(
+                request, response, *args, **kwargs
+            )
+        return self.response
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def ametadata(self, request, *args, **kwargs):
+        return await sync_to_async(self.options)(request, *args, **kwargs)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(await self.aget_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = await aget_object_or_404(
+            queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        await sync_to_async(self.check_object_permissions)(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(await self.aget_queryset())
+        page = await self.paginator.apaginate_queryset(
+            queryset, request, view=self
+        )
+        if page is not None:
+            serializer = await self.aget_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        objs = [
+            obj async for obj in queryset.aiterator(
+                chunk_size=ASYNC_CHUNK_SIZE
+            )
+        ]
+        serializer = await self.aget_serializer(objs, many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response((await self.aget_serializer(instance)).data)
+
+    async def aget_serializer(self, *args, **kwargs):
+        return self.get_serializer(*args, **kwargs)
+
+
+class BackgroundDestroyMixin:
+    '''С ?background=true destroy сразу скрывает объект и отвечает 202,
+    а его отзывы и комментарии порциями удаляет воркер run_deletions.'''
+    background_query_param = 'background'
+
+    def destroy(self, request, *args, **kwargs):
+        value = request.query_params.get(self.background_query_param, '')
+        if value.lower() not in TRUE_VALUES:
+            return super().destroy(request, *args, **kwargs)
+        job = schedule_deletion(self.get_object())
+        return Response(
+            {'deletion_job': job.pk, 'status': job.status},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class StreamingListMixin:
+    '''С ?stream=true list отдаёт всю выборку потоковым JSON-массивом.
+
+    Пагинация и её max_limit к потоку не применяются: объекты читаются
+    iterator() порциями по STREAM_CHUNK_SIZE (prefetch_related - на
+    порцию) и так же порциями сериализуются, поэтому память воркера не
+    зависит от размера выборки.
+    '''
+    stream_query_param = 'stream'
+
+    def streaming_requested(self, request):
+        value = request.query_params.get(self.stream_query_param, '')
+        return value.lower() in TRUE_VALUES
+
+    def get_streaming_queryset(self, queryset):
+        # Поток читается уже после выхода из dispatch, когда контексты
+        # реплики и шарда закрыты: базу выбираем заранее.
+        return queryset.using(queryset.db)
+
+    def list(self, request, *args, **kwargs):
+        if not self.streaming_requested(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.get_streaming_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        return StreamingHttpResponse(
+            self.stream_json(queryset), content_type='application/json'
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        if not self.streaming_requested(request):
+            return await super().alist(request, *args, **kwargs)
+        queryset = self.get_streaming_queryset(
+            self.filter_queryset(await self.aget_queryset())
+        )
+        return StreamingHttpResponse(
+            self.astream_json(queryset), content_type='application/json'
+        )
+
+    def render_chunk(self, serializer):
+        '''Порция объектов как элементы JSON-массива без скобок.'''
+        return JSONRenderer().render(serializer.data)[1:-1]
+
+    def stream_json(self, queryset):
+        objs = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+        yield b'['
+        separator = b''
+        while chunk := list(islice(objs, STREAM_CHUNK_SIZE)):
+            serializer = self.get_serializer(chunk, many=True)
+            yield separator + self.render_chunk(serializer)
+            separator = b','
+        yield b']'
+
+    async def astream_json(self, queryset):
+        yield b'['
+        separator = b''
+        chunk = []
+        async for obj in queryset.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+            chunk.append(obj)
+            if len(chunk) == STREAM_CHUNK_SIZE:
+                serializer = await self.aget_serializer(chunk, many=True)
+                yield separator + self.render_chunk(serializer)
+                separator = b','
+                chunk = []
+        if chunk:
+            serializer = await self.aget_serializer(chunk, many=True)
+            yield separator + self.render_chunk(serializer)
+        yield b']'
+
+
+def flatten_select_related(tree, prefix=''):
+    for name, subtree in tree.items():
+        yield prefix + name
+        yield from flatten_select_related(subtree, f'{prefix}{name}__')
+
+
+class SparseFieldsMixin:
+    '''?fields=a,b и ?omit=c для чтения: урезают ответ и сам запрос.
+
+    Из ответа убираются лишние поля сериализатора, из SQL - их столбцы
+    (через only()), а JOIN и prefetch для ненужных связей не выполняются.
+    '''
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def get_query_list(self, param):
+        value = self.request.query_params.get(param, '')
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    @cached_property
+    def sparse_fields(self):
+        '''Поля сериализатора по ?fields= и ?omit= или None.'''
+        if self.request.method not in permissions.SAFE_METHODS:
+            return None
+        fields = self.get_query_list(self.fields_query_param)
+        omit = self.get_query_list(self.omit_query_param)
+        if not fields and not omit:
+            return None
+        available = self.get_serializer_class()().fields
+        unknown = sorted((set(fields) | set(omit)) - set(available))
+        if unknown:
+            raise ValidationError(
+                {'fields': f"Неизвестные поля: {', '.join(unknown)}."}
+            )
+        return {
+            name: field for name, field in available.items()
+            if (not fields or name in fields) and name not in omit
+        }
+
+    def get_serializer(self, *args, **kwargs):
+        if self.sparse_fields is not None:
+            kwargs.setdefault('fields', list(self.sparse_fields))
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.sparse_fields is None:
+            return queryset
+        return self.trim_queryset(queryset, self.sparse_fields.values())
+
+    def trim_queryset(self, queryset, fields):
+        sources = set()
+        for field in fields:
+            if field.source == '*':
+                return queryset
+            sources.add(field.source.split('.')[0])
+
+        opts = queryset.model._meta
+        trimmed = queryset.only(opts.pk.name, *(
+            field.name for field in opts.concrete_fields
+            if field.name in sources
+        ))
+        if isinstance(queryset.query.select_related, dict):
+            # select_related() без аргументов включил бы все связи.
+            paths = [
+                path for path in flatten_select_related(
+                    queryset.query.select_related
+                )
+                if path.split('__')[0] in sources
+            ]
+            trimmed = trimmed.select_related(None)
+            if paths:
+                trimmed = trimmed.select_related(*paths)
+        return trimmed.prefetch_related(None).prefetch_related(*(
+            lookup for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0]
+            in sources
+        ))
+
+
+class ExpandMixin:
+    '''?expand=reviews:5,reviews.comments:3 встраивает в ответ первые N
+    дочерних объектов каждого родителя (по умолчанию EXPAND_DEFAULT_LIMIT).
+
+    expandable сопоставляет путь из related_name сериализатору дочерних
+    объектов. Каждый уровень раскрытия - один запрос на всю страницу:
+    Prefetch со срезом Django выполняет через
+    ROW_NUMBER() OVER (PARTITION BY родитель).
+    '''
+    expand_query_param = 'expand'
+    expandable = {}
+    expand_ordering = ('-pub_date',)
+
+    @cached_property
+    def expansions(self):
+        '''Запрошенные пути раскрытия и число объектов для каждого.'''
+        if self.request.method not in permissions.SAFE_METHODS:
+            return {}
+        value = self.request.query_params.get(self.expand_query_param, '')
+        expansions = {}
+        for item in filter(None, map(str.strip, value.split(','))):
+            path, _, limit = item.partition(':')
+            if path not in self.expandable:
+                raise ValidationError({'expand': (
+                    f'Нельзя раскрыть «{path}», доступно: '
+                    f"{', '.join(self.expandable)}."
+                )})
+            if not limit:
+                limit = EXPAND_DEFAULT_LIMIT
+            elif not limit.isdigit() or not (
+                1 <= int(limit) <= settings.EXPAND_MAX_LIMIT
+            ):
+                raise ValidationError({'expand': (
+                    f'Число объектов для «{path}» должно быть от 1 до '
+                    f'{settings.EXPAND_MAX_LIMIT}.'
+                )})
+            expansions[path] = int(limit)
+        for path in list(expansions):
+            while '.' in path:
+                path = path.rpartition('.')[0]
+                expansions.setdefault(path, EXPAND_DEFAULT_LIMIT)
+        return expansions
+
+    @staticmethod
+    def get_expand_attr(path):
+        return 'expanded_' + path.replace('.', '_')
+
+    def get_expand_prefetch(self, path, model):
+        name = path.rpartition('.')[2]
+        related_model = model._meta.get_field(name).related_model
+        queryset = related_model._default_manager.all()
+        if hasattr(queryset, 'with_author'):
+            queryset = queryset.with_author()
+        children = [
+            self.get_expand_prefetch(child, related_model)
+            for child in self.expansions
+            if child.rpartition('.')[0] == path
+        ]
+        queryset = queryset.prefetch_related(*children).order_by(
+            *self.expand_ordering
+        )
+        return Prefetch(
+            name,
+            queryset=queryset[:self.expansions[path]],
+            to_attr=self.get_expand_attr(path),
+        )
+
+    def get_expand_groups(self, objs):
+        '''Пары (контекст, объекты) для раскрытия, например по шардам.'''
+        return [(nullcontext(), objs)]
+
+    def expand_objects(self, objs):
+        top_level = [path for path in self.expansions if '.' not in path]
+        objs = [
+            obj for obj in objs
+            if not hasattr(obj, self.get_expand_attr(top_level[0]))
+        ]
+        if not objs:
+            return
+        model = type(objs[0])
+        for context, group in self.get_expand_groups(objs):
+            with context:
+                prefetch_related_objects(group, *(
+                    self.get_expand_prefetch(path, model)
+                    for path in top_level
+                ))
+
+    def add_expanded_fields(self, serializer, parent=''):
+        for path, serializer_class in self.expandable.items():
+            if path in self.expansions and path.rpartition('.')[0] == parent:
+                field = serializer_class(
+                    many=True,
+                    read_only=True,
+                    source=self.get_expand_attr(path),
+                )
+                self.add_expanded_fields(field.child, path)
+                serializer.fields[path.rpartition('.')[2]] = field
+
+    def get_serializer(self, *args, **kwargs):
+        if not self.expansions or not args or args[0] is None:
+            return super().get_serializer(*args, **kwargs)
+        instance, *args = args
+        if isinstance(instance, QuerySet):
+            instance = list(instance)
+        self.expand_objects(
+            instance if kwargs.get('many') else [instance]
+        )
+        serializer = super().get_serializer(instance, *args, **kwargs)
+        self.add_expanded_fields(
+            serializer.child if isinstance(serializer, ListSerializer)
+            else serializer
+        )
+        return serializer
+
+    async def aget_serializer(self, *args, **kwargs):
+        if not self.expansions:
+            return await super().aget_serializer(*args, **kwargs)
+        return await sync_to_async(self.get_serializer)(*args, **kwargs)
@@ -0,0 +1,260 @@
+import hashlib
+import heapq
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from api_yamdb.db_routers import SHARDED_MODELS, map_review_databases
+from api_yamdb.db_stats import estimate_count, queryset_tables, table_versions
+
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+
+def positive_int(value, cutoff):
+    '''Целое от 1 до cutoff; больше cutoff урезается, остальное -
+    ValueError.'''
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return min(number, cutoff)
+
+
+def read_pages(queryset, size):
+    '''Первые size строк queryset из каждой базы, где лежит его модель.'''
+    if queryset.model._meta.label_lower not in SHARDED_MODELS:
+        return [list(queryset[:size])]
+    return map_review_databases(
+        lambda alias: list(queryset.using(alias)[:size])
+    )
+
+
+class LimitOffsetPagination(pagination.LimitOffsetPagination):
+    '''LimitOffset с кешированием и оценкой общего числа объектов.
+
+    Точный COUNT(*) кешируется по тексту запроса и версиям таблиц, от
+    которых он зависит; сигналы увеличивают версию таблицы при записи.
+    Для больших выборок вместо COUNT(*) берётся оценка СУБД, о чём
+    говорит заголовок X-Total-Count-Estimated. С ?count=false общее
+    число не считается вовсе, а наличие следующей страницы определяется
+    по лишней строке. ?limit больше PAGINATION_MAX_LIMIT урезается до
+    него; выгружать всё разом можно потоком (StreamingListMixin).
+    '''
+    count_query_param = 'count'
+    estimated_count_header = 'X-Total-Count-Estimated'
+
+    @property
+    def max_limit(self):
+        return settings.PAGINATION_MAX_LIMIT
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        if not self.count_requested(request):
+            return self.page_without_count(
+                list(queryset[self.offset:self.offset + self.limit + 1])
+            )
+        self.count = self.get_count(queryset)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return list(queryset[self.offset:self.offset + self.limit])
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        '''Асинхронный аналог paginate_queryset на async ORM.'''
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        if not self.count_requested(request):
+            page = queryset[self.offset:self.offset + self.limit + 1]
+            return self.page_without_count(
+                [obj async for obj in page.aiterator(
+                    chunk_size=self.limit + 1
+                )]
+            )
+        self.count = await sync_to_async(self.get_count)(queryset)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0 or self.offset > self.count:
+            return []
+        page = queryset[self.offset:self.offset + self.limit]
+        return [obj async for obj in page.aiterator(chunk_size=self.limit)]
+
+    def count_requested(self, request):
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() not in FALSE_VALUES
+
+    def page_without_count(self, objs):
+        self.count = None
+        self.count_estimated = False
+        self.has_next = len(objs) > self.limit
+        return objs[:self.limit]
+
+    def get_count(self, queryset):
+        key = self.get_count_cache_key(queryset)
+        cached = cache.get(key)
+        if cached is None:
+            estimate = estimate_count(queryset)
+            if estimate is None:
+                cached = (super().get_count(queryset), False)
+            else:
+                cached = (estimate, True)
+            cache.set(key, cached, settings.COUNT_CACHE_TIMEOUT)
+        self.count, self.count_estimated = cached
+        return self.count
+
+    def get_count_cache_key(self, queryset):
+        # Выбранные столбцы и JOIN для select_related на число строк не
+        # влияют: ключ не должен от них зависеть.
+        queryset = queryset.order_by().values('pk')
+        sql, params = queryset.query.sql_with_params()
+        tables = queryset_tables(queryset)
+        digest = hashlib.md5(
+            repr((
+                queryset.db, sql, params, tables, table_versions(tables)
+            )).encode()
+        ).hexdigest()
+        return f'count:{digest}'
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = replace_query_param(
+            self.request.build_absolute_uri(),
+            self.limit_query_param,
+            self.limit,
+        )
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count_estimated:
+            response[self.estimated_count_header] = 'true'
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count']['nullable'] = True
+        return schema
+
+
+class KeysetPagination(pagination.BasePagination):
+    '''Постраничный вывод по ключу (pub_date, id) от новых к старым.
+
+    Курсор хранит ключ последней строки страницы, и следующая страница
+    выбирается условием «строго раньше него»: запрос идёт по индексу
+    с pub_date и стоит одинаково на любой глубине, без OFFSET и COUNT(*).
+    paginate_querysets сливает несколько моделей в одну ленту: каждая
+    читается своим запросом по индексу, а готовые страницы сливаются через
+    heapq.merge. Отзывы и комментарии, разложенные по шардам, так же
+    читаются из всех баз параллельно.
+    '''
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        cursor = self.decode_cursor(request)
+        pages = []
+        for queryset in querysets:
+            queryset = queryset.order_by('-pub_date', '-pk')
+            if cursor is not None:
+                queryset = self.after_cursor(queryset, *cursor)
+            pages.extend(read_pages(queryset, self.limit + 1))
+        page = list(islice(
+            heapq.merge(*pages, key=self.get_key, reverse=True),
+            self.limit + 1,
+        ))
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+        self.last = page[-1] if page else None
+        return page
+
+    @staticmethod
+    def after_cursor(queryset, pub_date, model_name, pk):
+        # Диапазон по pub_date идёт по индексу, строки с той же датой
+        # доотсекаются по остатку ключа (модель, id).
+        queryset = queryset.filter(pub_date__lte=pub_date)
+        own_name = queryset.model._meta.model_name
+        if own_name == model_name:
+            return queryset.exclude(pub_date=pub_date, pk__gte=pk)
+        if own_name > model_name:
+            return queryset.exclude(pub_date=pub_date)
+        return queryset
+
+    @staticmethod
+    def get_key(obj):
+        return obj.pub_date, obj._meta.model_name, obj.pk
+
+    def get_limit(self, request):
+        try:
+            return positive_int(
+                request.query_params[self.limit_query_param],
+                settings.PAGINATION_MAX_LIMIT,
+            )
+        except (KeyError, ValueError):
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, model_name, pk = urlsafe_b64decode(
+                encoded.encode()
+            ).decode().split('|')
+            return datetime.fromisoformat(pub_date), model_name, int(pk)
+        except ValueError as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+    def encode_cursor(self, obj):
+        pub_date, model_name, pk = self.get_key(obj)
+        value = f'{pub_date.isoformat()}|{model_name}|{pk}'
+        return urlsafe_b64encode(value.encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.last),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -7,6 +7,14 @@ class AdminOnly(permissions.BasePermission):
         return request.user.is_authenticated and request.user.is_admin
 
 
+class ModeratorOnly(permissions.BasePermission):
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and (
+            request.user.is_moderator or request.user.is_admin
+        )
+
+
 class IsAdminUserOrReadOnly(permissions.BasePermission):
 
     def has_permission(self, request, view):
@@ -22,7 +30,7 @@ class AdminModeratorAuthorPermission(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (
             request.method in permissions.SAFE_METHODS
-            or obj.author == request.user
+            or obj.author_id == request.user.pk
             or request.user.is_moderator
             or request.user.is_admin
         )
@@ -1,21 +1,58 @@
 from datetime import datetime
 
+from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
 from rest_framework import serializers
 from rest_framework.exceptions import NotFound, ValidationError
 
+from api.authentication import ClaimsAccessToken
 from api.constants import CONF_CODE_MAX_LENGTH
 from reviews.constants import EMAIL_MAX_LENGTH
 from api.validators import (
+    email_unique_validator,
     username_unique_validator,
     username_validator,
     validate_username_not_me,
 )
+from reviews.bloom import EMAIL, USERNAME, user_names
 from reviews.constants import USERNAME_MAX_LENGTH
-from reviews.models import Category, Comment, Genre, Review, Title, User
+from reviews.models import (
+    Category,
+    Comment,
+    DuplicateReview,
+    Genre,
+    Review,
+    Title,
+    User,
+)
+
+# Служебные столбцы, которых нет в ответах API: номер изменения для
+# /sync/, счётчики рейтинга и популярности, отметка фонового удаления.
+# Новое служебное поле модели с exclude нужно добавить сюда же.
+REVIEW_SERVICE_FIELDS = ('change_seq',)
+TITLE_SERVICE_FIELDS = (
+    'review_count',
+    'score_total',
+    'trending_score',
+    'change_seq',
+    'pending_deletion',
+)
+
+
+class SparseFieldsetMixin:
+    '''Оставляет в сериализаторе только поля из аргумента fields.'''
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
-class UsersSerializer(serializers.ModelSerializer):
+
+class UsersSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     username = serializers.CharField(
         max_length=USERNAME_MAX_LENGTH,
         validators=[
@@ -24,6 +61,9 @@ class UsersSerializer(serializers.ModelSerializer):
             username_unique_validator,
         ],
     )
+    email = serializers.EmailField(
+        max_length=EMAIL_MAX_LENGTH, validators=[email_unique_validator]
+    )
 
     class Meta:
         model = User
@@ -36,6 +76,32 @@ class UsersSerializer(serializers.ModelSerializer):
             'role',
         )
 
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError as exc:
+            # Тот же username или email успели занять параллельно:
+            # уникальность проверила база.
+            raise serializers.ValidationError(
+                'Пользователь с таким username или email уже существует.'
+            ) from exc
+
+
+class UsernameAvailabilitySerializer(serializers.Serializer):
+    username = serializers.CharField(
+        max_length=USERNAME_MAX_LENGTH,
+        validators=(username_validator, validate_username_not_me),
+    )
+
+    def to_representation(self, data):
+        username = data['username']
+        available = not (
+            user_names.might_exist(USERNAME, username)
+            and User.objects.filter(username=username).exists()
+        )
+        return {'username': username, 'available': available}
+
 
 class GetTokenSerializer(serializers.Serializer):
     username = serializers.CharField(
@@ -62,6 +128,9 @@ class GetTokenSerializer(serializers.Serializer):
         data['user'] = user
         return data
 
+    def create(self, validated_data):
+        return ClaimsAccessToken.for_user(validated_data['user'])
+
 
 class SignUpSerializer(serializers.Serializer):
     username = serializers.CharField(
@@ -71,24 +140,53 @@ class SignUpSerializer(serializers.Serializer):
     email = serializers.EmailField(max_length=EMAIL_MAX_LENGTH)
 
     def validate(self, data):
-        username = data.get('username')
-        email = data.get('email')
+        # «Точно нет» фильтра может отстать от базы на только что
+        # закоммиченного пользователя: тогда save() получит IntegrityError
+        # и проверит заново.
+        if (
+            user_names.might_exist(USERNAME, data['username'])
+            or user_names.might_exist(EMAIL, data['email'])
+        ):
+            self.check_existing_users(data)
+        return data
+
+    def check_existing_users(self, data):
+        username = data['username']
+        email = data['email'].lower()
         errors = {}
-        username_user = User.objects.filter(username=username).first()
-        if username_user and username_user.email.lower() != email.lower():
-            errors['username'] = (
-                'Пользователь с таким username уже существует.'
-            )
-        email_user = User.objects.filter(email__iexact=email).first()
-        if email_user and email_user.username != username:
-            errors['email'] = 'Пользователь с таким email уже существует.'
+        # Один запрос по индексам username и lower(email) находит и
+        # конфликты, и уже зарегистрированного пользователя.
+        matches = (
+            User.objects.alias(email_lower=Lower('email'))
+            .filter(Q(username=username) | Q(email_lower=email))
+            .order_by()[:2]
+        )
+        for user in matches:
+            same_email = user.email.lower() == email
+            if user.username == username and same_email:
+                self.instance = user
+            elif user.username == username:
+                errors['username'] = (
+                    'Пользователь с таким username уже существует.'
+                )
+            else:
+                errors['email'] = 'Пользователь с таким email уже существует.'
         if errors:
             raise serializers.ValidationError(errors)
-        return data
 
     def save(self):
-        user, _ = User.objects.get_or_create(**self.validated_data)
-        return user
+        if self.instance is not None:
+            return self.instance
+        try:
+            with transaction.atomic():
+                self.instance = User.objects.create(**self.validated_data)
+        except IntegrityError:
+            # Тот же username или email успели занять параллельно, либо
+            # о пользователе ещё не знает фильтр Блума.
+            self.check_existing_users(self.validated_data)
+            if self.instance is None:
+                raise
+        return self.instance
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -103,14 +201,14 @@ class GenreSerializer(serializers.ModelSerializer):
         fields = ('name', 'slug')
 
 
-class TitleReadSerializer(serializers.ModelSerializer):
+class TitleReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     genre = GenreSerializer(read_only=True, many=True)
     rating = serializers.IntegerField(read_only=True, default=0)
 
     class Meta:
         model = Title
-        fields = '__all__'
+        exclude = TITLE_SERVICE_FIELDS
 
 
 class TitleWriteSerializer(serializers.ModelSerializer):
@@ -127,7 +225,7 @@ class TitleWriteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Title
-        fields = '__all__'
+        exclude = TITLE_SERVICE_FIELDS
 
     def validate_year(self, value):
         current_year = datetime.now().year
@@ -141,14 +239,36 @@ class TitleWriteSerializer(serializers.ModelSerializer):
         return TitleReadSerializer(instance, context=self.context).data
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class TitleIdsSerializer(serializers.Serializer):
+    '''Список id из ?ids=1,2,3 без повторов и в порядке запроса.'''
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        try:
+            ids = [int(pk) for pk in value.split(',') if pk.strip()]
+        except ValueError as exc:
+            raise serializers.ValidationError(
+                'Идентификаторы должны быть целыми числами через запятую.'
+            ) from exc
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            raise serializers.ValidationError('Не указан ни один id.')
+        if len(ids) > settings.TITLES_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(
+                'За один запрос можно получить не больше '
+                f'{settings.TITLES_BATCH_MAX_SIZE} произведений.'
+            )
+        return ids
+
+
+class ReviewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         slug_field='username', read_only=True
     )
 
     class Meta:
         model = Review
-        exclude = ('title',)
+        exclude = ('title', *REVIEW_SERVICE_FIELDS)
 
     def validate(self, data):
         request = self.context.get('request')
@@ -158,7 +278,7 @@ class ReviewSerializer(serializers.ModelSerializer):
             title_pk = view.kwargs.get('title_pk')
             if title_pk and request.user:
                 if Review.objects.filter(
-                    author=request.user, title_id=title_pk
+                    author_id=request.user.pk, title_id=title_pk
                 ).exists():
                     raise serializers.ValidationError(
                         'Вы уже оставили отзыв на это произведение!'
@@ -166,7 +286,21 @@ class ReviewSerializer(serializers.ModelSerializer):
         return data
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class ReviewTitleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Title
+        fields = ('id', 'name', 'year')
+
+
+class UserReviewSerializer(ReviewSerializer):
+    title = ReviewTitleSerializer(read_only=True)
+
+    class Meta:
+        model = Review
+        fields = ('id', 'title', 'text', 'author', 'score', 'pub_date')
+
+
+class CommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         slug_field='username', read_only=True
     )
@@ -174,3 +308,82 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ('id', 'text', 'author', 'pub_date')
+
+
+class ActivitySerializer(serializers.BaseSerializer):
+    '''Отзыв или комментарий в общей ленте активности.'''
+
+    def to_representation(self, instance):
+        if isinstance(instance, Review):
+            data = ReviewSerializer(instance, context=self.context).data
+            data['title'] = instance.title_id
+        else:
+            data = CommentSerializer(instance, context=self.context).data
+            data['title'] = instance.review.title_id
+            data['review'] = instance.review_id
+        return {'type': instance._meta.model_name, **data}
+
+
+class DuplicateReviewSerializer(serializers.ModelSerializer):
+    '''Пара похожих отзывов. Сами отзывы вьюсет загружает заранее в
+    context['reviews']: они могут лежать в разных шардах.'''
+    review = serializers.SerializerMethodField()
+    duplicate = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DuplicateReview
+        fields = ('id', 'review', 'duplicate', 'similarity', 'detected_at')
+
+    def get_review(self, obj):
+        return self.review_data(obj.review_id)
+
+    def get_duplicate(self, obj):
+        return self.review_data(obj.duplicate_id)
+
+    def review_data(self, review_id):
+        review = self.context['reviews'].get(review_id)
+        if review is None:
+            return None
+        return UserReviewSerializer(review, context=self.context).data
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_limit(self, value):
+        return min(value, settings.SYNC_BATCH_SIZE)
+
+
+class SyncCategorySerializer(CategorySerializer):
+    class Meta(CategorySerializer.Meta):
+        fields = ('id', 'name', 'slug')
+
+
+class SyncGenreSerializer(GenreSerializer):
+    class Meta(GenreSerializer.Meta):
+        fields = ('id', 'name', 'slug')
+
+
+class SyncTitleSerializer(serializers.ModelSerializer):
+    '''Произведение со ссылками на категорию и жанры по id: их имена
+    клиент берёт из своей копии, и переименование не меняет произведения.
+    '''
+    rating = serializers.IntegerField(read_only=True, default=0)
+
+    class Meta:
+        model = Title
+        fields = (
+            'id', 'name', 'year', 'description', 'category', 'genre', 'rating'
+        )
+
+
+class SyncReviewSerializer(ReviewSerializer):
+    class Meta:
+        model = Review
+        fields = ('id', 'title', 'text', 'author', 'score', 'pub_date')
+
+
+class SyncCommentSerializer(CommentSerializer):
+    class Meta(CommentSerializer.Meta):
+        fields = ('id', 'review', 'text', 'author', 'pub_date')
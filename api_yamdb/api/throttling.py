@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def shared_counters(cache):
+    '''Атомарный incr, общий для всех воркеров, есть только у Redis и
+    Memcached; у LocMemCache ведра свои в каждом процессе.'''
+    return isinstance(cache, (BaseMemcachedCache, RedisCache))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    '''Ведро токенов на атомарных счётчиках кеша.
+
+    Ставка 'N/period' означает ведро на N запросов, которое равномерно
+    пополняется за period. Ведро - два счётчика: запросы текущего и
+    прошлого окна длиной period; прошлое окно учитывается с весом,
+    линейно убывающим до нуля к концу текущего, - это и есть равномерное
+    пополнение. Запрос сначала берёт токен через cache.incr и
+    возвращает его при отказе, поэтому одновременные запросы не
+    проходят все по одному прочитанному значению.
+
+    При ошибке кеша, а с THROTTLE_REQUIRE_SHARED_CACHE - и при кеше без
+    общих счётчиков, запросы отклоняются.
+    '''
+    cache_alias = DEFAULT_CACHE_ALIAS
+    timer = time.time
+    scope = None
+    THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+
+    def __init__(self):
+        self.capacity, self.period = self.parse_rate(
+            self.THROTTLE_RATES[self.scope]
+        )
+        self.wait_seconds = None
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        return int(num), DURATIONS[period[0]]
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        if (
+            settings.THROTTLE_REQUIRE_SHARED_CACHE
+            and not shared_counters(self.cache)
+        ):
+            logger.error(
+                f'Троттлинг {self.scope} отклоняет запросы: кеш '
+                f'{self.cache_alias} не общий для воркеров.'
+            )
+            return self.reject(self.period)
+
+        window, elapsed = divmod(self.timer(), self.period)
+        current_key = f'{key}:{int(window)}'
+        try:
+            self.cache.add(current_key, 0, 2 * self.period)
+            used = self.cache.incr(current_key)
+            previous = self.cache.get(f'{key}:{int(window) - 1}', 0)
+            weight = 1 - elapsed / self.period
+            if previous * weight + used <= self.capacity:
+                return True
+            self.cache.decr(current_key)
+        except Exception:
+            logger.exception(f'Кеш троттлинга {self.scope} недоступен')
+            return self.reject(self.period)
+        # Токен появится, когда вес прошлого окна опустится достаточно;
+        # если его не хватит - к началу следующего окна.
+        free = self.capacity - used
+        wait = self.period - elapsed
+        if previous and free >= 0:
+            wait = min(wait, self.period * (1 - free / previous) - elapsed)
+        return self.reject(wait)
+
+    def reject(self, wait):
+        self.wait_seconds = wait
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+
+    def get_cache_key(self, request, view):
+        return f'throttle:{self.scope}:{self.get_ident(request)}'
+
+
+class RequestFieldThrottle(TokenBucketThrottle):
+    '''Ведро на значение поля запроса, например username или email.'''
+    field = None
+
+    def get_cache_key(self, request, view):
+        value = request.data.get(self.field)
+        if not isinstance(value, str) or not value:
+            return None
+        digest = hashlib.sha256(value.strip().lower().encode()).hexdigest()
+        return f'throttle:{self.scope}:{digest}'
+
+
+class SignupIPThrottle(IPThrottle):
+    scope = 'signup_ip'
+
+
+class SignupUsernameThrottle(RequestFieldThrottle):
+    scope = 'signup_username'
+    field = 'username'
+
+
+class SignupEmailThrottle(RequestFieldThrottle):
+    scope = 'signup_email'
+    field = 'email'
+
+
+class TokenIPThrottle(IPThrottle):
+    scope = 'token_ip'
+
+
+class TokenUsernameThrottle(RequestFieldThrottle):
+    scope = 'token_username'
+    field = 'username'
+
+
+class UsernameCheckIPThrottle(IPThrottle):
+    scope = 'username_check'
@@ -2,8 +2,10 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
 
-from api.views import (APIGetToken, APISignup, CategoryViewSet, CommentViewSet,
-                       GenreViewSet, ReviewViewSet, TitleViewSet, UsersViewSet)
+from api.views import (APIActivity, APIGetToken, APISignup, APISync,
+                       APIUsernameAvailable, CategoryViewSet, CommentViewSet,
+                       DuplicateReviewViewSet, GenreViewSet, ReviewViewSet,
+                       TitleViewSet, UsersViewSet)
 
 app_name = 'api'
 
@@ -12,6 +14,11 @@ v1_router.register('users', UsersViewSet, basename='users')
 v1_router.register('categories', CategoryViewSet, basename='categories')
 v1_router.register('genres', GenreViewSet, basename='genres')
 v1_router.register('titles', TitleViewSet, basename='titles')
+v1_router.register(
+    'moderation/duplicates',
+    DuplicateReviewViewSet,
+    basename='duplicate-reviews',
+)
 
 titles_router = routers.NestedDefaultRouter(
     v1_router, 'titles', lookup='title'
@@ -23,16 +30,58 @@ reviews_router = routers.NestedDefaultRouter(
 )
 reviews_router.register('comments', CommentViewSet, basename='review-comments')
 
+# Асинхронные варианты чтения для запуска под ASGI.
+async_urlpatterns = [
+    path(
+        'titles/',
+        TitleViewSet.as_async_view('list'),
+        name='async-titles-list',
+    ),
+    path(
+        'titles/<int:pk>/',
+        TitleViewSet.as_async_view('retrieve'),
+        name='async-titles-detail',
+    ),
+    path(
+        'titles/<int:title_pk>/reviews/',
+        ReviewViewSet.as_async_view('list'),
+        name='async-title-reviews-list',
+    ),
+    path(
+        'titles/<int:title_pk>/reviews/<int:pk>/',
+        ReviewViewSet.as_async_view('retrieve'),
+        name='async-title-reviews-detail',
+    ),
+    path(
+        'titles/<int:title_pk>/reviews/<int:review_pk>/comments/',
+        CommentViewSet.as_async_view('list'),
+        name='async-review-comments-list',
+    ),
+    path(
+        'titles/<int:title_pk>/reviews/<int:review_pk>/comments/<int:pk>/',
+        CommentViewSet.as_async_view('retrieve'),
+        name='async-review-comments-detail',
+    ),
+]
+
 auth_urlpatterns = [
     path('signup/', APISignup.as_view(), name='signup'),
     path('token/', APIGetToken.as_view(), name='get_token'),
+    path(
+        'username-available/',
+        APIUsernameAvailable.as_view(),
+        name='username_available',
+    ),
 ]
 
 v1_urlpatterns = [
     path('', include(v1_router.urls)),
     path('', include(titles_router.urls)),
     path('', include(reviews_router.urls)),
+    path('activity/', APIActivity.as_view(), name='activity'),
+    path('sync/', APISync.as_view(), name='sync'),
     path('auth/', include(auth_urlpatterns)),
+    path('async/', include(async_urlpatterns)),
 ]
 
 urlpatterns = [
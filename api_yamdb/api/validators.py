@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator
+from django.db.models.functions import Lower
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
@@ -13,11 +14,27 @@ username_validator = RegexValidator(
     message='Введите корректное имя пользователя.',
 )
 
+
+class LowerUniqueValidator(UniqueValidator):
+    '''Уникальность без учёта регистра по функциональному индексу
+    lower(поле): lookup iexact дал бы LIKE или UPPER() мимо индекса.'''
+
+    def filter_queryset(self, value, queryset, field_name):
+        return queryset.alias(value_lower=Lower(field_name)).filter(
+            value_lower=value.lower()
+        )
+
+
 username_unique_validator = UniqueValidator(
     queryset=User.objects.all(),
     message='Пользователь с таким username уже существует',
 )
 
+email_unique_validator = LowerUniqueValidator(
+    queryset=User.objects.all(),
+    message='Пользователь с таким email уже существует',
+)
+
 
 def validate_username_not_me(value):
     if value == USERNAME_RESTRICTED_SLUG:
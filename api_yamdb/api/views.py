@@ -1,11 +1,18 @@
+import heapq
 import logging
+from collections import defaultdict
+from itertools import islice
+from operator import itemgetter
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
-from django.db.models import Avg
-from django.shortcuts import get_object_or_404
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.http import Http404
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import permissions, status, viewsets
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
@@ -14,30 +21,85 @@ from rest_framework.views import APIView
 
 from api.constants import NOREPLY_EMAIL
 from api.filters import TitleFilter
-from api.mixins import ModelMixinSet
+from api.mixins import (
+    AsyncReadMixin,
+    BackgroundDestroyMixin,
+    ExpandMixin,
+    ModelMixinSet,
+    ReplicaReadMixin,
+    SparseFieldsMixin,
+    StreamingListMixin,
+    TitleShardMixin,
+)
+from api.pagination import KeysetPagination, read_pages
 from api.permissions import (
     AdminModeratorAuthorPermission,
     AdminOnly,
     IsAdminUserOrReadOnly,
+    ModeratorOnly,
 )
 from api.serializers import (
+    ActivitySerializer,
     CategorySerializer,
     CommentSerializer,
+    DuplicateReviewSerializer,
     GenreSerializer,
     GetTokenSerializer,
     ReviewSerializer,
     SignUpSerializer,
+    SyncCategorySerializer,
+    SyncCommentSerializer,
+    SyncGenreSerializer,
+    SyncQuerySerializer,
+    SyncReviewSerializer,
+    SyncTitleSerializer,
+    TitleIdsSerializer,
     TitleReadSerializer,
     TitleWriteSerializer,
+    UsernameAvailabilitySerializer,
+    UserReviewSerializer,
     UsersSerializer,
 )
-from reviews.models import Category, Genre, Review, Title, User
+from api.throttling import (
+    SignupEmailThrottle,
+    SignupIPThrottle,
+    SignupUsernameThrottle,
+    TokenIPThrottle,
+    TokenUsernameThrottle,
+    UsernameCheckIPThrottle,
+)
+from api_yamdb.db_routers import (
+    shard_for_title,
+    sharding_enabled,
+    use_title_shard,
+)
+from reviews.constants import TOMBSTONE_HORIZON_SEQUENCE
+from reviews.deletion import (
+    title_database,
+    visible_comments,
+    visible_reviews,
+)
+from reviews.models import (
+    Category,
+    ChangeReservation,
+    DuplicateReview,
+    Genre,
+    Review,
+    Sequence,
+    Title,
+    Tombstone,
+    User,
+)
+from reviews.outbox import enqueue_email
+from reviews.recommendations import recommend
 
 logger = logging.getLogger(__name__)
 
 
-class UsersViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+class UsersViewSet(
+    BackgroundDestroyMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
+    queryset = User.objects.filter(pending_deletion=False)
     serializer_class = UsersSerializer
     permission_classes = (
         permissions.IsAuthenticated,
@@ -55,24 +117,83 @@ class UsersViewSet(viewsets.ModelViewSet):
         url_path='me',
     )
     def get_current_user_info(self, request):
+        user = get_object_or_404(User, pk=request.user.pk)
         if request.method == 'PATCH':
             serializer = UsersSerializer(
-                request.user,
+                user,
                 data=request.data,
                 partial=True,
                 context={'request': request},
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save(role=request.user.role)
+            serializer.save(role=user.role)
             return Response(serializer.data, status=status.HTTP_200_OK)
-        serializer = UsersSerializer(
-            request.user, context={'request': request}
+        serializer = UsersSerializer(user, context={'request': request})
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='me/reviews',
+        serializer_class=UserReviewSerializer,
+        pagination_class=KeysetPagination,
+    )
+    def my_reviews(self, request):
+        return self.list_reviews(request.user.pk)
+
+    @action(
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='me/recommendations',
+        serializer_class=TitleReadSerializer,
+    )
+    def my_recommendations(self, request):
+        '''Непросмотренные произведения по факторам train_recommendations.
+
+        Оценки всех произведений - одно умножение матрицы факторов из
+        memory-map на вектор пользователя и частичная сортировка.
+        '''
+        ids = recommend(request.user.pk, settings.RECOMMENDATIONS_COUNT)
+        titles = (
+            Title.objects.with_rating()
+            .filter(pending_deletion=False)
+            .select_related('category')
+            .prefetch_related('genre')
+            .in_bulk(ids)
+        )
+        serializer = self.get_serializer(
+            [titles[pk] for pk in ids if pk in titles], many=True
         )
         return Response(serializer.data)
 
+    @action(
+        detail=True,
+        url_path='reviews',
+        serializer_class=UserReviewSerializer,
+        pagination_class=KeysetPagination,
+    )
+    def reviews(self, request, username=None):
+        user = get_object_or_404(
+            User.objects.only('pk'), username=username, pending_deletion=False
+        )
+        return self.list_reviews(user.pk)
+
+    def list_reviews(self, author_id):
+        queryset = Review.objects.filter(author_id=author_id)
+        if not sharding_enabled():
+            queryset = queryset.select_related('author', 'title')
+        page = self.paginate_queryset(queryset)
+        if sharding_enabled():
+            # Пользователи и произведения лежат в основной базе: вместо
+            # JOIN - по одному запросу на всю слитую из шардов страницу.
+            prefetch_related_objects(page, 'author', 'title')
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class APIGetToken(APIView):
     permission_classes = (permissions.AllowAny,)
+    throttle_classes = (TokenIPThrottle, TokenUsernameThrottle)
 
     def post(self, request):
         serializer = GetTokenSerializer(data=request.data)
@@ -88,17 +209,179 @@ class APIGetToken(APIView):
         )
 
 
+class APIUsernameAvailable(APIView):
+    permission_classes = (permissions.AllowAny,)
+    throttle_classes = (UsernameCheckIPThrottle,)
+
+    def get(self, request):
+        serializer = UsernameAvailabilitySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.data)
+
+
+class APIActivity(ReplicaReadMixin, APIView):
+    '''Общая лента новых отзывов и комментариев по всем произведениям.
+
+    Отзывы и комментарии читаются отдельными запросами по индексам
+    pub_date и сливаются KeysetPagination, без UNION и сортировки целых
+    таблиц. Первая страница, которую запрашивает главная, недолго
+    кешируется.
+    '''
+    permission_classes = (permissions.AllowAny,)
+    pagination_class = KeysetPagination
+
+    def get_querysets(self):
+        reviews = visible_reviews()
+        comments = visible_comments().select_related('review').defer(
+            'review__text'
+        )
+        if not sharding_enabled():
+            reviews = reviews.select_related('author')
+            comments = comments.select_related('author')
+        return reviews, comments
+
+    def get_cache_key(self, paginator, request):
+        '''Ключ первой страницы: только проверенный limit, так что
+        посторонние параметры не плодят записи в кеше.'''
+        return f'activity:{paginator.get_limit(request)}'
+
+    def get(self, request):
+        paginator = self.pagination_class()
+        first_page = paginator.cursor_query_param not in request.query_params
+        if first_page:
+            cache_key = self.get_cache_key(paginator, request)
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
+        page = paginator.paginate_querysets(
+            self.get_querysets(), request, view=self
+        )
+        if sharding_enabled():
+            prefetch_related_objects(page, 'author')
+        serializer = ActivitySerializer(
+            page, many=True, context={'request': request, 'view': self}
+        )
+        response = paginator.get_paginated_response(serializer.data)
+        if first_page:
+            cache.set(
+                cache_key, response.data, settings.ACTIVITY_CACHE_TIMEOUT
+            )
+        return response
+
+
+class APISync(ReplicaReadMixin, APIView):
+    '''Изменения после курсора ?since= для офлайн-клиентов.
+
+    Категории, жанры, произведения, отзывы и комментарии хранят номер
+    последнего изменения из общей последовательности, удаление оставляет
+    Tombstone. Из каждого источника читается не больше limit строк с
+    номером больше since по индексу change_seq, страницы сливаются по
+    номеру, и клиент продолжает с cursor из ответа, пока has_more. Без
+    since те же пачки отдают всё содержимое. Номера выдаются до коммита
+    записи, поэтому отдаются только изменения не дальше
+    ChangeReservation.committed_seq(): курсор не перешагнёт строку,
+    которая ещё не закоммичена.
+    '''
+    permission_classes = (permissions.AllowAny,)
+
+    def get_resources(self):
+        return {
+            'categories': (Category.objects.all(), SyncCategorySerializer),
+            'genres': (Genre.objects.all(), SyncGenreSerializer),
+            'titles': (
+                Title.objects.with_rating()
+                .filter(pending_deletion=False)
+                .prefetch_related('genre'),
+                SyncTitleSerializer,
+            ),
+            'reviews': (visible_reviews().with_author(), SyncReviewSerializer),
+            'comments': (
+                visible_comments().with_author(), SyncCommentSerializer
+            ),
+        }
+
+    def get_horizon(self):
+        '''Номер последнего изменения, о котором журнал уже забыт.'''
+        return Sequence.current(TOMBSTONE_HORIZON_SEQUENCE)
+
+    def get(self, request):
+        query = SyncQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data['since']
+        limit = query.validated_data.get('limit', settings.SYNC_BATCH_SIZE)
+        if since and since < self.get_horizon():
+            return Response(
+                {'since': 'Курсор устарел: загрузите данные заново.'},
+                status=status.HTTP_410_GONE,
+            )
+        committed = ChangeReservation.committed_seq()
+        resources = self.get_resources()
+        streams = []
+        for name, (queryset, _) in resources.items():
+            queryset = queryset.filter(
+                change_seq__gt=since, change_seq__lte=committed
+            ).order_by('change_seq')
+            for page in read_pages(queryset, limit + 1):
+                streams.append([(obj.change_seq, name, obj) for obj in page])
+        names = {
+            queryset.model._meta.label_lower: name
+            for name, (queryset, _) in resources.items()
+        }
+        if since:
+            tombstones = Tombstone.objects.filter(
+                change_seq__gt=since,
+                change_seq__lte=committed,
+                model__in=names,
+            ).order_by('change_seq')[:limit + 1]
+            streams.append([
+                (tombstone.change_seq, None, tombstone)
+                for tombstone in tombstones
+            ])
+        batch = list(islice(
+            heapq.merge(*streams, key=itemgetter(0)), limit + 1
+        ))
+        has_more = len(batch) > limit
+        batch = batch[:limit]
+
+        changed, deleted = defaultdict(list), defaultdict(list)
+        for _, name, obj in batch:
+            if name is None:
+                deleted[names[obj.model]].append(obj.object_id)
+            else:
+                changed[name].append(obj)
+        context = {'request': request, 'view': self}
+        return Response({
+            'changes': {
+                name: serializer(
+                    changed[name], many=True, context=context
+                ).data
+                for name, (_, serializer) in resources.items()
+            },
+            'deleted': {name: deleted[name] for name in resources},
+            'cursor': batch[-1][0] if batch else since,
+            'has_more': has_more,
+        })
+
+
 class APISignup(APIView):
+    permission_classes = (permissions.AllowAny,)
+    throttle_classes = (
+        SignupIPThrottle,
+        SignupUsernameThrottle,
+        SignupEmailThrottle,
+    )
+
     def send_confirmation_token(self, user):
         token = default_token_generator.make_token(user)
-        send_mail(
+        enqueue_email(
+            key=f'signup:{user.pk}',
+            sender=NOREPLY_EMAIL,
+            recipient=user.email,
             subject='Токен для завершения регистрации',
-            message=(
+            body=(
                 'Здравствуйте! '
                 f'Используйте этот токен для завершения регистрации: {token}'
             ),
-            from_email=NOREPLY_EMAIL,
-            recipient_list=[user.email],
         )
 
     def post(self, request):
@@ -109,7 +392,7 @@ class APISignup(APIView):
         return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 
-class ListCreateDestroyViewSet(ModelMixinSet):
+class ListCreateDestroyViewSet(ReplicaReadMixin, ModelMixinSet):
     permission_classes = (IsAdminUserOrReadOnly,)
     filter_backends = (SearchFilter,)
     search_fields = ('name',)
@@ -126,9 +409,13 @@ class GenreViewSet(ListCreateDestroyViewSet):
     serializer_class = GenreSerializer
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(
+    BackgroundDestroyMixin, StreamingListMixin, ExpandMixin,
+    SparseFieldsMixin, AsyncReadMixin, ReplicaReadMixin, viewsets.ModelViewSet
+):
     queryset = (
-        Title.objects.annotate(rating=Avg('reviews__score'))
+        Title.objects.with_rating()
+        .filter(pending_deletion=False)
         .select_related('category')
         .prefetch_related('genre')
         .order_by('-rating')
@@ -138,17 +425,112 @@ class TitleViewSet(viewsets.ModelViewSet):
     filterset_class = TitleFilter
     search_fields = ('name', 'description')
     http_method_names = ('get', 'post', 'patch', 'delete')
-    ordering_fields = ('rating', 'name', 'year')
+    ordering_fields = (
+        'rating', 'weighted_rating', 'trending_score', 'name', 'year'
+    )
     ordering = ('-rating',)
+    expandable = {
+        'reviews': ReviewSerializer,
+        'reviews.comments': CommentSerializer,
+    }
+
+    def get_expand_groups(self, objs):
+        if not sharding_enabled():
+            return super().get_expand_groups(objs)
+        shards = defaultdict(list)
+        for title in objs:
+            shards[shard_for_title(title.pk)].append(title)
+        return [
+            (use_title_shard(titles[0].pk), titles)
+            for titles in shards.values()
+        ]
 
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return TitleReadSerializer
         return TitleWriteSerializer
 
+    @action(detail=False, url_path='batch')
+    def batch(self, request):
+        '''Произведения по ?ids=3,1,2 в том же порядке одним запросом.
+
+        Жанры подгружаются одним prefetch на всю пачку; id, которых нет
+        в базе, перечисляются в missing.
+        '''
+        ids_serializer = TitleIdsSerializer(data=request.query_params)
+        ids_serializer.is_valid(raise_exception=True)
+        ids = ids_serializer.validated_data['ids']
+        queryset = self.get_queryset()
+        if self.sparse_fields is not None:
+            queryset = self.trim_queryset(
+                queryset, self.sparse_fields.values()
+            )
+        titles = queryset.order_by().in_bulk(ids)
+        serializer = self.get_serializer(
+            [titles[pk] for pk in ids if pk in titles], many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in titles],
+        })
+
+    @action(detail=False)
+    def trending(self, request):
+        '''Самые популярные сейчас произведения по trending_score.
+
+        Первые TRENDING_COUNT строк индекса; ответ недолго кешируется
+        по набору полей после проверки ?fields= и ?omit=.
+        '''
+        cache_key = 'titles-trending'
+        if self.sparse_fields is not None:
+            cache_key += ':' + ','.join(sorted(self.sparse_fields))
+        data = cache.get(cache_key)
+        if data is None:
+            queryset = (
+                self.get_queryset()
+                .filter(trending_score__gt=0)
+                .order_by('-trending_score')
+            )
+            if self.sparse_fields is not None:
+                queryset = self.trim_queryset(
+                    queryset, self.sparse_fields.values()
+                )
+            data = self.get_serializer(
+                queryset[:settings.TRENDING_COUNT], many=True
+            ).data
+            cache.set(cache_key, data, settings.TRENDING_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        '''Похожие произведения по порядку из build_similar_titles.
 
-class ReviewViewSet(viewsets.ModelViewSet):
+        Один запрос по индексу (title, rank) плюс prefetch жанров;
+        существование произведения проверяется, только если соседей нет.
+        '''
+        if not str(pk).isdigit():
+            raise Http404
+        queryset = (
+            self.get_queryset()
+            .filter(similar_to__title_id=pk)
+            .order_by('similar_to__rank')
+        )
+        if self.sparse_fields is not None:
+            queryset = self.trim_queryset(
+                queryset, self.sparse_fields.values()
+            )
+        titles = list(queryset)
+        if not titles:
+            get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(self.get_serializer(titles, many=True).data)
+
+
+class ReviewViewSet(
+    StreamingListMixin, ExpandMixin, SparseFieldsMixin, AsyncReadMixin,
+    TitleShardMixin, ReplicaReadMixin, viewsets.ModelViewSet
+):
     serializer_class = ReviewSerializer
+    expandable = {'comments': CommentSerializer}
     permission_classes = (
         IsAuthenticatedOrReadOnly,
         AdminModeratorAuthorPermission,
@@ -159,22 +541,75 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
     def get_title(self):
         title_pk = self.kwargs.get('title_pk')
-        return get_object_or_404(Title, id=title_pk)
+        return get_object_or_404(Title, id=title_pk, pending_deletion=False)
+
+    async def aget_title(self):
+        title_pk = self.kwargs.get('title_pk')
+        return await aget_object_or_404(
+            Title, id=title_pk, pending_deletion=False
+        )
 
     def get_queryset(self):
         title = self.get_title()
-        return title.reviews.select_related('author').all()
+        return title.reviews.with_author()
+
+    async def aget_queryset(self):
+        title = await self.aget_title()
+        return title.reviews.with_author()
 
     def perform_create(self, serializer):
         title = self.get_title()
-        serializer.save(author=self.request.user, title=title)
+        serializer.save(author_id=self.request.user.pk, title=title)
         logger.info(
             f'Создан отзыв пользователем {self.request.user.username} '
             f'на произведение {title.name}'
         )
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class DuplicateReviewViewSet(
+    mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+):
+    '''Почти одинаковые отзывы, найденные по MinHash. DELETE отклоняет
+    пару: повторный поиск её не вернёт.'''
+    queryset = DuplicateReview.objects.filter(dismissed=False)
+    serializer_class = DuplicateReviewSerializer
+    permission_classes = (ModeratorOnly,)
+
+    def list(self, request):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(
+            page,
+            many=True,
+            context={
+                **self.get_serializer_context(),
+                'reviews': self.load_reviews(page),
+            },
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def load_reviews(self, pairs):
+        review_ids = defaultdict(set)
+        for pair in pairs:
+            review_ids[title_database(pair.title_id)].add(pair.review_id)
+            review_ids[title_database(pair.duplicate_title_id)].add(
+                pair.duplicate_id
+            )
+        reviews = {}
+        for alias, ids in review_ids.items():
+            reviews.update(Review.objects.using(alias).in_bulk(ids))
+        # Пользователи и произведения лежат в основной базе.
+        prefetch_related_objects(list(reviews.values()), 'author', 'title')
+        return reviews
+
+    def perform_destroy(self, instance):
+        instance.dismissed = True
+        instance.save(update_fields=('dismissed',))
+
+
+class CommentViewSet(
+    StreamingListMixin, SparseFieldsMixin, AsyncReadMixin, TitleShardMixin,
+    ReplicaReadMixin, viewsets.ModelViewSet
+):
     serializer_class = CommentSerializer
     permission_classes = (
         IsAuthenticatedOrReadOnly,
@@ -186,15 +621,30 @@ class CommentViewSet(viewsets.ModelViewSet):
     def get_review(self):
         review_pk = self.kwargs.get('review_pk')
         title_pk = self.kwargs.get('title_pk')
-        return get_object_or_404(Review, id=review_pk, title_id=title_pk)
+        return get_object_or_404(
+            visible_reviews(), id=review_pk, title_id=title_pk
+        )
+
+    async def aget_review(self):
+        review_pk = self.kwargs.get('review_pk')
+        title_pk = self.kwargs.get('title_pk')
+        # С шардами список скрытых произведений читается запросом.
+        reviews = await sync_to_async(visible_reviews)()
+        return await aget_object_or_404(
+            reviews, id=review_pk, title_id=title_pk
+        )
 
     def get_queryset(self):
         review = self.get_review()
-        return review.comments.select_related('author').all()
+        return review.comments.with_author()
+
+    async def aget_queryset(self):
+        review = await self.aget_review()
+        return review.comments.with_author()
 
     def perform_create(self, serializer):
         review = self.get_review()
-        serializer.save(author=self.request.user, review=review)
+        serializer.save(author_id=self.request.user.pk, review=review)
         logger.info(
             f'Создан комментарий пользователем {self.request.user.username} '
             f'к отзыву {review.pk}'
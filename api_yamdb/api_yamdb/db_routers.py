@@ -0,0 +1,160 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+SHARDED_MODELS = frozenset(('reviews.review', 'reviews.comment'))
+
+_read_database = ContextVar('read_database', default=None)
+_review_shard = ContextVar('review_shard', default=None)
+
+
+class ShardResolutionError(RuntimeError):
+    pass
+
+
+def replica_configured():
+    return settings.REPLICA_DATABASE_ALIAS in settings.DATABASES
+
+
+def sharding_enabled():
+    return bool(settings.REVIEW_SHARD_ALIASES)
+
+
+def shard_for_title(title_id):
+    aliases = settings.REVIEW_SHARD_ALIASES
+    checksum = zlib.crc32(str(int(title_id)).encode())
+    return aliases[checksum % len(aliases)]
+
+
+def review_databases():
+    '''Базы, в которых лежат отзывы и комментарии.'''
+    if sharding_enabled():
+        return list(settings.REVIEW_SHARD_ALIASES)
+    from reviews.models import Review
+    return [router.db_for_read(Review)]
+
+
+def map_review_databases(func):
+    '''Параллельно вызывает func(alias) для каждой базы с отзывами.'''
+    aliases = review_databases()
+    if len(aliases) == 1:
+        return [func(aliases[0])]
+
+    def call(alias):
+        try:
+            return func(alias)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as executor:
+        return list(executor.map(call, aliases))
+
+
+@contextmanager
+def read_from(alias):
+    '''Направляет чтения текущего запроса (или задачи) в базу alias.'''
+    token = _read_database.set(alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def use_title_shard(title_id):
+    '''Направляет запросы к отзывам и комментариям в шард произведения.'''
+    if not sharding_enabled() or not str(title_id or '').isdigit():
+        return nullcontext()
+    return _use_shard(shard_for_title(title_id))
+
+
+@contextmanager
+def _use_shard(alias):
+    token = _review_shard.set(alias)
+    try:
+        yield
+    finally:
+        _review_shard.reset(token)
+
+
+class ReviewShardRouter:
+    '''Раскладывает отзывы и комментарии по шардам по хешу title_id.
+
+    Остальные модели не трогает, их маршрутизирует следующий роутер.
+    '''
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if (
+            instance is not None
+            and _review_shard.get() is None
+            and instance._meta.label_lower not in SHARDED_MODELS
+            and instance._meta.label_lower != 'reviews.title'
+        ):
+            # Связанный объект присваивается в конструкторе модели:
+            # шард определится при сохранении по title_id.
+            return None
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding_enabled():
+            return True
+        return None
+
+    def _shard(self, model, hints):
+        if (
+            not sharding_enabled()
+            or model._meta.label_lower not in SHARDED_MODELS
+        ):
+            return None
+        alias = _review_shard.get()
+        if alias:
+            return alias
+        instance = hints.get('instance')
+        if instance is not None:
+            alias = self._shard_for_instance(instance)
+            if alias:
+                return alias
+        raise ShardResolutionError(
+            f'Не удалось определить шард для {model._meta.label}: '
+            'используйте use_title_shard() или .using().'
+        )
+
+    def _shard_for_instance(self, instance):
+        if instance._state.db in settings.REVIEW_SHARD_ALIASES:
+            return instance._state.db
+        if instance._meta.label_lower == 'reviews.title' and instance.pk:
+            return shard_for_title(instance.pk)
+        title_id = getattr(instance, 'title_id', None)
+        if title_id:
+            return shard_for_title(title_id)
+        review = instance._state.fields_cache.get('review')
+        if review is not None:
+            return self._shard_for_instance(review)
+        return None
+
+
+class PrimaryReplicaRouter:
+    '''Записи всегда идут в основную базу, чтения - в реплику,
+    если она выбрана для текущего контекста через read_from().'''
+
+    def db_for_read(self, model, **hints):
+        alias = _read_database.get()
+        if alias and alias in settings.DATABASES:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != settings.REPLICA_DATABASE_ALIAS
@@ -0,0 +1,112 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Max
+from django.db.models.lookups import Exact
+from django.db.models.sql.where import AND
+
+TABLE_VERSION_KEY = 'table-version:{}'
+# Строки, ожидающие фонового удаления, - исчезающе малая доля таблицы:
+# фильтр, скрывающий только их, не мешает оценке по всей таблице.
+PENDING_DELETION_FIELD = 'pending_deletion'
+
+
+def estimate_row_count(model, using):
+    '''Примерное число строк в таблице модели без COUNT(*).
+
+    PostgreSQL и MySQL берут его из статистики планировщика, SQLite -
+    из максимального первичного ключа (поиск по индексу). Возвращает None,
+    если оценки нет.
+    '''
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'mysql':
+        sql = (
+            'SELECT table_rows FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name = %s'
+        )
+    else:
+        return model._base_manager.using(using).aggregate(
+            estimate=Max('pk')
+        )['estimate']
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def estimate_filtered_count(queryset):
+    '''Оценка планировщика PostgreSQL для произвольного запроса.'''
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset):
+    '''Оценка числа строк queryset, если он достаточно велик.
+
+    Для запросов меньше ESTIMATED_COUNT_THRESHOLD и запросов, которые
+    СУБД не умеет оценить, возвращает None: их стоит считать точно.
+    '''
+    query = queryset.query
+    if query.distinct or query.is_sliced or query.combinator:
+        return None
+    if query.where and not hides_pending_deletion_only(query.where):
+        estimate = estimate_filtered_count(queryset)
+    else:
+        estimate = estimate_row_count(queryset.model, queryset.db)
+    if estimate is None or estimate < settings.ESTIMATED_COUNT_THRESHOLD:
+        return None
+    return estimate
+
+
+def hides_pending_deletion_only(where):
+    if where.connector != AND or where.negated:
+        return False
+    return all(
+        isinstance(child, Exact)
+        and getattr(child.lhs, 'target', None) is not None
+        and child.lhs.target.name == PENDING_DELETION_FIELD
+        and child.rhs is False
+        for child in where.children
+    )
+
+
+def queryset_tables(queryset):
+    '''Таблицы, от содержимого которых зависит результат queryset.'''
+    return sorted(
+        {queryset.model._meta.db_table}
+        | {join.table_name for join in queryset.query.alias_map.values()}
+    )
+
+
+def table_versions(tables):
+    '''Текущие версии таблиц для ключей кеша.
+
+    Версия, вытесненная из кеша, заново начинается с текущего времени,
+    чтобы не совпасть ни с одной из прежних.
+    '''
+    keys = [TABLE_VERSION_KEY.format(table) for table in tables]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_table_version(table):
+    key = TABLE_VERSION_KEY.format(table)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
@@ -1,3 +1,4 @@
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -63,21 +64,144 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения. Локально - второй файл SQLite, который
+# синхронизируется с основной базой командой sync_replica.
+REPLICA_DATABASE_ALIAS = 'replica'
+REPLICA_STICKY_SECONDS = 5
+
+if os.getenv('YAMDB_REPLICA_DB'):
+    DATABASES[REPLICA_DATABASE_ALIAS] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('YAMDB_REPLICA_DB'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Шардирование отзывов и комментариев по title_id. Локально каждый шард -
+# отдельный файл SQLite, например YAMDB_REVIEW_SHARDS=4.
+REVIEW_SHARD_ALIASES = [
+    f'shard_{number}'
+    for number in range(int(os.getenv('YAMDB_REVIEW_SHARDS', '0')))
+]
+
+for shard_alias in REVIEW_SHARD_ALIASES:
+    DATABASES[shard_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{shard_alias}.sqlite3',
+    }
+
+DATABASE_ROUTERS = [
+    'api_yamdb.db_routers.ReviewShardRouter',
+    'api_yamdb.db_routers.PrimaryReplicaRouter',
+]
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.StatelessJWTAuthentication",
     ],
-    "DEFAULT_PAGINATION_CLASS": (
-        "rest_framework.pagination.LimitOffsetPagination"
-    ),
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 10,
+    "DEFAULT_THROTTLE_RATES": {
+        "signup_ip": "10/m",
+        "signup_username": "5/h",
+        "signup_email": "5/h",
+        "token_ip": "20/m",
+        "token_username": "10/m",
+        "username_check": "30/m",
+    },
 }
 
+# Ведра троттлинга должны быть общими для всех воркеров: в продакшене
+# здесь Redis или Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Без общего кеша с атомарным incr (Redis, Memcached) троттлинг
+# отклоняет запросы, а не пропускает их: с LocMemCache лимит умножился бы
+# на число воркеров. Для разработки проверка выключена.
+THROTTLE_REQUIRE_SHARED_CACHE = not DEBUG
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Сколько секунд версия токенов пользователя живёт в кеше; с общим
+# кешем смена роли видна всем воркерам сразу.
+TOKEN_VERSION_CACHE_TIMEOUT = 60 * 60
+
+# Сколько проверенных JWT держать в LRU каждого процесса (0 - не кешировать).
+JWT_CACHE_SIZE = 4096
+
+# Фильтр Блума по username и email в общем кеше: доля ложных срабатываний,
+# минимальная ёмкость и период пересборки из базы в секундах.
+USER_BLOOM_ERROR_RATE = 0.01
+USER_BLOOM_MIN_CAPACITY = 10_000
+USER_BLOOM_REBUILD_SECONDS = 10 * 60
+
+# Начиная с какого числа строк нефильтрованные списки считаются по оценке
+# из статистики СУБД, а не точным COUNT(*).
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+# Сколько секунд живёт закешированный COUNT(*) для пагинации: записи
+# через ORM сбрасывают его сразу, массовые update() - по истечении срока.
+COUNT_CACHE_TIMEOUT = 5 * 60
+
+# Предел ?limit для обычных JSON-страниц; больше - только потоком ?stream=true.
+PAGINATION_MAX_LIMIT = 100
+
+# Сколько дочерних объектов можно встроить в каждого родителя через ?expand=.
+EXPAND_MAX_LIMIT = 20
+
+# Сколько произведений можно получить одним запросом /titles/batch/?ids=.
+TITLES_BATCH_MAX_SIZE = 100
+
+# Сколько секунд кешируется первая страница общей ленты /activity/.
+ACTIVITY_CACHE_TIMEOUT = 10
+
+# Наибольшая пачка изменений /sync/ и сколько дней хранятся записи
+# об удалённых объектах (prune_tombstones).
+SYNC_BATCH_SIZE = 500
+SYNC_TOMBSTONE_DAYS = 90
+
+# Сколько секунд /sync/ ждёт коммита записи, получившей номер изменения:
+# пока она не завершена, изменения с большими номерами не отдаются. Дольше
+# запись считается откатившейся; срок должен быть больше самой долгой
+# транзакции записи.
+SYNC_RESERVATION_TIMEOUT = 60
+
+# Сколько отзывов или комментариев удаляется одной транзакцией при фоновом
+# удалении (?background=true, команда run_deletions).
+DELETION_BATCH_SIZE = 500
+
+# Взвешенный рейтинг: сколько отзывов весит средняя оценка по всем
+# произведениям и сколько секунд она кешируется между запусками
+# recompute_weighted_ratings.
+WEIGHTED_RATING_MIN_REVIEWS = 10
+RATING_PRIOR_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Популярность «сейчас»: за какой срок вес отзыва или комментария
+# уменьшается вдвое (после изменения нужен recompute_trending), сколько
+# произведений отдаёт /titles/trending/ и сколько секунд он кешируется.
+TRENDING_HALF_LIFE = timedelta(days=3)
+TRENDING_COUNT = 20
+TRENDING_CACHE_TIMEOUT = 60
+
+# Сколько похожих произведений хранит build_similar_titles для каждого.
+SIMILAR_TITLES_COUNT = 10
+
+# Где train_recommendations хранит факторы ALS и сколько произведений
+# отдаёт /users/me/recommendations/.
+RECOMMENDATIONS_DIR = BASE_DIR / 'recommendations'
+RECOMMENDATIONS_COUNT = 20
+
+# Почти одинаковые отзывы (MinHash): с какой оценкой сходства текстов пара
+# попадает к модераторам и сколько слов нужно отзыву, чтобы его проверять.
+DUPLICATE_REVIEW_THRESHOLD = 0.8
+DUPLICATE_REVIEW_MIN_WORDS = 8
+
 AUTH_BASE_PATH = 'django.contrib.auth.password_validation'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -114,3 +238,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'reviews.User'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Письма уходят через очередь в базе, её разбирает команда send_outbox.
+# EMAIL_OUTBOX_EAGER отправляет письмо сразу после коммита запроса.
+EMAIL_OUTBOX_EAGER = False
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 60
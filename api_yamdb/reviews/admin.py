@@ -1,11 +1,167 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.utils import unquote
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
 
-from reviews.models import User, Category, Genre, Title, Review, Comment
+from api_yamdb.db_routers import sharding_enabled, use_title_shard
+from api_yamdb.db_stats import estimate_count
+from reviews.constants import TEXT_PREVIEW_LENGTH
+from reviews.models import (
+    Category,
+    Comment,
+    DeletionJob,
+    Genre,
+    OutgoingEmail,
+    Review,
+    Title,
+    User,
+)
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Для больших выборок берёт оценку СУБД вместо COUNT(*).'''
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    '''Changelist, не требующий полного COUNT(*) на каждой странице.'''
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @staticmethod
+    def preview(text):
+        return Truncator(text).chars(TEXT_PREVIEW_LENGTH)
+
+
+def admin_shard(alias):
+    '''Шард, выбранный фильтром changelist, по умолчанию первый.'''
+    if alias in settings.REVIEW_SHARD_ALIASES:
+        return alias
+    return settings.REVIEW_SHARD_ALIASES[0]
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    '''Выбор шарда: запрос без шарда к отзывам роутер не пропустит.'''
+    title = 'шард'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in settings.REVIEW_SHARD_ALIASES]
+
+    def choices(self, changelist):
+        # Варианта «Все» нет: changelist читает одну базу.
+        selected = admin_shard(self.value())
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == selected,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: alias}
+                ),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return None
+
+
+class ShardedContentAdmin(LargeTableAdmin):
+    '''Отзывы и комментарии: с шардами changelist читает один шард из
+    фильтра, связи с основной базой - prefetch вместо JOIN, поиск - только
+    по собственным полям, а объект по id ищется во всех шардах; его форма
+    работает в шарде его произведения.'''
+    local_search_fields = ('text',)
+
+    def get_title_id(self, obj):
+        raise NotImplementedError
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if sharding_enabled():
+            return (ShardListFilter, *list_filter)
+        return list_filter
+
+    def get_list_select_related(self, request):
+        if sharding_enabled():
+            return False
+        return super().get_list_select_related(request)
+
+    def get_search_fields(self, request):
+        if sharding_enabled():
+            return self.local_search_fields
+        return super().get_search_fields(request)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if sharding_enabled():
+            alias = admin_shard(
+                request.GET.get(ShardListFilter.parameter_name)
+            )
+            queryset = queryset.using(alias).prefetch_related(
+                *self.list_select_related
+            )
+        return queryset
+
+    def get_object(self, request, object_id, from_field=None):
+        if not sharding_enabled():
+            return super().get_object(request, object_id, from_field)
+        queryset = self.get_queryset(request)
+        model = queryset.model
+        field = (
+            model._meta.pk if from_field is None
+            else model._meta.get_field(from_field)
+        )
+        try:
+            object_id = field.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        for alias in settings.REVIEW_SHARD_ALIASES:
+            obj = queryset.using(alias).filter(
+                **{field.name: object_id}
+            ).first()
+            if obj is not None:
+                return obj
+        return None
+
+    def object_shard(self, request, object_id):
+        obj = object_id and self.get_object(request, unquote(object_id))
+        return use_title_shard(obj and self.get_title_id(obj))
+
+    def changeform_view(self, request, object_id=None, form_url='',
+                        extra_context=None):
+        with self.object_shard(request, object_id):
+            return self.render_now(super().changeform_view(
+                request, object_id, form_url, extra_context
+            ))
+
+    def delete_view(self, request, object_id, extra_context=None):
+        with self.object_shard(request, object_id):
+            return self.render_now(
+                super().delete_view(request, object_id, extra_context)
+            )
+
+    @staticmethod
+    def render_now(response):
+        # Виджеты связей читают базу при отрисовке шаблона, поэтому она
+        # должна пройти, пока выбран шард объекта.
+        if hasattr(response, 'render'):
+            response.render()
+        return response
 
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_display = (
         'username',
         'email',
@@ -19,7 +175,7 @@ class UserAdmin(BaseUserAdmin):
         'email',
         'role',
     )
-    list_filter = ('role',)
+    list_filter = ('role', 'pending_deletion')
     empty_value_display = '-пусто-'
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
@@ -83,12 +239,12 @@ class GenreAdmin(admin.ModelAdmin):
 
 
 @admin.register(Title)
-class TitleAdmin(admin.ModelAdmin):
+class TitleAdmin(LargeTableAdmin):
     list_display = (
         'name',
         'year',
         'category',
-        'description',
+        'get_description',
         'get_genres',
     )
     search_fields = (
@@ -96,7 +252,16 @@ class TitleAdmin(admin.ModelAdmin):
         'category__name',
         'genre__name',
     )
-    list_filter = ('category', 'genre')
+    list_filter = ('category', 'genre', 'pending_deletion')
+    list_select_related = ('category',)
+    autocomplete_fields = ('category', 'genre')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genre')
+
+    @admin.display(description='Описание')
+    def get_description(self, obj):
+        return obj.description and self.preview(obj.description)
 
     @admin.display(description='Жанры')
     def get_genres(self, obj):
@@ -104,32 +269,102 @@ class TitleAdmin(admin.ModelAdmin):
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(ShardedContentAdmin):
     list_display = (
         'title',
-        'text',
+        'get_text',
         'author',
         'score',
         'pub_date',
     )
     search_fields = (
         'title__name',
-        'author__username',
+        '=author__username',
         'text',
     )
-    list_filter = ('author',)
+    list_filter = ('score',)
+    list_select_related = ('title', 'author')
+    raw_id_fields = ('title', 'author')
+
+    def get_title_id(self, obj):
+        return obj.title_id
+
+    @admin.display(description='Текст')
+    def get_text(self, obj):
+        return self.preview(obj.text)
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ShardedContentAdmin):
     list_display = (
         'review',
-        'text',
+        'get_text',
         'author',
     )
     search_fields = (
         'review__title__name',
-        'author__username',
+        '=author__username',
         'text',
     )
-    list_filter = ('author',)
+    list_select_related = ('review', 'author')
+    raw_id_fields = ('review', 'author')
+
+    def get_title_id(self, obj):
+        return obj.review.title_id
+
+    def has_add_permission(self, request):
+        # Отзыв для нового комментария не найти, пока неизвестен шард.
+        return not sharding_enabled() and super().has_add_permission(request)
+
+    @admin.display(description='Текст')
+    def get_text(self, obj):
+        return self.preview(obj.text)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        'recipient',
+        'subject',
+        'attempts',
+        'next_attempt_at',
+        'sent_at',
+        'failed_at',
+    )
+    search_fields = ('recipient', 'dedup_key')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'object_repr',
+        'model',
+        'status',
+        'deleted_objects',
+        'created_at',
+        'finished_at',
+    )
+    list_filter = ('status', 'model')
+    search_fields = ('object_repr',)
+    readonly_fields = (
+        'model',
+        'object_id',
+        'object_repr',
+        'status',
+        'deleted_objects',
+        'lease_until',
+        'last_error',
+        'created_at',
+        'finished_at',
+    )
+    actions = ('retry',)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Повторить удаление')
+    def retry(self, request, queryset):
+        queryset.filter(status=DeletionJob.FAILED).update(
+            status=DeletionJob.PENDING, last_error=''
+        )
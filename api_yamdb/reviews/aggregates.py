@@ -0,0 +1,178 @@
+import numpy as np
+from django.db.models import Case, F, Q, Value, When
+
+from api_yamdb.db_routers import map_review_databases
+from reviews.constants import TRENDING_EPOCH
+from reviews.models import Comment, Review, Title, reserve_change_seqs
+from reviews.trending import decay_rate, group_logsumexp, stream_chunks
+
+CHUNK_SIZE = 100_000
+BATCH_SIZE = 1000
+# Расхождение популярности меньше этого - погрешность вычислений.
+TOLERANCE = 1e-6
+
+REVIEW_DTYPE = np.dtype([
+    ('title_id', np.int64), ('score', np.int64), ('timestamp', np.float64)
+])
+COMMENT_DTYPE = np.dtype([('title_id', np.int64), ('timestamp', np.float64)])
+TITLE_DTYPE = np.dtype([
+    ('id', np.int64),
+    ('review_count', np.int64),
+    ('score_total', np.int64),
+    ('trending_score', np.float64),
+    ('change_seq', np.int64),
+])
+AUDITED_FIELDS = ('review_count', 'score_total', 'trending_score')
+
+
+class Totals:
+    '''Истинные агрегаты по id произведений 0..size-1: группировка
+    bincount по title_id, порция за порцией.'''
+
+    def __init__(self, size):
+        self.size = size
+        self.review_count = np.zeros(size, dtype=np.int64)
+        self.score_total = np.zeros(size, dtype=np.int64)
+        self.activity = np.full(size, -np.inf)
+        self.events = np.zeros(size, dtype=np.int64)
+        self.orphans = 0
+
+    def add_reviews(self, chunk):
+        chunk = self.add_activity(chunk)
+        self.review_count += np.bincount(
+            chunk['title_id'], minlength=self.size
+        )
+        self.score_total += np.bincount(
+            chunk['title_id'], weights=chunk['score'], minlength=self.size
+        ).astype(np.int64)
+
+    def add_activity(self, chunk):
+        known = chunk['title_id'] < self.size
+        self.orphans += int(np.count_nonzero(~known))
+        chunk = chunk[known]
+        self.events += np.bincount(chunk['title_id'], minlength=self.size)
+        scores = decay_rate() * (
+            chunk['timestamp'] - TRENDING_EPOCH.timestamp()
+        )
+        self.activity = np.logaddexp(
+            self.activity,
+            group_logsumexp(chunk['title_id'], scores, self.size),
+        )
+        return chunk
+
+    def merge(self, other):
+        self.review_count += other.review_count
+        self.score_total += other.score_total
+        self.activity = np.logaddexp(self.activity, other.activity)
+        self.events += other.events
+        self.orphans += other.orphans
+
+
+def collect_totals(size, chunk_size):
+    '''Агрегаты по всем базам с отзывами, каждая в своём потоке.'''
+    def collect(alias):
+        totals = Totals(size)
+        reviews = Review.objects.using(alias).values_list(
+            'title_id', 'score', 'pub_date'
+        )
+        for chunk in stream_chunks(reviews, REVIEW_DTYPE, chunk_size):
+            totals.add_reviews(chunk)
+        comments = Comment.objects.using(alias).values_list(
+            'review__title_id', 'pub_date'
+        )
+        for chunk in stream_chunks(comments, COMMENT_DTYPE, chunk_size):
+            totals.add_activity(chunk)
+        return totals
+
+    totals, *partials = map_review_databases(collect)
+    for partial in partials:
+        totals.merge(partial)
+    return totals
+
+
+def audit_titles(chunk_size=CHUNK_SIZE, fix=False):
+    '''Сверяет счётчики рейтинга и популярность произведений с отзывами
+    и комментариями.
+
+    Возвращает число проверенных произведений, id расхождений по полям,
+    число отзывов и комментариев без произведения и id произведений,
+    которые изменились во время сверки. С fix расхождения исправляются
+    только в строках, которые с момента чтения никто не менял.
+    '''
+    stored = np.fromiter(
+        Title.objects.order_by('pk')
+        .values_list(*TITLE_DTYPE.names)
+        .iterator(chunk_size=chunk_size),
+        dtype=TITLE_DTYPE,
+    )
+    ids = stored['id']
+    size = int(ids.max()) + 1 if len(ids) else 0
+    totals = collect_totals(size, chunk_size)
+    missing = np.ones(size, dtype=bool)
+    missing[ids] = False
+    orphans = totals.orphans + int(totals.events[missing].sum())
+
+    expected = np.empty_like(stored)
+    expected['id'] = ids
+    expected['review_count'] = totals.review_count[ids]
+    expected['score_total'] = totals.score_total[ids]
+    activity = totals.activity[ids]
+    # Без активности счёт популярности остаётся по умолчанию нулевым.
+    expected['trending_score'] = np.where(np.isfinite(activity), activity, 0)
+    wrong = {
+        field: stored[field] != expected[field]
+        for field in ('review_count', 'score_total')
+    }
+    wrong['trending_score'] = ~np.isclose(
+        stored['trending_score'],
+        expected['trending_score'],
+        rtol=0,
+        atol=TOLERANCE,
+    )
+    mismatched = np.logical_or.reduce(list(wrong.values()))
+    stale = ids[:0]
+    if fix:
+        stale = repair(stored[mismatched], expected[mismatched])
+    mismatches = {field: ids[mask] for field, mask in wrong.items()}
+    return len(ids), mismatches, orphans, stale
+
+
+def repair(stored, expected):
+    '''Записывает ожидаемые значения одним UPDATE ... SET поле = CASE id
+    ... END на порцию. WHERE пропускает строки, где уже не прочитанные
+    при сверке значения: их успел обновить отзыв или пересчёт, и слепая
+    запись затёрла бы более новые счётчики. Возвращает id пропущенных
+    произведений.'''
+    stale = []
+    expected = expected[list(AUDITED_FIELDS)]
+    for start in range(0, len(stored), BATCH_SIZE):
+        olds = stored[start:start + BATCH_SIZE].tolist()
+        news = expected[start:start + BATCH_SIZE].tolist()
+        ids = [old[0] for old in olds]
+        unchanged = Q()
+        for old in olds:
+            unchanged |= Q(**dict(zip(TITLE_DTYPE.names, old)))
+        # Счётчики рейтинга - часть произведения в /sync/.
+        with reserve_change_seqs(len(olds)) as change_seqs:
+            values = dict(zip(AUDITED_FIELDS, zip(*news)))
+            values['change_seq'] = change_seqs
+            Title.objects.filter(unchanged).update(**{
+                field: Case(
+                    *(
+                        When(pk=pk, then=Value(value))
+                        for pk, value in zip(ids, column)
+                    ),
+                    default=F(field),
+                    output_field=Title._meta.get_field(field),
+                )
+                for field, column in values.items()
+            })
+            # Номера изменений зарезервированы только для этой порции:
+            # строка с таким номером обновлена именно этим UPDATE.
+            updated = set(
+                Title.objects.filter(
+                    pk__in=ids, change_seq__in=change_seqs
+                ).values_list('pk', flat=True)
+            )
+        stale.extend(pk for pk in ids if pk not in updated)
+    return np.array(stale, dtype=np.int64)
@@ -0,0 +1,192 @@
+import hashlib
+import math
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models.functions import Lower
+
+USERNAME = 'username'
+EMAIL = 'email'
+
+FILTER_KEY = 'user-bloom:filter'
+GENERATION_KEY = 'user-bloom:generation'
+BUILD_LOCK_KEY = 'user-bloom:build'
+LOG_KEY = 'user-bloom:added'
+BUILD_LOCK_TIMEOUT = 60
+
+
+class BloomFilter:
+    '''Битовый фильтр Блума с двойным хешированием blake2b.
+
+    might_contain() = False гарантирует, что значение не добавлялось;
+    True может оказаться ложным срабатыванием.
+    '''
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hash_count = max(
+            1, round(self.size / capacity * math.log(2))
+        )
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for number in range(self.hash_count):
+            yield (first + number * second) % self.size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+def log_entry_key(position):
+    return f'{LOG_KEY}:{position}'
+
+
+class UserNamesFilter:
+    '''Фильтр Блума по username и email (в нижнем регистре) в общем кеше.
+
+    Фильтр собирает из базы один процесс, и он живёт в кеше
+    USER_BLOOM_REBUILD_SECONDS. Пользователи, сохранённые после сборки,
+    дописываются после коммита в журнал с номерами от cache.incr, а каждый
+    процесс перед ответом доигрывает журнал в свою копию фильтра. Поэтому
+    «точно нет» отстаёт от базы только на время от коммита до записи в
+    журнал. Пока фильтра нет или журнал прерван, ответ - «возможно есть»,
+    и решает база.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._generation = None
+        self._position = 0
+
+    @staticmethod
+    def _key(kind, value):
+        if kind == EMAIL:
+            value = value.lower()
+        return f'{kind}:{value}'
+
+    def might_exist(self, kind, value):
+        bloom = self._current()
+        return bloom is None or bloom.might_contain(self._key(kind, value))
+
+    def _current(self):
+        state = cache.get_many((GENERATION_KEY, LOG_KEY))
+        generation = state.get(GENERATION_KEY)
+        if generation is None or LOG_KEY not in state:
+            self._build()
+            return None
+        with self._lock:
+            if generation != self._generation and not self._load(generation):
+                return None
+            position = state[LOG_KEY]
+            if position < self._position:
+                # Счётчик журнала потерян и начат заново: добавления
+                # между сборкой и потерей неизвестны.
+                cache.delete(GENERATION_KEY)
+                return None
+            if position > self._position and not self._replay(position):
+                return None
+            return self._filter
+
+    def _load(self, generation):
+        stored = cache.get(FILTER_KEY)
+        if stored is None or stored[0] != generation:
+            return False
+        self._generation, self._position, self._filter = stored
+        return True
+
+    def _replay(self, position):
+        keys = [
+            log_entry_key(number)
+            for number in range(self._position + 1, position + 1)
+        ]
+        entries = cache.get_many(keys)
+        for key in keys:
+            if key not in entries:
+                # Запись ещё не сделана после incr или вытеснена: до неё
+                # доиграть можно, дальше - нет.
+                return False
+            for value in entries[key]:
+                self._filter.add(value)
+            self._position += 1
+        return True
+
+    def _build(self):
+        if not cache.add(BUILD_LOCK_KEY, True, BUILD_LOCK_TIMEOUT):
+            return
+        from reviews.models import User
+
+        try:
+            cache.add(LOG_KEY, 0, None)
+            # Позиция читается до выборки: пользователи из записей журнала
+            # до неё уже закоммичены и попадут в выборку.
+            position = cache.get(LOG_KEY, 0)
+            users = (
+                User.objects.using(router.db_for_write(User))
+                .values_list('username', Lower('email'))
+                .order_by()
+            )
+            bloom = BloomFilter(
+                capacity=max(
+                    users.count() * 2, settings.USER_BLOOM_MIN_CAPACITY
+                ),
+                error_rate=settings.USER_BLOOM_ERROR_RATE,
+            )
+            for username, email in users.iterator(chunk_size=2000):
+                bloom.add(self._key(USERNAME, username))
+                bloom.add(self._key(EMAIL, email))
+            generation = uuid.uuid4().hex
+            cache.set(
+                FILTER_KEY,
+                (generation, position, bloom),
+                settings.USER_BLOOM_REBUILD_SECONDS,
+            )
+            cache.set(
+                GENERATION_KEY, generation,
+                settings.USER_BLOOM_REBUILD_SECONDS,
+            )
+        finally:
+            cache.delete(BUILD_LOCK_KEY)
+
+    def add_user(self, user):
+        values = [
+            self._key(USERNAME, user.username),
+            self._key(EMAIL, user.email),
+        ]
+        transaction.on_commit(
+            lambda: self._log(values), using=router.db_for_write(type(user))
+        )
+
+    @staticmethod
+    def _log(values):
+        cache.add(LOG_KEY, 0, None)
+        try:
+            position = cache.incr(LOG_KEY)
+        except ValueError:
+            # Счётчик вытеснен между add и incr: без записи в журнал
+            # фильтру верить нельзя.
+            cache.delete(GENERATION_KEY)
+            return
+        cache.set(
+            log_entry_key(position), values,
+            settings.USER_BLOOM_REBUILD_SECONDS,
+        )
+
+
+user_names = UserNamesFilter()
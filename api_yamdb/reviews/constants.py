@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 FIRST_NAME_MAX_LENGTH = 150
 LAST_NAME_MAX_LENGTH = 150
 
@@ -12,5 +14,25 @@ USERNAME_MAX_LENGTH = 150
 USERNAME_RESTRICTED_SLUG = 'me'
 
 EMAIL_MAX_LENGTH = 250
+EMAIL_SUBJECT_MAX_LENGTH = 255
+OUTBOX_KEY_MAX_LENGTH = 100
+
+TEXT_PREVIEW_LENGTH = 60
 
 CSV_PATH = 'static/data'
+
+SHARD_ID_BLOCK_SIZE = 100
+
+# Общая последовательность номеров изменений для /sync/ и номер последнего
+# удалённого из журнала Tombstone изменения.
+CHANGE_SEQUENCE = 'change_seq'
+TOMBSTONE_HORIZON_SEQUENCE = 'tombstone_horizon'
+MODEL_LABEL_MAX_LENGTH = 100
+
+# Номер изменения, по которое построены похожие произведения.
+SIMILAR_TITLES_SEQUENCE = 'similar_titles'
+
+RATING_PRIOR_CACHE_KEY = 'rating-prior'
+
+# Точка отсчёта счёта популярности: события до неё не учитываются.
+TRENDING_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
@@ -0,0 +1,225 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from api_yamdb.db_routers import shard_for_title, sharding_enabled
+from reviews.constants import NAME_MAX_LENGTH
+from reviews.duplicates import forget_reviews
+from reviews.models import (
+    Comment,
+    DeletionJob,
+    Review,
+    Title,
+    Tombstone,
+    User,
+    reserve_change_seqs,
+)
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=5)
+
+_bulk_deletion = ContextVar('bulk_deletion', default=False)
+
+
+@contextmanager
+def bulk_deletion():
+    '''Отключает построчные сигналы удаления: записи в журнал /sync/ и
+    пересчёт рейтинга воркер делает сам, на всю порцию сразу.'''
+    token = _bulk_deletion.set(True)
+    try:
+        yield
+    finally:
+        _bulk_deletion.reset(token)
+
+
+def in_bulk_deletion():
+    return _bulk_deletion.get()
+
+
+def schedule_deletion(instance):
+    '''Сразу скрывает произведение или пользователя и ставит удаление
+    его отзывов и комментариев в очередь воркера run_deletions.'''
+    fields = ['pending_deletion']
+    instance.pending_deletion = True
+    if isinstance(instance, User):
+        # Неактивный пользователь теряет и действующие токены.
+        instance.is_active = False
+        fields.append('is_active')
+    with transaction.atomic():
+        instance.save(update_fields=fields)
+        return DeletionJob.objects.create(
+            model=instance._meta.label_lower,
+            object_id=instance.pk,
+            object_repr=str(instance)[:NAME_MAX_LENGTH],
+        )
+
+
+def claim_deletion_job():
+    '''Берёт в аренду следующую задачу, чтобы параллельные воркеры не
+    выполняли одну задачу одновременно; брошенная задача продолжится
+    после истечения аренды.'''
+    now = timezone.now()
+    jobs = DeletionJob.objects.filter(
+        Q(lease_until__isnull=True) | Q(lease_until__lt=now),
+        status__in=(DeletionJob.PENDING, DeletionJob.RUNNING),
+    )
+    for job in jobs.order_by('pk')[:1]:
+        claimed = DeletionJob.objects.filter(
+            pk=job.pk, lease_until=job.lease_until
+        ).update(status=DeletionJob.RUNNING, lease_until=now + LEASE)
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_deletion_jobs(batch_size=None):
+    '''Выполняет все задачи в очереди, возвращает их число.'''
+    batch_size = batch_size or settings.DELETION_BATCH_SIZE
+    done = 0
+    while (job := claim_deletion_job()) is not None:
+        run_deletion_job(job, batch_size)
+        done += 1
+    return done
+
+
+def run_deletion_job(job, batch_size):
+    model = apps.get_model(job.model)
+    try:
+        with bulk_deletion():
+            for deleted in delete_content(model, job.object_id, batch_size):
+                job.deleted_objects += deleted
+                job.lease_until = timezone.now() + LEASE
+                job.save(update_fields=('deleted_objects', 'lease_until'))
+        # Сам объект удаляется обычным каскадом: содержимого у него уже
+        # нет, а журнал /sync/ получит запись о нём.
+        instance = model._base_manager.filter(pk=job.object_id).first()
+        if instance is not None:
+            instance.delete()
+            job.deleted_objects += 1
+    except Exception as exc:
+        logger.exception(f'Ошибка фонового удаления {job}')
+        job.status = DeletionJob.FAILED
+        job.last_error = str(exc)
+    else:
+        job.status = DeletionJob.DONE
+        job.finished_at = timezone.now()
+    job.lease_until = None
+    job.save()
+
+
+def delete_content(model, object_id, batch_size):
+    '''Удаляет отзывы и комментарии объекта порциями, по одной
+    транзакции на порцию, и отдаёт число удалённых в каждой.'''
+    if model is Title:
+        reviews = Review.objects.using(title_database(object_id)).filter(
+            title_id=object_id
+        )
+        yield from delete_reviews(reviews, batch_size, refresh_titles=False)
+        return
+    for alias in review_write_databases():
+        yield from delete_batches(
+            Comment.objects.using(alias).filter(author_id=object_id),
+            batch_size,
+        )
+        yield from delete_reviews(
+            Review.objects.using(alias).filter(author_id=object_id),
+            batch_size,
+            refresh_titles=True,
+        )
+
+
+def hidden_title_ids():
+    '''Id произведений, ожидающих фонового удаления.'''
+    return list(
+        Title.objects.filter(pending_deletion=True)
+        .values_list('pk', flat=True)
+    )
+
+
+def visible_reviews():
+    '''Отзывы без произведений, ожидающих фонового удаления. В шардах
+    нет строк произведений, поэтому там вместо JOIN исключаются id
+    скрытых произведений - их единицы.'''
+    if sharding_enabled():
+        return Review.objects.exclude(title_id__in=hidden_title_ids())
+    return Review.objects.filter(title__pending_deletion=False)
+
+
+def visible_comments():
+    '''Комментарии без произведений, ожидающих фонового удаления.'''
+    if sharding_enabled():
+        return Comment.objects.exclude(
+            review__title_id__in=hidden_title_ids()
+        )
+    return Comment.objects.filter(review__title__pending_deletion=False)
+
+
+def title_database(title_id):
+    if sharding_enabled():
+        return shard_for_title(title_id)
+    return router.db_for_write(Review)
+
+
+def review_write_databases():
+    return settings.REVIEW_SHARD_ALIASES or [router.db_for_write(Review)]
+
+
+def delete_reviews(reviews, batch_size, refresh_titles):
+    from reviews.signals import refresh_title_counters
+
+    using = reviews.db
+    while True:
+        batch = list(reviews.values_list('pk', 'title_id')[:batch_size])
+        if not batch:
+            return
+        review_ids = [review_id for review_id, _ in batch]
+        # Комментарии - первыми, иначе каскад от порции отзывов
+        # неограниченно вырос бы на популярных отзывах.
+        yield from delete_batches(
+            Comment.objects.using(using).filter(review_id__in=review_ids),
+            batch_size,
+        )
+        yield from delete_batches(
+            Review.objects.using(using).filter(pk__in=review_ids),
+            batch_size,
+        )
+        if refresh_titles:
+            for title_id in {title_id for _, title_id in batch}:
+                refresh_title_counters(title_id, using)
+
+
+def delete_batches(queryset, batch_size):
+    model = queryset.model
+    while True:
+        with transaction.atomic(using=queryset.db):
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return
+            model.objects.using(queryset.db).filter(pk__in=pks).delete()
+            leave_tombstones(model, pks)
+            if model is Review:
+                forget_reviews(pks)
+        yield len(pks)
+
+
+def leave_tombstones(model, pks):
+    with reserve_change_seqs(
+        len(pks), router.db_for_write(Tombstone)
+    ) as change_seqs:
+        Tombstone.objects.bulk_create(
+            Tombstone(
+                model=model._meta.label_lower,
+                object_id=pk,
+                change_seq=change_seq,
+            )
+            for pk, change_seq in zip(pks, change_seqs)
+        )
@@ -0,0 +1,171 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from api_yamdb.db_routers import review_databases
+from reviews.minhash import bucket_keys, from_bytes, signature, signatures
+from reviews.minhash import similarity as estimate
+from reviews.models import (
+    DuplicateReview,
+    Review,
+    ReviewBucket,
+    ReviewSignature,
+)
+
+BATCH_SIZE = 500
+# Сколько отзывов из общих корзин сверяется с новым: одинаковый спам в
+# тысячах отзывов не должен делать сохранение отзыва долгим.
+MAX_CANDIDATES = 1000
+
+
+def index_review(review):
+    '''Подпись и корзины отзыва после сохранения и поиск его дублей.'''
+    value = signature(review.text, settings.DUPLICATE_REVIEW_MIN_WORDS)
+    rows = [(review.pk, review.title_id, value)]
+    store_signatures(rows)
+    record_duplicates(rows)
+
+
+def store_signatures(rows):
+    '''Заменяет подписи и корзины отзывов (review_id, title_id, подпись);
+    у отзыва без подписи - слишком короткого - они просто удаляются.'''
+    review_ids = [review_id for review_id, _, _ in rows]
+    indexed = [row for row in rows if row[2] is not None]
+    with transaction.atomic():
+        forget_signatures(review_ids)
+        ReviewSignature.objects.bulk_create(
+            ReviewSignature(
+                review_id=review_id,
+                title_id=title_id,
+                signature=value.tobytes(),
+            )
+            for review_id, title_id, value in indexed
+        )
+        ReviewBucket.objects.bulk_create(
+            (
+                ReviewBucket(band=band, bucket=bucket, review_id=review_id)
+                for review_id, _, value in indexed
+                for band, bucket in enumerate(bucket_keys(value))
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+
+def forget_signatures(review_ids):
+    ReviewSignature.objects.filter(review_id__in=review_ids).delete()
+    ReviewBucket.objects.filter(review_id__in=review_ids).delete()
+
+
+def forget_reviews(review_ids):
+    '''Убирает удалённые отзывы из индекса и из найденных пар.'''
+    with transaction.atomic():
+        forget_signatures(review_ids)
+        DuplicateReview.objects.filter(
+            Q(review_id__in=review_ids) | Q(duplicate_id__in=review_ids)
+        ).delete()
+
+
+def find_duplicates(review_id, value):
+    '''Отзывы с оценкой сходства не ниже порога: кандидаты - из общих
+    корзин LSH, без перебора всех подписей; сходство проверяется по
+    подписям целиком.'''
+    buckets = reduce(or_, (
+        Q(band=band, bucket=bucket)
+        for band, bucket in enumerate(bucket_keys(value))
+    ))
+    candidate_ids = (
+        ReviewBucket.objects.filter(buckets)
+        .exclude(review_id=review_id)
+        .values_list('review_id', flat=True)
+        .distinct()[:MAX_CANDIDATES]
+    )
+    for other_id, title_id, data in ReviewSignature.objects.filter(
+        review_id__in=list(candidate_ids)
+    ).values_list('review_id', 'title_id', 'signature'):
+        score = estimate(value, from_bytes(data))
+        if score >= settings.DUPLICATE_REVIEW_THRESHOLD:
+            yield other_id, title_id, score
+
+
+def record_duplicates(rows):
+    '''Сохраняет найденные пары; пара, уже отклонённая модератором,
+    не возвращается в список.'''
+    pairs = {}
+    for review_id, title_id, value in rows:
+        if value is None:
+            continue
+        for other_id, other_title_id, score in find_duplicates(
+            review_id, value
+        ):
+            newer, older = sorted(
+                ((review_id, title_id), (other_id, other_title_id)),
+                reverse=True,
+            )
+            pairs[newer[0], older[0]] = DuplicateReview(
+                review_id=newer[0],
+                title_id=newer[1],
+                duplicate_id=older[0],
+                duplicate_title_id=older[1],
+                similarity=score,
+            )
+    DuplicateReview.objects.bulk_create(
+        pairs.values(), batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(pairs)
+
+
+def review_batches(alias, batch_size):
+    reviews = Review.objects.using(alias).order_by('pk')
+    last_id = 0
+    while True:
+        batch = list(
+            reviews.filter(pk__gt=last_id)
+            .values_list('pk', 'title_id', 'text')[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def signed_batches(executor, window, batch_size):
+    '''Порции отзывов всех баз с подписями, по порядку. Подписи считают
+    процессы пула, пока основной процесс пишет готовые порции; в работе
+    не больше window порций, так что память не растёт с числом отзывов.'''
+    min_words = settings.DUPLICATE_REVIEW_MIN_WORDS
+    pending = deque()
+    for alias in review_databases():
+        for batch in review_batches(alias, batch_size):
+            pending.append((batch, executor.submit(
+                signatures, [text for _, _, text in batch], min_words
+            )))
+            if len(pending) >= window:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+    for batch, future in pending:
+        yield batch, future.result()
+
+
+def backfill_signatures(workers=None, batch_size=BATCH_SIZE):
+    '''Строит подписи всех отзывов и ищет среди них дубли, возвращает
+    число отзывов и найденных пар. Подписи - чистый NumPy без базы,
+    поэтому считаются в процессах, а не в потоках.'''
+    workers = workers or os.cpu_count()
+    reviews = pairs = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch, data in signed_batches(executor, 2 * workers, batch_size):
+            rows = [
+                (review_id, title_id, None if value is None
+                 else from_bytes(value))
+                for (review_id, title_id, _), value in zip(batch, data)
+            ]
+            store_signatures(rows)
+            reviews += len(rows)
+            pairs += record_duplicates(rows)
+    return reviews, pairs
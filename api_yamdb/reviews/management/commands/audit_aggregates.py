@@ -0,0 +1,56 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from reviews.aggregates import CHUNK_SIZE, audit_titles
+
+SAMPLE_SIZE = 10
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверка счётчиков рейтинга и популярности произведений с отзывами '
+        'и комментариями, с исправлением по --fix'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Исправить найденные расхождения.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        checked, mismatches, orphans, stale = audit_titles(
+            options['chunk_size'], options['fix']
+        )
+        self.stdout.write(f'Проверено произведений: {checked}')
+        for field, ids in mismatches.items():
+            if len(ids):
+                sample = ', '.join(map(str, ids[:SAMPLE_SIZE].tolist()))
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'{field}: расхождений {len(ids)}, id: {sample}'
+                    )
+                )
+        if orphans:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Отзывов и комментариев без произведения: {orphans}'
+                )
+            )
+        if not any(len(ids) for ids in mismatches.values()):
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        elif options['fix']:
+            # Исправленные счётчики сдвигают и взвешенный рейтинг.
+            call_command('recompute_weighted_ratings', stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS('Расхождения исправлены'))
+            if len(stale):
+                sample = ', '.join(map(str, stale[:SAMPLE_SIZE].tolist()))
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'Изменились во время сверки и не исправлены: '
+                        f'{len(stale)}, id: {sample}. Запустите сверку '
+                        'ещё раз.'
+                    )
+                )
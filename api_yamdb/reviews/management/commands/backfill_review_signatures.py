@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from reviews.duplicates import BATCH_SIZE, backfill_signatures
+
+
+class Command(BaseCommand):
+    help = 'Подписи MinHash всех отзывов и поиск почти одинаковых'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Сколько процессов считают подписи.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        reviews, pairs = backfill_signatures(
+            options['workers'], options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Подписано отзывов: {reviews}, похожих пар: {pairs}'
+            )
+        )
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reviews.similarity import build_similar_titles
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение похожих произведений по оценкам пользователей. '
+        'Если после прошлой сборки что-то изменилось, читаются все '
+        'отзывы: средние пользователей и нормы зависят от всех оценок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=settings.SIMILAR_TITLES_COUNT,
+            help='Сколько похожих произведений хранить для каждого.',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать все произведения, а не только изменившиеся.',
+        )
+
+    def handle(self, *args, **options):
+        updated = build_similar_titles(options['count'], options['full'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пересчитаны похожие для {updated} произведений'
+            )
+        )
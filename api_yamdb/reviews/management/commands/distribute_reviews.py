@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+
+from api_yamdb.db_routers import shard_for_title, sharding_enabled
+from reviews.deletion import bulk_deletion
+from reviews.models import Comment, Review, Sequence
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Перенос отзывов и комментариев из основной базы в шарды'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete-source',
+            action='store_true',
+            help='Удалить перенесённые строки из основной базы.',
+        )
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError(
+                'Шардирование выключено: задайте YAMDB_REVIEW_SHARDS.'
+            )
+        reviews = Review.objects.using(DEFAULT_DB_ALIAS).order_by('pk')
+        moved = self.copy(reviews, lambda review: review.title_id)
+        comments = (
+            Comment.objects.using(DEFAULT_DB_ALIAS)
+            .select_related('review')
+            .order_by('pk')
+        )
+        moved += self.copy(comments, lambda comment: comment.review.title_id)
+
+        for model in (Review, Comment):
+            self.advance_sequence(model)
+        if options['delete_source']:
+            self.delete_source()
+        call_command('recompute_ratings', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Перенесено записей: {moved}'))
+
+    def delete_source(self):
+        # Перенесённые строки не удалены, а переехали в шарды: /sync/ не
+        # должен сообщать клиентам об их удалении, а подписи похожих
+        # отзывов остаются верными - id сохраняются. Счётчики рейтинга
+        # пересчитает recompute_ratings.
+        with bulk_deletion():
+            Comment.objects.using(DEFAULT_DB_ALIAS).all().delete()
+            Review.objects.using(DEFAULT_DB_ALIAS).all().delete()
+
+    def copy(self, queryset, get_title_id):
+        moved = 0
+        batches = defaultdict(list)
+        for obj in queryset.iterator(chunk_size=BATCH_SIZE):
+            alias = shard_for_title(get_title_id(obj))
+            batches[alias].append(obj)
+            if len(batches[alias]) >= BATCH_SIZE:
+                moved += self.flush(queryset.model, alias, batches.pop(alias))
+        for alias, objs in batches.items():
+            moved += self.flush(queryset.model, alias, objs)
+        return moved
+
+    def flush(self, model, alias, objs):
+        model.objects.using(alias).bulk_create(objs, ignore_conflicts=True)
+        return len(objs)
+
+    def advance_sequence(self, model):
+        '''Новые id из общей последовательности не должны совпасть
+        с перенесёнными.'''
+        max_id = (
+            model.objects.using(DEFAULT_DB_ALIAS).aggregate(Max('pk'))[
+                'pk__max'
+            ]
+            or 0
+        )
+        sequence, _ = Sequence.objects.get_or_create(
+            name=model._meta.label_lower
+        )
+        if sequence.value < max_id:
+            Sequence.objects.filter(pk=sequence.pk).update(value=max_id)
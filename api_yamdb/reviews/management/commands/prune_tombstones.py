@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from reviews.constants import TOMBSTONE_HORIZON_SEQUENCE
+from reviews.models import ChangeReservation, Sequence, Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Удаление старых записей об удалённых объектах для /sync/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.SYNC_TOMBSTONE_DAYS,
+            help='Сколько дней хранить записи об удалениях.',
+        )
+
+    def handle(self, *args, **options):
+        # Отметки откатившихся транзакций /sync/ уже не учитывает.
+        ChangeReservation.objects.filter(
+            expires_at__lte=timezone.now()
+        ).delete()
+        border = timezone.now() - timedelta(days=options['days'])
+        horizon = Tombstone.objects.filter(deleted_at__lt=border).aggregate(
+            horizon=Max('change_seq')
+        )['horizon']
+        if horizon is None:
+            self.stdout.write('Устаревших записей нет')
+            return
+        with transaction.atomic():
+            # Клиенты с курсором раньше горизонта могли пропустить удаления:
+            # /sync/ отправит их на полную загрузку.
+            sequence, _ = Sequence.objects.select_for_update().get_or_create(
+                name=TOMBSTONE_HORIZON_SEQUENCE
+            )
+            if sequence.value < horizon:
+                sequence.value = horizon
+                sequence.save(update_fields=('value',))
+            deleted, _ = Tombstone.objects.filter(
+                change_seq__lte=horizon
+            ).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено записей об удалениях: {deleted}')
+        )
@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from api_yamdb.db_routers import map_review_databases
+from reviews.models import Review, Title, reserve_change_seqs
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков рейтинга произведений по всем шардам'
+
+    def handle(self, *args, **options):
+        totals = defaultdict(lambda: [0, 0])
+        for partial in map_review_databases(self.collect_totals):
+            for title_id, review_count, score_total in partial:
+                totals[title_id][0] += review_count
+                totals[title_id][1] += score_total
+
+        changed = []
+        for title in Title.objects.only(
+            'id', 'review_count', 'score_total'
+        ).iterator(chunk_size=BATCH_SIZE):
+            review_count, score_total = totals.get(title.pk, (0, 0))
+            if (title.review_count, title.score_total) != (
+                review_count,
+                score_total,
+            ):
+                title.review_count = review_count
+                title.score_total = score_total
+                changed.append(title)
+        # Рейтинг - часть произведения в /sync/.
+        if changed:
+            with reserve_change_seqs(len(changed)) as change_seqs:
+                for title, change_seq in zip(changed, change_seqs):
+                    title.change_seq = change_seq
+                Title.objects.bulk_update(
+                    changed,
+                    ('review_count', 'score_total', 'change_seq'),
+                    batch_size=BATCH_SIZE,
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обновлены счётчики {len(changed)} произведений'
+            )
+        )
+        # Счётчики сдвигают и среднюю оценку по всем произведениям.
+        call_command('recompute_weighted_ratings', stdout=self.stdout)
+
+    def collect_totals(self, alias):
+        '''Частичные суммы по одной базе, выполняется в отдельном потоке.'''
+        return list(
+            Review.objects.using(alias)
+            .values('title_id')
+            .annotate(review_count=Count('id'), score_total=Sum('score'))
+            .values_list('title_id', 'review_count', 'score_total')
+            .order_by()
+        )
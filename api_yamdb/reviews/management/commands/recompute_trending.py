@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from reviews.trending import recompute_trending
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт популярности произведений по всем отзывам и комментариям'
+
+    def handle(self, *args, **options):
+        updated = recompute_trending()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пересчитана популярность {updated} произведений'
+            )
+        )
@@ -0,0 +1,60 @@
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from reviews.constants import RATING_PRIOR_CACHE_KEY
+from reviews.models import Title, mean_score, weighted_rating
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 10_000
+# Изменения меньше этого не стоят записи в базу.
+TOLERANCE = 1e-9
+
+TITLE_DTYPE = np.dtype([
+    ('id', np.int64),
+    ('review_count', np.int64),
+    ('score_total', np.int64),
+    ('weighted_rating', np.float64),
+])
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт взвешенного рейтинга по текущей средней оценке'
+
+    def handle(self, *args, **options):
+        titles = np.fromiter(
+            Title.objects.order_by()
+            .values_list(*TITLE_DTYPE.names)
+            .iterator(chunk_size=CHUNK_SIZE),
+            dtype=TITLE_DTYPE,
+        )
+        prior = mean_score(
+            int(titles['review_count'].sum()),
+            int(titles['score_total'].sum()),
+        )
+        ratings = weighted_rating(
+            titles['review_count'], titles['score_total'], prior
+        )
+        changed = np.flatnonzero(
+            np.abs(ratings - titles['weighted_rating']) > TOLERANCE
+        )
+        Title.objects.bulk_update(
+            (
+                Title(id=title_id, weighted_rating=rating)
+                for title_id, rating in zip(
+                    titles['id'][changed].tolist(), ratings[changed].tolist()
+                )
+            ),
+            ('weighted_rating',),
+            batch_size=BATCH_SIZE,
+        )
+        cache.set(
+            RATING_PRIOR_CACHE_KEY, prior, settings.RATING_PRIOR_CACHE_TIMEOUT
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Средняя оценка {prior:.3f}, обновлён взвешенный рейтинг '
+                f'{len(changed)} произведений'
+            )
+        )
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reviews.deletion import run_deletion_jobs
+
+
+class Command(BaseCommand):
+    help = 'Фоновое удаление произведений и пользователей порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.DELETION_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Работать постоянно, опрашивая очередь каждые N секунд.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            done = run_deletion_jobs(options['batch_size'])
+            if done:
+                self.stdout.write(f'Выполнено задач удаления: {done}')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'Копирование основной базы SQLite в реплику для чтения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Повторять синхронизацию каждые N секунд.',
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=-1,
+            help='Сколько страниц копировать за один шаг backup API.',
+        )
+
+    def handle(self, *args, **options):
+        alias = settings.REPLICA_DATABASE_ALIAS
+        if alias not in settings.DATABASES:
+            raise CommandError(
+                'Реплика не настроена: задайте переменную YAMDB_REPLICA_DB.'
+            )
+        source = connections[DEFAULT_DB_ALIAS]
+        target = connections[alias]
+        if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+            raise CommandError(
+                'sync_replica работает только с SQLite, для других СУБД '
+                'используйте встроенную репликацию.'
+            )
+
+        while True:
+            started = time.monotonic()
+            self.backup(source, target, options['pages'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    'Реплика синхронизирована за '
+                    f'{time.monotonic() - started:.3f} с'
+                )
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def backup(self, source, target, pages):
+        '''Онлайн-копия через sqlite3 backup API: читатели реплики
+        видят либо старый, либо новый снимок целиком.'''
+        source.ensure_connection()
+        target.ensure_connection()
+        source.connection.backup(target.connection, pages=pages)
@@ -0,0 +1,41 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from reviews.recommendations import (
+    FACTORS,
+    ITERATIONS,
+    REGULARIZATION,
+    train_recommendations,
+)
+
+
+class Command(BaseCommand):
+    help = 'Обучение факторов ALS для персональных рекомендаций'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=FACTORS)
+        parser.add_argument('--iterations', type=int, default=ITERATIONS)
+        parser.add_argument(
+            '--regularization', type=float, default=REGULARIZATION
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Сколько потоков решают блоки пользователей и произведений.',
+        )
+
+    def handle(self, *args, **options):
+        titles, users, rmse = train_recommendations(
+            rank=options['factors'],
+            iterations=options['iterations'],
+            regularization=options['regularization'],
+            workers=options['workers'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Факторы обучены: произведений {titles}, пользователей '
+                f'{users}, RMSE {rmse:.3f}'
+            )
+        )
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.9 on 2026-10-19 08:59
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_title_counters(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    Review = apps.get_model('reviews', 'Review')
+    db_alias = schema_editor.connection.alias
+    totals = (
+        Review.objects.using(db_alias)
+        .values('title_id')
+        .annotate(review_count=Count('id'), score_total=Sum('score'))
+        .order_by()
+    )
+    for row in totals:
+        Title.objects.using(db_alias).filter(pk=row['title_id']).update(
+            review_count=row['review_count'],
+            score_total=row['score_total'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0004_alter_comment_options_alter_review_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='имя')),
+                ('value', models.BigIntegerField(default=0, verbose_name='значение')),
+            ],
+            options={
+                'verbose_name': 'Последовательность',
+                'verbose_name_plural': 'Последовательности',
+            },
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='количество отзывов'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='score_total',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='сумма оценок'),
+        ),
+        migrations.RunPython(fill_title_counters, migrations.RunPython.noop),
+    ]
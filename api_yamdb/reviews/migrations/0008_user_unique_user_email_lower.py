@@ -0,0 +1,48 @@
+# Generated by Django 5.2.9 on 2026-10-19 09:15
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+EMAIL_MAX_LENGTH = 250
+
+
+def resolve_duplicate_emails(apps, schema_editor):
+    # Email, различающийся только регистром, оставляем самому старому
+    # пользователю; остальным - адрес с префиксом duplicate-{id}-, по
+    # которому их найдёт администратор.
+    User = apps.get_model('reviews', 'User')
+    users = User.objects.using(schema_editor.connection.alias)
+    duplicates = (
+        users.values(email_lower=Lower('email'))
+        .annotate(count=Count('pk'))
+        .filter(count__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    for email in duplicates:
+        for user in users.alias(email_lower=Lower('email')).filter(
+            email_lower=email
+        ).order_by('pk')[1:]:
+            user.email = f'duplicate-{user.pk}-{user.email}'[
+                :EMAIL_MAX_LENGTH
+            ]
+            user.save(update_fields=('email',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('reviews', '0007_user_token_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            resolve_duplicate_emails, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='unique user email lower'),
+        ),
+    ]
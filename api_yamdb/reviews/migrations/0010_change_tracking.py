@@ -0,0 +1,81 @@
+# Generated by Django 5.2.9 on 2026-10-19 09:51
+
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+from django.db.models import F
+
+CHANGE_SEQUENCE = 'change_seq'
+
+
+def fill_change_seq(apps, schema_editor):
+    # Каждой существующей строке - свой номер из общей последовательности
+    # основной базы, иначе курсор /sync/ не сможет пройти по ним пачками.
+    Sequence = apps.get_model('reviews', 'Sequence')
+    db_alias = schema_editor.connection.alias
+    for name in ('Category', 'Genre', 'Title', 'Review', 'Comment'):
+        model = apps.get_model('reviews', name)
+        pks = list(
+            model.objects.using(db_alias)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        if not pks:
+            continue
+        sequences = Sequence.objects.using(DEFAULT_DB_ALIAS)
+        sequences.get_or_create(name=CHANGE_SEQUENCE)
+        sequences.filter(name=CHANGE_SEQUENCE).update(
+            value=F('value') + len(pks)
+        )
+        last = sequences.get(name=CHANGE_SEQUENCE).value
+        for change_seq, pk in enumerate(pks, last - len(pks) + 1):
+            model.objects.using(db_alias).filter(pk=pk).update(
+                change_seq=change_seq
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0009_review_author_pub_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='модель')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('change_seq', models.BigIntegerField(unique=True, verbose_name='номер изменения')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='время удаления')),
+            ],
+            options={
+                'verbose_name': 'Удалённый объект',
+                'verbose_name_plural': 'Удалённые объекты',
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='номер изменения'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='номер изменения'),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='номер изменения'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='номер изменения'),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='номер изменения'),
+        ),
+        migrations.RunPython(fill_change_seq, migrations.RunPython.noop),
+    ]
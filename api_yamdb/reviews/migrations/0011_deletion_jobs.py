@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-19 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0010_change_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='модель')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('object_repr', models.CharField(max_length=200, verbose_name='объект')),
+                ('status', models.CharField(choices=[('pending', 'в очереди'), ('running', 'выполняется'), ('done', 'завершено'), ('failed', 'ошибка')], db_index=True, default='pending', max_length=7, verbose_name='состояние')),
+                ('deleted_objects', models.PositiveIntegerField(default=0, verbose_name='удалено объектов')),
+                ('lease_until', models.DateTimeField(blank=True, null=True, verbose_name='занято воркером до')),
+                ('last_error', models.TextField(blank=True, verbose_name='ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создано')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='завершено')),
+            ],
+            options={
+                'verbose_name': 'Фоновое удаление',
+                'verbose_name_plural': 'Фоновые удаления',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='pending_deletion',
+            field=models.BooleanField(default=False, editable=False, verbose_name='ожидает удаления'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='pending_deletion',
+            field=models.BooleanField(default=False, editable=False, verbose_name='ожидает удаления'),
+        ),
+    ]
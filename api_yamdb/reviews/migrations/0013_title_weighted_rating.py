@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-19 10:15
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast
+
+SCORE_MIN_VALUE = 1
+SCORE_MAX_VALUE = 10
+
+
+def fill_weighted_rating(apps, schema_editor):
+    # Одним UPDATE по текущей средней оценке всех произведений.
+    Title = apps.get_model('reviews', 'Title')
+    titles = Title.objects.using(schema_editor.connection.alias)
+    totals = titles.aggregate(
+        review_count=Sum('review_count'), score_total=Sum('score_total')
+    )
+    if totals['review_count']:
+        prior = totals['score_total'] / totals['review_count']
+    else:
+        prior = (SCORE_MIN_VALUE + SCORE_MAX_VALUE) / 2
+    min_reviews = settings.WEIGHTED_RATING_MIN_REVIEWS
+    titles.update(
+        weighted_rating=(
+            (Cast('score_total', FloatField()) + min_reviews * prior)
+            / (F('review_count') + min_reviews)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0012_similar_titles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='weighted_rating',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='взвешенный рейтинг'),
+        ),
+        migrations.RunPython(fill_weighted_rating, migrations.RunPython.noop),
+    ]
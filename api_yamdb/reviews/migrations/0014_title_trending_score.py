@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-19 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0013_title_weighted_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='популярность сейчас'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.9 on 2026-10-19 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0014_title_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSignature',
+            fields=[
+                ('review_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='id отзыва')),
+                ('title_id', models.BigIntegerField(verbose_name='id произведения')),
+                ('signature', models.BinaryField(verbose_name='подпись')),
+            ],
+            options={
+                'verbose_name': 'Подпись отзыва',
+                'verbose_name_plural': 'Подписи отзывов',
+            },
+        ),
+        migrations.CreateModel(
+            name='DuplicateReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_id', models.BigIntegerField(verbose_name='id отзыва')),
+                ('title_id', models.BigIntegerField(verbose_name='id произведения')),
+                ('duplicate_id', models.BigIntegerField(db_index=True, verbose_name='id похожего отзыва')),
+                ('duplicate_title_id', models.BigIntegerField(verbose_name='id произведения похожего отзыва')),
+                ('similarity', models.FloatField(verbose_name='сходство')),
+                ('dismissed', models.BooleanField(default=False, verbose_name='отклонено модератором')),
+                ('detected_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='найдено')),
+            ],
+            options={
+                'verbose_name': 'Похожие отзывы',
+                'verbose_name_plural': 'Похожие отзывы',
+                'ordering': ('-detected_at', '-pk'),
+                'constraints': [models.UniqueConstraint(fields=('review_id', 'duplicate_id'), name='unique duplicate review')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='полоса')),
+                ('bucket', models.BigIntegerField(verbose_name='корзина')),
+                ('review_id', models.BigIntegerField(db_index=True, verbose_name='id отзыва')),
+            ],
+            options={
+                'verbose_name': 'Корзина LSH',
+                'verbose_name_plural': 'Корзины LSH',
+                'indexes': [models.Index(fields=['band', 'bucket'], name='review_bucket_band_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-19 10:44
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_failed_emails(apps, schema_editor):
+    # Письма, исчерпавшие попытки, раньше оставались неотправленными
+    # без следующей попытки.
+    OutgoingEmail = apps.get_model('reviews', 'OutgoingEmail')
+    OutgoingEmail.objects.using(schema_editor.connection.alias).filter(
+        sent_at__isnull=True, next_attempt_at__isnull=True
+    ).update(failed_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0015_review_duplicates'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='outgoingemail',
+            name='unique pending email',
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='не доставлено'),
+        ),
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='у воркера до'),
+        ),
+        migrations.RunPython(
+            mark_failed_emails, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='outgoingemail',
+            constraint=models.UniqueConstraint(condition=models.Q(('failed_at__isnull', True), ('lease_until__isnull', True), ('sent_at__isnull', True)), fields=('dedup_key',), name='unique queued email'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0016_outgoingemail_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('change_seq', models.BigIntegerField(unique=True, verbose_name='первый номер')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='действует до')),
+            ],
+            options={
+                'verbose_name': 'Незавершённое изменение',
+                'verbose_name_plural': 'Незавершённые изменения',
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+'''MinHash-подписи текстов и ключи корзин LSH.
+
+Модуль не обращается к Django и базе: его функции выполняются в
+процессах пула команды backfill_review_signatures.
+'''
+import hashlib
+import re
+import zlib
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Простое меньше 2**32: a * x + b для 32-битных a, b, x умещается в uint64.
+PRIME = 4_294_967_291
+# Смена зерна делает все сохранённые подписи несравнимыми с новыми.
+SEED = 50
+
+WORD = re.compile(r'\w+')
+
+_a, _b = np.random.default_rng(SEED).integers(
+    1, PRIME, size=(2, NUM_PERM, 1), dtype=np.uint64
+)
+
+
+def shingles(words):
+    '''Хеши различных последовательностей из SHINGLE_SIZE слов.'''
+    grams = {
+        ' '.join(words[start:start + SHINGLE_SIZE])
+        for start in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    }
+    return np.fromiter(
+        (zlib.crc32(gram.encode()) for gram in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+def signature(text, min_words):
+    '''NUM_PERM минимумов хешей шинглов: доля совпадающих позиций двух
+    подписей оценивает коэффициент Жаккара их текстов.
+
+    Для текстов короче min_words - None: одинаковые «Отлично!» у разных
+    авторов - не спам.
+    '''
+    words = WORD.findall(text.lower())
+    if len(words) < min_words:
+        return None
+    return ((_a * shingles(words) + _b) % PRIME).min(axis=1).astype(
+        np.uint32
+    )
+
+
+def signatures(texts, min_words):
+    '''Подписи пачки текстов в байтах - для пула процессов.'''
+    return [
+        None if value is None else value.tobytes()
+        for value in (signature(text, min_words) for text in texts)
+    ]
+
+
+def from_bytes(data):
+    return np.frombuffer(data, dtype=np.uint32)
+
+
+def bucket_keys(value):
+    '''Ключ корзины для каждой из BANDS полос по ROWS значений: тексты
+    попадают в общую корзину, если совпала хотя бы одна полоса.'''
+    return [
+        int.from_bytes(
+            hashlib.blake2b(band.tobytes(), digest_size=8).digest(),
+            'big',
+            signed=True,
+        )
+        for band in value.reshape(BANDS, ROWS)
+    ]
+
+
+def similarity(first, second):
+    return float(np.mean(first == second))
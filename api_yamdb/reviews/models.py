@@ -1,14 +1,31 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, router, transaction
+from django.db.models import Case, F, FloatField, Min, Sum, Value, When
+from django.db.models.functions import Cast, Lower
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from api_yamdb.db_routers import sharding_enabled
 
 from reviews.constants import (
+    CHANGE_SEQUENCE,
     EMAIL_MAX_LENGTH,
+    EMAIL_SUBJECT_MAX_LENGTH,
     FIRST_NAME_MAX_LENGTH,
     LAST_NAME_MAX_LENGTH,
+    MODEL_LABEL_MAX_LENGTH,
     NAME_MAX_LENGTH,
+    OUTBOX_KEY_MAX_LENGTH,
+    RATING_PRIOR_CACHE_KEY,
     SCORE_MAX_VALUE,
     SCORE_MIN_VALUE,
+    TEXT_PREVIEW_LENGTH,
     TITLE_NAME_MAX_LENGTH,
     USERNAME_MAX_LENGTH,
 )
@@ -26,6 +43,38 @@ ROLE_CHOICES = [
 
 ROLE_MAX_LENGTH = max(len(role) for role, _ in ROLE_CHOICES)
 
+# Поля, которые попадают в claims токена: их изменение отзывает токены.
+TOKEN_CLAIM_FIELDS = ('username', 'role', 'is_staff', 'is_superuser',
+                      'is_active')
+
+
+class ChangeTrackedModel(models.Model):
+    '''Хранит номер последнего изменения из общей последовательности.
+
+    По нему /sync/ отдаёт клиенту только изменившееся после его курсора.
+    '''
+    change_seq = models.BigIntegerField(
+        verbose_name='номер изменения',
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with reserve_change_seqs(using=using) as change_seqs:
+            self.change_seq = change_seqs[0]
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {
+                    *kwargs['update_fields'], 'change_seq'
+                }
+            super().save(*args, **kwargs)
+
 
 class NamedModel(models.Model):
     name = models.CharField(verbose_name='имя', max_length=NAME_MAX_LENGTH)
@@ -67,15 +116,75 @@ class User(AbstractUser):
     last_name = models.CharField(
         verbose_name='фамилия', max_length=LAST_NAME_MAX_LENGTH, blank=True
     )
+    token_version = models.PositiveIntegerField(
+        verbose_name='версия токенов', default=0, editable=False
+    )
+    pending_deletion = models.BooleanField(
+        verbose_name='ожидает удаления', default=False, editable=False
+    )
 
     class Meta:
         ordering = ('username',)
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        constraints = (
+            models.UniqueConstraint(
+                Lower('email'), name='unique user email lower'
+            ),
+        )
 
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._token_claims = user.get_token_claims()
+        return user
+
+    def save(self, *args, **kwargs):
+        claims = getattr(self, '_token_claims', None)
+        if claims is not None and claims != self.get_token_claims():
+            self.token_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {
+                    *kwargs['update_fields'], 'token_version'
+                }
+        super().save(*args, **kwargs)
+        self._token_claims = self.get_token_claims()
+        if self.is_active:
+            cache.set(
+                self.token_version_cache_key(self.pk),
+                self.token_version,
+                settings.TOKEN_VERSION_CACHE_TIMEOUT,
+            )
+        else:
+            cache.delete(self.token_version_cache_key(self.pk))
+
+    def get_token_claims(self):
+        return tuple(self.__dict__.get(field) for field in TOKEN_CLAIM_FIELDS)
+
+    @staticmethod
+    def token_version_cache_key(user_id):
+        return f'token-version:{user_id}'
+
+    @classmethod
+    def get_token_version(cls, user_id):
+        '''Текущая версия токенов активного пользователя или None.'''
+        key = cls.token_version_cache_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            version = (
+                cls.objects.filter(pk=user_id, is_active=True)
+                .values_list('token_version', flat=True)
+                .first()
+            )
+            if version is not None:
+                cache.set(
+                    key, version, settings.TOKEN_VERSION_CACHE_TIMEOUT
+                )
+        return version
+
     @property
     def is_admin(self):
         return self.role == ADMIN or self.is_staff
@@ -85,7 +194,15 @@ class User(AbstractUser):
         return self.role == MODERATOR
 
 
-class TextAuthorDateModel(models.Model):
+class AuthoredQuerySet(models.QuerySet):
+    def with_author(self):
+        if sharding_enabled():
+            # Пользователи живут в основной базе, JOIN из шарда невозможен.
+            return self.prefetch_related('author')
+        return self.select_related('author')
+
+
+class TextAuthorDateModel(ChangeTrackedModel):
     text = models.TextField()
     author = models.ForeignKey(
         User,
@@ -96,12 +213,14 @@ class TextAuthorDateModel(models.Model):
         verbose_name='дата публикации', auto_now_add=True, db_index=True
     )
 
+    objects = AuthoredQuerySet.as_manager()
+
     class Meta:
         abstract = True
         ordering = ('pub_date',)
 
     def __str__(self):
-        return self.text
+        return Truncator(self.text).chars(TEXT_PREVIEW_LENGTH)
 
 
 class SlugModel(models.Model):
@@ -111,19 +230,164 @@ class SlugModel(models.Model):
         abstract = True
 
 
-class Category(NamedModel, SlugModel):
+class Category(ChangeTrackedModel, NamedModel, SlugModel):
     class Meta(SlugModel.Meta):
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
 
 
-class Genre(NamedModel, SlugModel):
+class Genre(ChangeTrackedModel, NamedModel, SlugModel):
     class Meta(SlugModel.Meta):
         verbose_name = 'Жанр'
         verbose_name_plural = 'Жанры'
 
 
-class Title(models.Model):
+class Sequence(models.Model):
+    name = models.CharField(
+        verbose_name='имя', max_length=NAME_MAX_LENGTH, unique=True
+    )
+    value = models.BigIntegerField(verbose_name='значение', default=0)
+
+    class Meta:
+        verbose_name = 'Последовательность'
+        verbose_name_plural = 'Последовательности'
+
+    def __str__(self):
+        return f'{self.name}={self.value}'
+
+    @classmethod
+    def reserve(cls, name, size=1):
+        '''Резервирует size следующих значений, всегда в основной базе.'''
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            manager = cls.objects.db_manager(DEFAULT_DB_ALIAS)
+            manager.get_or_create(name=name)
+            manager.filter(name=name).update(value=F('value') + size)
+            value = manager.get(name=name).value
+        return range(value - size + 1, value + 1)
+
+    @classmethod
+    def current(cls, name, using=DEFAULT_DB_ALIAS):
+        '''Последнее выданное значение, 0 для ещё не созданной.'''
+        return cls.objects.db_manager(using).filter(
+            name=name
+        ).values_list('value', flat=True).first() or 0
+
+
+class ChangeReservation(models.Model):
+    '''Номера изменений, выданные ещё не закоммиченной записи.
+
+    Номер выдаётся до коммита строки, и строки коммитятся не по порядку
+    номеров. Пока отметка жива, /sync/ не отдаёт изменения с номером от
+    неё и дальше, иначе курсор клиента перешагнул бы строку, которая
+    появится позже с меньшим номером.
+    '''
+    change_seq = models.BigIntegerField(
+        verbose_name='первый номер', unique=True
+    )
+    expires_at = models.DateTimeField(
+        verbose_name='действует до', db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Незавершённое изменение'
+        verbose_name_plural = 'Незавершённые изменения'
+
+    def __str__(self):
+        return str(self.change_seq)
+
+    def release(self):
+        type(self).objects.db_manager(DEFAULT_DB_ALIAS).filter(
+            pk=self.pk
+        ).delete()
+
+    @classmethod
+    def committed_seq(cls):
+        '''Номер, по который включительно все изменения закоммичены.
+
+        Читается из той же базы, что и строки для /sync/: у реплики своя
+        граница. Отметку, которой дольше SYNC_RESERVATION_TIMEOUT, считаем
+        откатившейся транзакцией.
+        '''
+        using = router.db_for_read(cls)
+        # Сначала последовательность: номер и отметка выдаются одной
+        # транзакцией, так что все незавершённые номера до last уже видны.
+        last = Sequence.current(CHANGE_SEQUENCE, using)
+        pending = cls.objects.using(using).filter(
+            expires_at__gt=timezone.now()
+        ).aggregate(first=Min('change_seq'))['first']
+        return last if pending is None else min(last, pending - 1)
+
+
+@contextmanager
+def reserve_change_seqs(size=1, using=DEFAULT_DB_ALIAS):
+    '''Номера изменений для записи строк в базу using.
+
+    Номера и ChangeReservation выдаются отдельной транзакцией в основной
+    базе, тело выполняется в транзакции using, отметка снимается после её
+    коммита или сразу при откате. Блокировка Sequence короткая, только
+    если вызов не вложен во внешний atomic() основной базы. Во вложенном
+    вызове выдача номеров - лишь точка сохранения внешней транзакции, и
+    строка Sequence остаётся заблокированной до её коммита. Так бывает при
+    сдвиге счётчиков произведения из post_save отзыва, который пишется в
+    теле этой же функции, и в порциях delete_batches. Отдельное соединение
+    здесь не поможет: в SQLite оно ждало бы внешнюю транзакцию, уже
+    держащую блокировку записи.
+    '''
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        change_seqs = Sequence.reserve(CHANGE_SEQUENCE, size)
+        reservation = ChangeReservation.objects.db_manager(
+            DEFAULT_DB_ALIAS
+        ).create(
+            change_seq=change_seqs[0],
+            expires_at=timezone.now() + timedelta(
+                seconds=settings.SYNC_RESERVATION_TIMEOUT
+            ),
+        )
+    try:
+        with transaction.atomic(using=using):
+            yield change_seqs
+            transaction.on_commit(reservation.release, using=using)
+    except BaseException:
+        reservation.release()
+        raise
+
+
+class Tombstone(models.Model):
+    '''След удалённого объекта, чтобы /sync/ сообщил о нём клиентам.'''
+    model = models.CharField(
+        verbose_name='модель', max_length=MODEL_LABEL_MAX_LENGTH
+    )
+    object_id = models.BigIntegerField(verbose_name='id объекта')
+    change_seq = models.BigIntegerField(
+        verbose_name='номер изменения', unique=True
+    )
+    deleted_at = models.DateTimeField(
+        verbose_name='время удаления', auto_now_add=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+
+    def __str__(self):
+        return f'{self.model}:{self.object_id}'
+
+
+class TitleQuerySet(models.QuerySet):
+    def with_rating(self):
+        # Средняя оценка из счётчиков, которые поддерживают сигналы:
+        # без JOIN с отзывами (которые к тому же могут лежать в шардах)
+        # и без GROUP BY как в странице, так и в COUNT(*) по ней.
+        return self.annotate(
+            rating=Case(
+                When(review_count=0, then=Value(None)),
+                default=Cast('score_total', FloatField()) / F('review_count'),
+                output_field=FloatField(),
+            )
+        )
+
+
+class Title(ChangeTrackedModel):
     name = models.CharField(
         verbose_name='название',
         max_length=TITLE_NAME_MAX_LENGTH,
@@ -146,6 +410,29 @@ class Title(models.Model):
     genre = models.ManyToManyField(
         Genre, related_name='titles', verbose_name='жанр'
     )
+    review_count = models.PositiveIntegerField(
+        verbose_name='количество отзывов', default=0, editable=False
+    )
+    score_total = models.PositiveIntegerField(
+        verbose_name='сумма оценок', default=0, editable=False
+    )
+    weighted_rating = models.FloatField(
+        verbose_name='взвешенный рейтинг',
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    trending_score = models.FloatField(
+        verbose_name='популярность сейчас',
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    pending_deletion = models.BooleanField(
+        verbose_name='ожидает удаления', default=False, editable=False
+    )
+
+    objects = TitleQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Произведение'
@@ -154,6 +441,76 @@ class Title(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.weighted_rating = weighted_rating(
+                self.review_count, self.score_total, rating_prior()
+            )
+        super().save(*args, **kwargs)
+
+
+def weighted_rating(review_count, score_total, prior):
+    '''Байесовская средняя, как в топе IMDb: средняя оценка произведения,
+    стянутая к prior тем сильнее, чем меньше у него отзывов.
+
+    Считает и для чисел, и для массивов NumPy.
+    '''
+    min_reviews = settings.WEIGHTED_RATING_MIN_REVIEWS
+    return (score_total + min_reviews * prior) / (review_count + min_reviews)
+
+
+def mean_score(review_count, score_total):
+    if not review_count:
+        return (SCORE_MIN_VALUE + SCORE_MAX_VALUE) / 2
+    return score_total / review_count
+
+
+def rating_prior():
+    '''Средняя оценка по всем отзывам; точное значение ставит
+    recompute_weighted_ratings, между запусками оно кешируется.'''
+    prior = cache.get(RATING_PRIOR_CACHE_KEY)
+    if prior is None:
+        totals = Title.objects.aggregate(
+            review_count=Sum('review_count'), score_total=Sum('score_total')
+        )
+        prior = mean_score(totals['review_count'], totals['score_total'])
+        cache.set(
+            RATING_PRIOR_CACHE_KEY, prior, settings.RATING_PRIOR_CACHE_TIMEOUT
+        )
+    return prior
+
+
+class SimilarTitle(models.Model):
+    '''Сосед произведения по оценкам, строит build_similar_titles.'''
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='similar_titles',
+        verbose_name='произведение',
+    )
+    similar = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='похожее произведение',
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='место')
+    score = models.FloatField(verbose_name='сходство')
+
+    class Meta:
+        ordering = ('title', 'rank')
+        verbose_name = 'Похожее произведение'
+        verbose_name_plural = 'Похожие произведения'
+        constraints = (
+            # Индекс (title, rank) отдаёт /titles/{id}/similar/ по порядку.
+            models.UniqueConstraint(
+                fields=('title', 'rank'), name='unique similar title rank'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.title_id} -> {self.similar_id} ({self.score:.3f})'
+
 
 class Review(TextAuthorDateModel):
     title = models.ForeignKey(
@@ -187,6 +544,13 @@ class Review(TextAuthorDateModel):
                 )
             ),
         )
+        indexes = (
+            # Лента отзывов пользователя: /users/{username}/reviews/.
+            models.Index(
+                fields=('author', 'pub_date'),
+                name='review_author_pub_date_idx',
+            ),
+        )
         default_related_name = 'reviews'
 
 
@@ -201,3 +565,228 @@ class Comment(TextAuthorDateModel):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         default_related_name = 'comments'
+
+
+class OutgoingEmailQuerySet(models.QuerySet):
+    def pending(self):
+        return self.filter(sent_at__isnull=True, failed_at__isnull=True)
+
+    def queued(self):
+        '''Неотправленные письма, которые сейчас не у воркера.'''
+        return self.pending().filter(lease_until__isnull=True)
+
+    def failed(self):
+        return self.filter(failed_at__isnull=False)
+
+    def due(self, now=None):
+        now = now or timezone.now()
+        return self.pending().filter(
+            models.Q(lease_until__isnull=True) | models.Q(lease_until__lt=now),
+            next_attempt_at__lte=now,
+        )
+
+    def enqueue(self, key, sender, recipient, subject, body):
+        '''Ставит письмо в очередь. Неотправленное письмо с тем же
+        ключом заменяется: повторная регистрация не плодит писем.
+
+        Письмо, которое уже отправляет воркер, не трогаем - иначе он
+        отметил бы отправленным новый текст, - и ставим новое рядом.
+        '''
+        email, _ = self.queued().update_or_create(
+            dedup_key=key,
+            defaults={
+                'sender': sender,
+                'recipient': recipient,
+                'subject': subject,
+                'body': body,
+                'attempts': 0,
+                'next_attempt_at': timezone.now(),
+                'last_error': '',
+            },
+        )
+        return email
+
+
+class OutgoingEmail(models.Model):
+    dedup_key = models.CharField(
+        verbose_name='ключ', max_length=OUTBOX_KEY_MAX_LENGTH
+    )
+    sender = models.EmailField(
+        verbose_name='отправитель', max_length=EMAIL_MAX_LENGTH
+    )
+    recipient = models.EmailField(
+        verbose_name='получатель', max_length=EMAIL_MAX_LENGTH
+    )
+    subject = models.CharField(
+        verbose_name='тема', max_length=EMAIL_SUBJECT_MAX_LENGTH
+    )
+    body = models.TextField(verbose_name='текст')
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='попыток', default=0
+    )
+    next_attempt_at = models.DateTimeField(
+        verbose_name='следующая попытка',
+        default=timezone.now,
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+    sent_at = models.DateTimeField(
+        verbose_name='отправлено', null=True, blank=True
+    )
+    lease_until = models.DateTimeField(
+        verbose_name='у воркера до', null=True, blank=True
+    )
+    failed_at = models.DateTimeField(
+        verbose_name='не доставлено', null=True, blank=True, db_index=True
+    )
+    last_error = models.TextField(verbose_name='ошибка', blank=True)
+    created_at = models.DateTimeField(
+        verbose_name='создано', auto_now_add=True
+    )
+
+    objects = OutgoingEmailQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('next_attempt_at',)
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('dedup_key',),
+                condition=models.Q(
+                    sent_at__isnull=True,
+                    failed_at__isnull=True,
+                    lease_until__isnull=True,
+                ),
+                name='unique queued email',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
+
+
+class DeletionJob(models.Model):
+    '''Фоновое удаление произведения или пользователя с содержимым.'''
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (DONE, 'завершено'),
+        (FAILED, 'ошибка'),
+    )
+
+    model = models.CharField(
+        verbose_name='модель', max_length=MODEL_LABEL_MAX_LENGTH
+    )
+    object_id = models.BigIntegerField(verbose_name='id объекта')
+    object_repr = models.CharField(
+        verbose_name='объект', max_length=NAME_MAX_LENGTH
+    )
+    status = models.CharField(
+        verbose_name='состояние',
+        max_length=max(len(status) for status, _ in STATUS_CHOICES),
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True,
+    )
+    deleted_objects = models.PositiveIntegerField(
+        verbose_name='удалено объектов', default=0
+    )
+    lease_until = models.DateTimeField(
+        verbose_name='занято воркером до', null=True, blank=True
+    )
+    last_error = models.TextField(verbose_name='ошибка', blank=True)
+    created_at = models.DateTimeField(
+        verbose_name='создано', auto_now_add=True
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='завершено', null=True, blank=True
+    )
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = 'Фоновое удаление'
+        verbose_name_plural = 'Фоновые удаления'
+
+    def __str__(self):
+        return f'{self.model}:{self.object_id} ({self.status})'
+
+
+class ReviewSignature(models.Model):
+    '''MinHash-подпись текста отзыва. Хранится в основной базе, как и
+    корзины LSH: спам ищется по всем произведениям, а отзывы разложены
+    по шардам, поэтому ссылки на отзывы - просто id.'''
+    review_id = models.BigIntegerField(
+        verbose_name='id отзыва', primary_key=True
+    )
+    title_id = models.BigIntegerField(verbose_name='id произведения')
+    signature = models.BinaryField(verbose_name='подпись')
+
+    class Meta:
+        verbose_name = 'Подпись отзыва'
+        verbose_name_plural = 'Подписи отзывов'
+
+    def __str__(self):
+        return str(self.review_id)
+
+
+class ReviewBucket(models.Model):
+    '''Корзина LSH: отзывы с одинаковой полосой подписи - кандидаты в
+    почти одинаковые.'''
+    band = models.PositiveSmallIntegerField(verbose_name='полоса')
+    bucket = models.BigIntegerField(verbose_name='корзина')
+    review_id = models.BigIntegerField(
+        verbose_name='id отзыва', db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = (
+            models.Index(
+                fields=('band', 'bucket'), name='review_bucket_band_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.band}:{self.bucket} -> {self.review_id}'
+
+
+class DuplicateReview(models.Model):
+    '''Пара почти одинаковых отзывов: review - более новый из двух.'''
+    review_id = models.BigIntegerField(verbose_name='id отзыва')
+    title_id = models.BigIntegerField(verbose_name='id произведения')
+    duplicate_id = models.BigIntegerField(
+        verbose_name='id похожего отзыва', db_index=True
+    )
+    duplicate_title_id = models.BigIntegerField(
+        verbose_name='id произведения похожего отзыва'
+    )
+    similarity = models.FloatField(verbose_name='сходство')
+    dismissed = models.BooleanField(
+        verbose_name='отклонено модератором', default=False
+    )
+    detected_at = models.DateTimeField(
+        verbose_name='найдено', auto_now_add=True, db_index=True
+    )
+
+    class Meta:
+        ordering = ('-detected_at', '-pk')
+        verbose_name = 'Похожие отзывы'
+        verbose_name_plural = 'Похожие отзывы'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('review_id', 'duplicate_id'),
+                name='unique duplicate review',
+            ),
+        )
+
+    def __str__(self):
+        return (
+            f'{self.review_id} ~ {self.duplicate_id} ({self.similarity:.2f})'
+        )
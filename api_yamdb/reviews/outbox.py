@@ -0,0 +1,121 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from reviews.models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=5)
+
+
+def enqueue_email(key, sender, recipient, subject, body):
+    email = OutgoingEmail.objects.enqueue(
+        key, sender, recipient, subject, body
+    )
+    if settings.EMAIL_OUTBOX_EAGER:
+        transaction.on_commit(send_due_emails)
+    return email
+
+
+def claim_due_emails(batch_size):
+    '''Забирает пачку писем в аренду, чтобы параллельные воркеры
+    не отправили одно письмо дважды.'''
+    now = timezone.now()
+    lease_until = now + LEASE
+    ids = list(
+        OutgoingEmail.objects.due(now).values_list('pk', flat=True)[
+            :batch_size
+        ]
+    )
+    OutgoingEmail.objects.due(now).filter(pk__in=ids).update(
+        lease_until=lease_until
+    )
+    return list(
+        OutgoingEmail.objects.filter(pk__in=ids, lease_until=lease_until)
+    )
+
+
+def send_due_emails(batch_size=None):
+    '''Отправляет пачку писем через одно SMTP-соединение.
+
+    Возвращает пару (отправлено, ошибок).
+    '''
+    emails = claim_due_emails(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+
+    now = timezone.now()
+    failed = 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        for email in emails:
+            schedule_retry(email, exc, now)
+        failed = len(emails)
+    else:
+        try:
+            for email in emails:
+                try:
+                    EmailMessage(
+                        subject=email.subject,
+                        body=email.body,
+                        from_email=email.sender,
+                        to=[email.recipient],
+                        connection=connection,
+                    ).send()
+                except Exception as exc:
+                    schedule_retry(email, exc, now)
+                    failed += 1
+                else:
+                    email.sent_at = now
+                    email.next_attempt_at = None
+        finally:
+            connection.close()
+
+    for email in emails:
+        release(email)
+    return len(emails) - failed, failed
+
+
+def release(email):
+    '''Сохраняет итог попытки и снимает аренду, если она ещё наша:
+    письмо с истёкшей арендой мог забрать другой воркер.'''
+    try:
+        with transaction.atomic():
+            OutgoingEmail.objects.filter(
+                pk=email.pk, lease_until=email.lease_until
+            ).update(
+                attempts=email.attempts,
+                next_attempt_at=email.next_attempt_at,
+                sent_at=email.sent_at,
+                failed_at=email.failed_at,
+                last_error=email.last_error,
+                lease_until=None,
+            )
+    except IntegrityError:
+        # Пока письмо было у воркера, повторная регистрация поставила
+        # в очередь новое с тем же ключом: повторять старое незачем.
+        OutgoingEmail.objects.filter(
+            pk=email.pk, lease_until=email.lease_until
+        ).delete()
+
+
+def schedule_retry(email, exc, now):
+    email.attempts += 1
+    email.last_error = str(exc)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.next_attempt_at = None
+        email.failed_at = now
+        logger.error(
+            f'Письмо {email.dedup_key} для {email.recipient} не доставлено '
+            f'за {email.attempts} попыток: {email.last_error}'
+        )
+    else:
+        delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1)
+        email.next_attempt_at = now + timedelta(seconds=delay)
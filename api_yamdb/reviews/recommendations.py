@@ -0,0 +1,253 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from api_yamdb.db_routers import map_review_databases
+from reviews.models import Review
+from reviews.similarity import AUTHOR, SCORE, TITLE, load_ratings
+
+TITLE_FACTORS = 'title_factors'
+USER_FACTORS = 'user_factors'
+# Файл с именем каталога текущей версии факторов.
+CURRENT_VERSION = 'current'
+# Сколько версий хранить: читатель, прочитавший указатель до подмены,
+# ещё откроет файлы предыдущей.
+KEEP_VERSIONS = 2
+
+FACTORS = 32
+ITERATIONS = 10
+REGULARIZATION = 0.1
+# Сколько чисел занимают матрицы Грама одного блока строк при обучении;
+# факторы оценок одной строки собираются кусками того же размера.
+BLOCK_CELLS = 1_000_000
+RMSE_CHUNK_SIZE = 1_000_000
+
+_loaded = {}
+
+
+def factors_dtype(rank):
+    return np.dtype([('id', np.int64), ('factors', np.float32, (rank,))])
+
+
+def compress(rows, cols, values):
+    '''Строки разреженной матрицы подряд: указатели начала строк,
+    столбцы и значения в порядке строк.'''
+    order = np.argsort(rows, kind='stable')
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows))))
+    return indptr, cols[order], values[order]
+
+
+def row_blocks(indptr, rank):
+    '''Отрезки строк, в которых матрицы Грама умещаются в BLOCK_CELLS,
+    а факторы оценок - в BLOCK_CELLS чисел; строка длиннее этого
+    становится отдельным отрезком.'''
+    max_rows = max(1, BLOCK_CELLS // (rank * rank))
+    max_entries = max(1, BLOCK_CELLS // rank)
+    size, start = len(indptr) - 1, 0
+    while start < size:
+        stop = np.searchsorted(
+            indptr, indptr[start] + max_entries, side='right'
+        ) - 1
+        stop = min(size, start + max_rows, max(start + 1, stop))
+        yield start, stop
+        start = stop
+
+
+def least_squares(indptr, cols, values, other, regularization, workers):
+    '''Факторы строк при известных факторах столбцов other: гребневая
+    регрессия на каждую строку (ALS-WR), блоками в нескольких потоках.
+
+    Матрица Грама строки - Vᵀ·V по факторам её оценок, без промежуточных
+    внешних произведений на каждую оценку; оценки популярной строки
+    складываются кусками по BLOCK_CELLS // rank. NumPy отпускает GIL в
+    умножении матриц и linalg.solve, поэтому потоки делят факторы other
+    без копирования.
+    '''
+    rank = other.shape[1]
+    factors = np.empty((len(indptr) - 1, rank))
+    identity = np.eye(rank)
+    chunk = max(1, BLOCK_CELLS // rank)
+
+    def solve(span):
+        start, stop = span
+        gram = np.zeros((stop - start, rank, rank))
+        rhs = np.zeros((stop - start, rank))
+        for row in range(start, stop):
+            for low in range(indptr[row], indptr[row + 1], chunk):
+                high = min(low + chunk, indptr[row + 1])
+                vectors = other[cols[low:high]]
+                gram[row - start] += vectors.T @ vectors
+                rhs[row - start] += vectors.T @ values[low:high]
+        counts = np.diff(indptr[start:stop + 1])
+        gram += regularization * counts[:, None, None] * identity
+        factors[start:stop] = np.linalg.solve(gram, rhs[..., None])[..., 0]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(solve, row_blocks(indptr, rank)))
+    return factors
+
+
+def factorize(title_ids, user_ids, scores, rank=FACTORS,
+              iterations=ITERATIONS, regularization=REGULARIZATION,
+              workers=None, seed=0):
+    '''ALS по оценкам, центрированным по среднему пользователя.
+
+    Возвращает id и факторы произведений, id и факторы пользователей
+    и среднеквадратичную ошибку на обучающих оценках.
+    '''
+    workers = workers or os.cpu_count()
+    titles, title_rows = np.unique(title_ids, return_inverse=True)
+    users, user_rows = np.unique(user_ids, return_inverse=True)
+    user_means = (
+        np.bincount(user_rows, weights=scores) / np.bincount(user_rows)
+    )
+    values = scores - user_means[user_rows]
+    by_user = compress(user_rows, title_rows, values)
+    by_title = compress(title_rows, user_rows, values)
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.1, size=(len(users), rank))
+    for _ in range(iterations):
+        title_factors = least_squares(
+            *by_title, user_factors, regularization, workers
+        )
+        user_factors = least_squares(
+            *by_user, title_factors, regularization, workers
+        )
+
+    errors = 0.0
+    for start in range(0, len(values), RMSE_CHUNK_SIZE):
+        chunk = slice(start, start + RMSE_CHUNK_SIZE)
+        predicted = np.einsum(
+            'ni,ni->n',
+            user_factors[user_rows[chunk]],
+            title_factors[title_rows[chunk]],
+        )
+        errors += np.sum((values[chunk] - predicted) ** 2)
+    rmse = np.sqrt(errors / max(1, len(values)))
+    return titles, title_factors, users, user_factors, rmse
+
+
+def save_factors(titles, title_factors, users, user_factors):
+    '''Пишет факторы произведений и пользователей в новый каталог
+    версии и переключает на него читателей одной подменой файла-указателя:
+    они видят либо обе старые матрицы, либо обе новые.'''
+    directory = Path(settings.RECOMMENDATIONS_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    version = directory / f'v{time.time_ns()}'
+    version.mkdir()
+    for name, ids, factors in (
+        (TITLE_FACTORS, titles, title_factors),
+        (USER_FACTORS, users, user_factors),
+    ):
+        data = np.empty(len(ids), dtype=factors_dtype(factors.shape[1]))
+        data['id'] = ids
+        data['factors'] = factors
+        np.save(version / f'{name}.npy', data)
+    pointer = directory / f'{CURRENT_VERSION}.{version.name}.tmp'
+    pointer.write_text(version.name)
+    os.replace(pointer, directory / CURRENT_VERSION)
+    versions = sorted(
+        path for path in directory.glob('v*') if path.is_dir()
+    )
+    for path in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def load_factors():
+    '''Факторы произведений и пользователей текущей версии через
+    memory-map: процессы сервера делят одни страницы файлов, а новая
+    версия подхватывается по указателю.'''
+    directory = Path(settings.RECOMMENDATIONS_DIR)
+    try:
+        version = (directory / CURRENT_VERSION).read_text()
+        cached = _loaded.get(directory)
+        if cached is None or cached[0] != version:
+            cached = version, tuple(
+                np.load(directory / version / f'{name}.npy', mmap_mode='r')
+                for name in (TITLE_FACTORS, USER_FACTORS)
+            )
+            _loaded[directory] = cached
+    except FileNotFoundError:
+        return None
+    return cached[1]
+
+
+def train_recommendations(**options):
+    ratings = load_ratings()
+    titles, title_factors, users, user_factors, rmse = factorize(
+        ratings[:, TITLE],
+        ratings[:, AUTHOR],
+        ratings[:, SCORE].astype(float),
+        **options,
+    )
+    save_factors(titles, title_factors, users, user_factors)
+    return len(titles), len(users), rmse
+
+
+def known_rows(data, ids):
+    '''Строки отсортированных по id факторов для ids и маска ids,
+    которые в них нашлись.'''
+    rows = np.searchsorted(data['id'], ids)
+    known = rows < len(data)
+    known[known] = data['id'][rows[known]] == ids[known]
+    return rows[known], known
+
+
+def fold_in(titles, rated_ids, scores):
+    '''Факторы пользователя, которого не было при обучении: один шаг
+    ALS по его оценкам при известных факторах произведений.'''
+    rows, known = known_rows(titles, rated_ids)
+    if not len(rows):
+        return None
+    vectors = titles['factors'][rows].astype(float)
+    values = scores[known] - scores.mean()
+    gram = vectors.T @ vectors + REGULARIZATION * len(values) * np.eye(
+        vectors.shape[1]
+    )
+    return np.linalg.solve(gram, vectors.T @ values)
+
+
+def user_ratings(user_id):
+    '''Пары (title_id, score) всех отзывов пользователя из всех баз.'''
+    partials = map_review_databases(
+        lambda alias: list(
+            Review.objects.using(alias)
+            .filter(author_id=user_id)
+            .values_list('title_id', 'score')
+        )
+    )
+    return np.array(
+        [rating for partial in partials for rating in partial],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+
+def recommend(user_id, count):
+    '''id непросмотренных произведений по убыванию предсказанной оценки.'''
+    factors = load_factors()
+    if factors is None or not len(factors[0]):
+        return []
+    titles, users = factors
+    rated = user_ratings(user_id)
+    rows, _ = known_rows(users, np.array([user_id]))
+    if len(rows):
+        vector = users['factors'][rows[0]]
+    else:
+        vector = fold_in(titles, rated[:, 0], rated[:, 1].astype(float))
+    if vector is None:
+        return []
+
+    scores = titles['factors'] @ vector.astype(np.float32)
+    seen, _ = known_rows(titles, rated[:, 0])
+    scores[seen] = -np.inf
+    count = min(count, len(scores))
+    top = np.argpartition(-scores, count - 1)[:count]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    top = top[np.isfinite(scores[top])]
+    return titles['id'][top].tolist()
@@ -0,0 +1,265 @@
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.backends.signals import connection_created
+from django.db.models import Count, F, Sum
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from api_yamdb.db_routers import (
+    review_databases,
+    shard_for_title,
+    sharding_enabled,
+)
+from api_yamdb.db_stats import bump_table_version
+from reviews.bloom import user_names
+from reviews.constants import SHARD_ID_BLOCK_SIZE
+from reviews.deletion import in_bulk_deletion
+from reviews.duplicates import forget_reviews, index_review
+from reviews.models import (
+    Category,
+    Comment,
+    Genre,
+    Review,
+    Sequence,
+    Title,
+    Tombstone,
+    User,
+    rating_prior,
+    reserve_change_seqs,
+    weighted_rating,
+)
+from reviews.trending import record_activity
+
+_id_blocks = {}
+_id_blocks_lock = Lock()
+
+
+def next_global_id(model):
+    '''Id из общей последовательности: автоинкремент шардов пересекается.'''
+    label = model._meta.label_lower
+    with _id_blocks_lock:
+        block = _id_blocks.get(label)
+        value = next(block, None) if block else None
+        if value is None:
+            block = iter(Sequence.reserve(label, SHARD_ID_BLOCK_SIZE))
+            _id_blocks[label] = block
+            value = next(block)
+    return value
+
+
+def refresh_title_counters(title_id, using):
+    '''Полный пересчёт счётчиков произведения по его отзывам: для
+    порций фонового удаления, которые обходят построчные сигналы.'''
+    totals = Review.objects.using(using).filter(title_id=title_id).aggregate(
+        review_count=Count('id'), score_total=Sum('score')
+    )
+    review_count = totals['review_count']
+    score_total = totals['score_total'] or 0
+    prior = rating_prior()
+    with reserve_change_seqs() as change_seqs:
+        Title.objects.filter(pk=title_id).update(
+            review_count=review_count,
+            score_total=score_total,
+            weighted_rating=weighted_rating(
+                review_count, score_total, prior
+            ),
+            change_seq=change_seqs[0],
+        )
+
+
+def shift_title_counters(title_id, review_delta, score_delta):
+    '''Сдвигает счётчики произведения атомарным UPDATE с F(). Пересчёт
+    COUNT/SUM с записью абсолютных значений терял бы параллельные отзывы:
+    каждая запись считала бы до того, как увидит чужую строку.'''
+    review_count = F('review_count') + review_delta
+    score_total = F('score_total') + score_delta
+    prior = rating_prior()
+    with reserve_change_seqs() as change_seqs:
+        Title.objects.filter(pk=title_id).update(
+            review_count=review_count,
+            score_total=score_total,
+            weighted_rating=weighted_rating(
+                review_count, score_total, prior
+            ),
+            change_seq=change_seqs[0],
+        )
+
+
+def bump_change_seq(model, pks):
+    '''Свой номер изменения каждой строке: курсор /sync/ не должен
+    останавливаться посреди одинаковых номеров.'''
+    pks = list(pks)
+    if not pks:
+        return
+    with reserve_change_seqs(
+        len(pks), router.db_for_write(model)
+    ) as change_seqs:
+        for pk, change_seq in zip(pks, change_seqs):
+            model.objects.filter(pk=pk).update(change_seq=change_seq)
+
+
+@receiver(connection_created)
+def disable_shard_foreign_keys(sender, connection, **kwargs):
+    '''В шардах нет строк произведений и пользователей, поэтому
+    проверку внешних ключей SQLite там отключаем.'''
+    if (
+        connection.alias in settings.REVIEW_SHARD_ALIASES
+        and connection.vendor == 'sqlite'
+    ):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = OFF')
+
+
+@receiver(pre_save, sender=Review)
+@receiver(pre_save, sender=Comment)
+def assign_global_id(sender, instance, raw=False, **kwargs):
+    if sharding_enabled() and instance.pk is None and not raw:
+        instance.pk = next_global_id(sender)
+
+
+@receiver(pre_save, sender=Review)
+def remember_old_score(sender, instance, update_fields=None, **kwargs):
+    '''Оценка до изменения: по ней post_save сдвигает сумму оценок.'''
+    instance._old_score = None
+    if instance._state.adding or (
+        update_fields is not None and 'score' not in update_fields
+    ):
+        return
+    instance._old_score = (
+        Review.objects.using(instance._state.db)
+        .filter(pk=instance.pk)
+        .values_list('score', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Review)
+def count_saved_review(sender, instance, created, **kwargs):
+    if created:
+        shift_title_counters(instance.title_id, 1, instance.score)
+        return
+    old_score = getattr(instance, '_old_score', None)
+    if old_score is not None and old_score != instance.score:
+        shift_title_counters(
+            instance.title_id, 0, instance.score - old_score
+        )
+
+
+@receiver(post_delete, sender=Review)
+def count_deleted_review(sender, instance, **kwargs):
+    if not in_bulk_deletion():
+        shift_title_counters(instance.title_id, -1, -instance.score)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Comment)
+def track_title_activity(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    title_id = (
+        instance.title_id if sender is Review else instance.review.title_id
+    )
+    record_activity(title_id, instance.pub_date)
+
+
+@receiver(post_save, sender=Review)
+def index_review_text(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    if raw or (update_fields is not None and 'text' not in update_fields):
+        return
+    index_review(instance)
+
+
+@receiver(post_delete, sender=Review)
+def forget_review_text(sender, instance, **kwargs):
+    if not in_bulk_deletion():
+        forget_reviews([instance.pk])
+
+
+@receiver(pre_delete, sender=Title)
+def delete_sharded_reviews(sender, instance, **kwargs):
+    if sharding_enabled():
+        Review.objects.using(shard_for_title(instance.pk)).filter(
+            title_id=instance.pk
+        ).delete()
+
+
+# Только модели с change_seq: обработчик post_delete без sender отключил
+# бы быстрое удаление queryset.delete() у всех моделей.
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Title)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Comment)
+def leave_tombstone(sender, instance, **kwargs):
+    if not in_bulk_deletion():
+        with reserve_change_seqs(
+            using=router.db_for_write(Tombstone)
+        ) as change_seqs:
+            Tombstone.objects.create(
+                model=sender._meta.label_lower,
+                object_id=instance.pk,
+                change_seq=change_seqs[0],
+            )
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def track_title_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    '''Список жанров - часть произведения в /sync/.'''
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        bump_change_seq(Title, [instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        bump_change_seq(Title, pk_set)
+    elif reverse and action == 'pre_clear':
+        bump_change_seq(Title, instance.titles.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Genre)
+def track_deleted_genre_titles(sender, instance, **kwargs):
+    bump_change_seq(Title, instance.titles.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=User)
+def remember_user_names(sender, instance, **kwargs):
+    user_names.add_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def forget_token_version(sender, instance, **kwargs):
+    cache.delete(User.token_version_cache_key(instance.pk))
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_user_content(sender, instance, **kwargs):
+    if not sharding_enabled():
+        return
+    for alias in review_databases():
+        Comment.objects.using(alias).filter(author_id=instance.pk).delete()
+        Review.objects.using(alias).filter(author_id=instance.pk).delete()
+
+
+def bump_count_version(sender, **kwargs):
+    '''Сбрасывает закешированные COUNT(*) по изменившейся таблице.'''
+    bump_table_version(sender._meta.db_table)
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def bump_m2m_count_version(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_table_version(sender._meta.db_table)
+
+
+# Только таблицы, чьи COUNT(*) кешируются: обработчик post_delete без
+# sender отключил бы быстрое удаление queryset.delete() у всех моделей.
+for counted_model in (Category, Genre, Title, Review, Comment, User):
+    post_save.connect(bump_count_version, sender=counted_model)
+    post_delete.connect(bump_count_version, sender=counted_model)
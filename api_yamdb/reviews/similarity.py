@@ -0,0 +1,257 @@
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from api_yamdb.db_routers import map_review_databases
+from reviews.constants import SIMILAR_TITLES_SEQUENCE
+from reviews.models import (
+    ChangeReservation,
+    Review,
+    Sequence,
+    SimilarTitle,
+    Title,
+)
+
+# Пределы одного блока строк матрицы сходства: сколько пар оценок одного
+# пользователя в нём перемножается и сколько ячеек в плотном результате.
+BLOCK_PAIRS = 2_000_000
+BLOCK_CELLS = 4_000_000
+CHUNK_SIZE = 10_000
+BATCH_SIZE = 1000
+
+# Столбцы массива оценок из load_ratings().
+TITLE, AUTHOR, SCORE, CHANGE = range(4)
+
+
+def load_ratings():
+    '''Оценки всех отзывов из всех баз: title_id, author_id, score,
+    change_seq - по строке на отзыв.'''
+    def load(alias):
+        rows = (
+            Review.objects.using(alias)
+            .order_by()
+            .values_list('title_id', 'author_id', 'score', 'change_seq')
+        )
+        return np.fromiter(
+            chain.from_iterable(rows.iterator(chunk_size=CHUNK_SIZE)),
+            dtype=np.int64,
+        ).reshape(-1, 4)
+
+    return np.concatenate(map_review_databases(load))
+
+
+def spans(indptr, rows):
+    '''Позиции элементов строк rows сжатой матрицы и номер строки
+    в rows для каждой позиции.'''
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    owners = np.repeat(np.arange(len(rows)), lengths)
+    positions = (
+        np.arange(lengths.sum())
+        - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        + starts[owners]
+    )
+    return owners, positions
+
+
+class RatingMatrix:
+    '''Разреженная матрица «произведение × пользователь».
+
+    Оценки центрированы по среднему пользователя (adjusted cosine):
+    щедрый и строгий зритель дают одинаковый вклад в сходство. Матрица
+    хранится дважды - по строкам произведений и по столбцам
+    пользователей, - чтобы строки X·Xᵀ считались без scipy.
+    '''
+
+    def __init__(self, title_ids, user_ids, scores):
+        self.title_ids, rows = np.unique(title_ids, return_inverse=True)
+        _, cols = np.unique(user_ids, return_inverse=True)
+        user_counts = np.bincount(cols)
+        user_means = np.bincount(cols, weights=scores) / user_counts
+        values = scores - user_means[cols]
+        size = len(self.title_ids)
+
+        by_title = np.argsort(rows, kind='stable')
+        self.title_indptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(rows, minlength=size)))
+        )
+        self.title_users = cols[by_title]
+        self.title_values = values[by_title]
+
+        by_user = np.argsort(cols, kind='stable')
+        self.user_indptr = np.concatenate(([0], np.cumsum(user_counts)))
+        self.user_titles = rows[by_user]
+        self.user_values = values[by_user]
+
+        self.norms = np.sqrt(
+            np.bincount(rows, weights=values ** 2, minlength=size)
+        )
+        # Сколько пар оценок даёт строка произведения в X·Xᵀ.
+        self.row_pairs = np.bincount(
+            rows, weights=user_counts[cols], minlength=size
+        )
+
+    def __len__(self):
+        return len(self.title_ids)
+
+    def blocks(self, rows):
+        '''Делит строки на блоки в пределах BLOCK_PAIRS и BLOCK_CELLS.'''
+        max_rows = max(1, BLOCK_CELLS // max(1, len(self)))
+        block, pairs = [], 0
+        for row in rows:
+            if block and (
+                len(block) >= max_rows
+                or pairs + self.row_pairs[row] > BLOCK_PAIRS
+            ):
+                yield np.array(block)
+                block, pairs = [], 0
+            block.append(row)
+            pairs += self.row_pairs[row]
+        if block:
+            yield np.array(block)
+
+    def similarities(self, rows):
+        '''Косинусное сходство строк rows со всеми произведениями.'''
+        owners, entries = spans(self.title_indptr, rows)
+        users = self.title_users[entries]
+        values = self.title_values[entries]
+        # Каждая оценка строки умножается на все оценки того же
+        # пользователя: это ненулевые слагаемые X[rows]·Xᵀ.
+        pair_entries, partners = spans(self.user_indptr, users)
+        cells = (
+            owners[pair_entries] * len(self)
+            + self.user_titles[partners]
+        )
+        dots = np.bincount(
+            cells,
+            weights=values[pair_entries] * self.user_values[partners],
+            minlength=len(rows) * len(self),
+        ).reshape(len(rows), len(self))
+        norms = np.outer(self.norms[rows], self.norms)
+        similarities = np.divide(
+            dots, norms, out=np.zeros_like(dots), where=norms > 0
+        )
+        similarities[np.arange(len(rows)), rows] = 0
+        return similarities
+
+    def neighbours(self, rows, count):
+        '''Для каждого блока строк - id произведений, id их соседей и
+        сходство, по убыванию; соседи без положительного сходства
+        отбрасываются.'''
+        count = min(count, len(self) - 1)
+        for block in self.blocks(rows):
+            if count < 1:
+                yield self.title_ids[block], [], []
+                continue
+            similarities = self.similarities(block)
+            top = np.argpartition(-similarities, count - 1, axis=1)[
+                :, :count
+            ]
+            scores = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            scores = np.take_along_axis(scores, order, axis=1)
+            yield (
+                self.title_ids[block],
+                [self.title_ids[t[s > 0]] for t, s in zip(top, scores)],
+                [s[s > 0] for s in scores],
+            )
+
+
+def build_similar_titles(count=None, full=False):
+    '''Пересчитывает похожие произведения, возвращает число обновлённых.
+
+    Без full пересчитываются только произведения, изменившиеся после
+    прошлой сборки, их соседи и все произведения с оценками
+    пользователей, чьи отзывы менялись: у них сдвинулось среднее.
+    Остальные строки могут немного отставать, поэтому изредка стоит
+    запускать полную сборку (--full).
+
+    Средние пользователей и нормы строк зависят от всех оценок, поэтому
+    сборка с изменениями читает все отзывы; меньше становится только
+    умножение матриц. Без изменений хватает проверки по индексу
+    change_seq.
+    '''
+    count = count or settings.SIMILAR_TITLES_COUNT
+    watermark = 0 if full else Sequence.current(SIMILAR_TITLES_SEQUENCE)
+    # Номера после committed_seq() могут ещё закоммититься не по порядку:
+    # следующая сборка начнёт с них, а не перешагнёт.
+    last_change = ChangeReservation.committed_seq()
+    if watermark and not changed_since(watermark):
+        return 0
+    ratings = load_ratings()
+    matrix = RatingMatrix(
+        ratings[:, TITLE], ratings[:, AUTHOR], ratings[:, SCORE].astype(float)
+    )
+
+    if watermark:
+        changed = ratings[:, CHANGE] > watermark
+        authors = np.unique(ratings[changed, AUTHOR])
+        changed_titles = Title.objects.filter(change_seq__gt=watermark)
+        dirty = np.union1d(
+            ratings[np.isin(ratings[:, AUTHOR], authors), TITLE],
+            np.concatenate((
+                fetch_ids(changed_titles.values_list('pk', flat=True)),
+                # Соседи изменившихся произведений: иначе в их списках
+                # останутся устаревшие сходства.
+                fetch_ids(
+                    SimilarTitle.objects.filter(
+                        similar__in=changed_titles
+                    ).values_list('title_id', flat=True)
+                ),
+            )),
+        )
+        rows = np.flatnonzero(np.isin(matrix.title_ids, dirty))
+    else:
+        rows = np.arange(len(matrix))
+    # Произведения без отзывов больше ни на что не похожи.
+    SimilarTitle.objects.filter(title__review_count=0).delete()
+
+    for title_ids, neighbours, scores in matrix.neighbours(rows, count):
+        save_neighbours(title_ids, neighbours, scores)
+    Sequence.objects.update_or_create(
+        name=SIMILAR_TITLES_SEQUENCE, defaults={'value': last_change}
+    )
+    return len(rows)
+
+
+def changed_since(watermark):
+    '''Есть ли отзывы или произведения с номером изменения больше
+    watermark; смотрит только индекс change_seq.'''
+    if Title.objects.filter(change_seq__gt=watermark).exists():
+        return True
+    return any(map_review_databases(
+        lambda alias: Review.objects.using(alias)
+        .filter(change_seq__gt=watermark)
+        .exists()
+    ))
+
+
+def fetch_ids(queryset):
+    return np.fromiter(
+        queryset.iterator(chunk_size=CHUNK_SIZE), dtype=np.int64
+    )
+
+
+def save_neighbours(title_ids, neighbours, scores):
+    with transaction.atomic():
+        SimilarTitle.objects.filter(title_id__in=title_ids.tolist()).delete()
+        SimilarTitle.objects.bulk_create(
+            (
+                SimilarTitle(
+                    title_id=title_id,
+                    similar_id=similar_id,
+                    rank=rank,
+                    score=score,
+                )
+                for title_id, similar_ids, title_scores in zip(
+                    title_ids.tolist(), neighbours, scores
+                )
+                for rank, (similar_id, score) in enumerate(
+                    zip(similar_ids.tolist(), title_scores.tolist()), 1
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
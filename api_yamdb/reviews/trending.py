@@ -0,0 +1,127 @@
+import math
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Max, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+
+from api_yamdb.db_routers import map_review_databases
+from reviews.constants import TRENDING_EPOCH
+from reviews.models import Comment, Review, Title
+
+CHUNK_SIZE = 10_000
+BATCH_SIZE = 1000
+
+EVENT_DTYPE = np.dtype([('title_id', np.int64), ('timestamp', np.float64)])
+
+
+def decay_rate():
+    '''Скорость затухания в секунду: за TRENDING_HALF_LIFE вес события
+    уменьшается вдвое.'''
+    return math.log(2) / settings.TRENDING_HALF_LIFE.total_seconds()
+
+
+def event_score(moment):
+    '''Логарифм веса события: exp(rate * (moment - эпоха)).
+
+    Вес затухает как exp(-rate * (now - moment)), но общий множитель
+    exp(-rate * now) одинаков у всех произведений и не влияет на порядок.
+    Поэтому в базе хранится логарифм суммы весов относительно
+    фиксированной эпохи, и старые значения не нужно переписывать.
+    '''
+    return decay_rate() * (moment - TRENDING_EPOCH).total_seconds()
+
+
+def record_activity(title_id, moment):
+    '''Добавляет событие к счёту произведения за O(1) одним UPDATE:
+    log(e^a + e^b) = max(a, b) + log(1 + e^-|a - b|), без переполнения
+    и без гонки чтения-записи.'''
+    score = Value(event_score(moment), output_field=FloatField())
+    current = F('trending_score')
+    Title.objects.filter(pk=title_id).update(
+        trending_score=Greatest(current, score)
+        + Ln(Value(1.0) + Exp(-Abs(current - score)))
+    )
+
+
+def stream_chunks(queryset, dtype, chunk_size):
+    '''Строки values_list, последний столбец которых - дата, порциями
+    структурированных массивов: в памяти не больше одной порции.'''
+    rows = (
+        (*row[:-1], row[-1].timestamp())
+        for row in queryset.order_by().iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = np.fromiter(islice(rows, chunk_size), dtype=dtype)
+        if not len(chunk):
+            return
+        yield chunk
+
+
+def activity_scores(alias, size, chunk_size=CHUNK_SIZE):
+    '''Логарифмы весов отзывов и комментариев одной базы по id
+    произведений 0..size-1 (и дальше, если появились новые). События
+    читаются порциями и сразу сворачиваются в счёт произведения: в памяти
+    одна порция и по числу на произведение.'''
+    totals = np.full(size, -np.inf)
+    reviews = Review.objects.using(alias).values_list('title_id', 'pub_date')
+    comments = Comment.objects.using(alias).values_list(
+        'review__title_id', 'pub_date'
+    )
+    for queryset in (reviews, comments):
+        for chunk in stream_chunks(queryset, EVENT_DTYPE, chunk_size):
+            titles, groups = np.unique(
+                chunk['title_id'], return_inverse=True
+            )
+            if titles[-1] >= len(totals):
+                totals = np.concatenate(
+                    (totals, np.full(titles[-1] + 1 - len(totals), -np.inf))
+                )
+            scores = decay_rate() * (
+                chunk['timestamp'] - TRENDING_EPOCH.timestamp()
+            )
+            totals[titles] = np.logaddexp(
+                totals[titles],
+                group_logsumexp(groups, scores, len(titles)),
+            )
+    return totals
+
+
+def group_logsumexp(groups, values, size):
+    '''log(sum(exp(values))) по группам 0..size-1 со сдвигом на максимум
+    группы, чтобы exp не переполнялся; у пустых групп -inf.'''
+    peaks = np.full(size, -np.inf)
+    np.maximum.at(peaks, groups, values)
+    sums = np.bincount(
+        groups, weights=np.exp(values - peaks[groups]), minlength=size
+    )
+    with np.errstate(divide='ignore'):
+        return peaks + np.log(sums)
+
+
+def recompute_trending():
+    '''Счёт всех произведений заново, например после смены полупериода.'''
+    size = (Title.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    partials = map_review_databases(
+        lambda alias: activity_scores(alias, size)
+    )
+    totals = np.full(max(map(len, partials)), -np.inf)
+    for partial in partials:
+        totals[:len(partial)] = np.logaddexp(
+            totals[:len(partial)], partial
+        )
+    titles = np.flatnonzero(np.isfinite(totals))
+    totals = totals[titles]
+    with transaction.atomic():
+        Title.objects.update(trending_score=0)
+        Title.objects.bulk_update(
+            (
+                Title(pk=title_id, trending_score=score)
+                for title_id, score in zip(titles.tolist(), totals.tolist())
+            ),
+            ('trending_score',),
+            batch_size=BATCH_SIZE,
+        )
+    return len(titles)
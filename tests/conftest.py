@@ -1,6 +1,10 @@
 import os
 import sys
 
+import pytest
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 
@@ -29,3 +33,30 @@ if FILENAME not in project_dir_content:
 pytest_plugins = [
     'tests.fixtures.fixture_user',
 ]
+
+TEST_REVIEW_SHARDS = ['shard_0', 'shard_1']
+
+
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    '''Базы шардов, как при YAMDB_REVIEW_SHARDS=2, для тестов с
+    databases='__all__'. Маршрутизацию в них включает фикстура
+    review_shards, остальные тесты работают без шардов.'''
+    from django.conf import settings
+    default = settings.DATABASES[DEFAULT_DB_ALIAS]
+    for alias in TEST_REVIEW_SHARDS:
+        settings.DATABASES.setdefault(
+            alias, {**default, 'TEST': {**default.get('TEST', {})}}
+        )
+
+
+@pytest.fixture(autouse=True)
+def send_outbox_emails_eagerly(settings):
+    settings.EMAIL_OUTBOX_EAGER = True
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    from api.authentication import token_cache
+    cache.clear()
+    token_cache.clear()
@@ -0,0 +1,163 @@
+from http import HTTPStatus
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS
+
+from api_yamdb.db_routers import (
+    PrimaryReplicaRouter,
+    ReviewShardRouter,
+    ShardResolutionError,
+    read_from,
+    shard_for_title,
+    use_title_shard,
+)
+from reviews.models import Comment, Review, Title, User
+from tests.utils import create_reviews
+
+REPLICA = 'replica'
+SHARDS = ['shard_0', 'shard_1', 'shard_2']
+
+
+@pytest.fixture
+def replica_settings(settings):
+    settings.DATABASES = {
+        **settings.DATABASES,
+        REPLICA: settings.DATABASES[DEFAULT_DB_ALIAS],
+    }
+    return settings
+
+
+@pytest.fixture
+def shard_settings(settings):
+    settings.REVIEW_SHARD_ALIASES = SHARDS
+    return settings
+
+
+class Test08ReplicaRouter:
+
+    def test_01_reads_without_context_go_to_primary(self, replica_settings):
+        router = PrimaryReplicaRouter()
+        assert router.db_for_read(Title) == DEFAULT_DB_ALIAS, (
+            'Без явного выбора реплики чтение должно идти в основную базу.'
+        )
+
+    def test_02_reads_in_context_go_to_replica(self, replica_settings):
+        router = PrimaryReplicaRouter()
+        with read_from(REPLICA):
+            assert router.db_for_read(Title) == REPLICA, (
+                'Внутри read_from() чтение должно идти в реплику.'
+            )
+            assert router.db_for_write(Title) == DEFAULT_DB_ALIAS, (
+                'Запись всегда должна идти в основную базу.'
+            )
+        assert router.db_for_read(Title) == DEFAULT_DB_ALIAS
+
+    def test_03_unconfigured_replica_falls_back_to_primary(self):
+        router = PrimaryReplicaRouter()
+        with read_from(REPLICA):
+            assert router.db_for_read(Title) == DEFAULT_DB_ALIAS, (
+                'Если реплика не настроена, чтение должно идти в основную '
+                'базу.'
+            )
+
+    def test_04_replica_is_not_migrated(self, replica_settings):
+        router = PrimaryReplicaRouter()
+        assert router.allow_migrate(DEFAULT_DB_ALIAS, 'reviews')
+        assert not router.allow_migrate(REPLICA, 'reviews')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_write_pins_client_to_primary(self, replica_settings,
+                                             admin, admin_client):
+        cache.clear()
+        response = admin_client.post(
+            '/api/v1/categories/', data={'name': 'Фильм', 'slug': 'films'}
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        assert cache.get(f'replica-pin:user:{admin.pk}'), (
+            'После успешной записи клиент должен быть закреплён за '
+            'основной базой.'
+        )
+        response = admin_client.get('/api/v1/categories/')
+        assert response.json()['count'] == 1, (
+            'Закреплённый клиент должен сразу видеть свои изменения.'
+        )
+
+
+class Test08ReviewShardRouter:
+
+    def test_01_shard_is_stable_and_in_range(self, shard_settings):
+        for title_id in range(1, 50):
+            assert shard_for_title(title_id) in SHARDS
+            assert shard_for_title(title_id) == shard_for_title(
+                str(title_id)
+            ), 'Шард произведения не должен зависеть от типа id.'
+        assert len({shard_for_title(pk) for pk in range(1, 50)}) == len(
+            SHARDS
+        ), 'Произведения должны распределяться по всем шардам.'
+
+    def test_02_sharded_models_follow_title(self, shard_settings):
+        router = ReviewShardRouter()
+        with use_title_shard(7):
+            assert router.db_for_read(Review) == shard_for_title(7)
+            assert router.db_for_write(Comment) == shard_for_title(7)
+        review = Review(title_id=11)
+        assert router.db_for_write(Review, instance=review) == (
+            shard_for_title(11)
+        )
+
+    def test_03_other_models_are_not_sharded(self, shard_settings):
+        router = ReviewShardRouter()
+        with use_title_shard(7):
+            assert router.db_for_read(Title) is None
+            assert router.db_for_read(User) is None
+
+    def test_04_unscoped_query_is_an_error(self, shard_settings):
+        router = ReviewShardRouter()
+        with pytest.raises(ShardResolutionError):
+            router.db_for_read(Review)
+
+    def test_05_disabled_sharding_is_transparent(self):
+        router = ReviewShardRouter()
+        assert router.db_for_read(Review) is None
+        assert router.db_for_write(Comment) is None
+
+    @pytest.mark.django_db(transaction=True)
+    def test_06_recompute_ratings(self, admin_client, admin, user_client,
+                                  user):
+        _, titles = create_reviews(
+            admin_client, {admin: admin_client, user: user_client}
+        )
+        Title.objects.update(review_count=0, score_total=0)
+        call_command('recompute_ratings')
+        title = Title.objects.get(pk=titles[0]['id'])
+        assert (title.review_count, title.score_total) == (2, 10), (
+            'Команда recompute_ratings должна восстанавливать счётчики '
+            'отзывов и сумму оценок произведения.'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_07_counters_are_shifted_not_recounted(self, admin_client,
+                                                   admin, user_client,
+                                                   user):
+        reviews, titles = create_reviews(
+            admin_client, {admin: admin_client}
+        )
+        title_id = titles[0]['id']
+        # Отзыв, записанный параллельно и ещё не видимый этому запросу.
+        Title.objects.filter(pk=title_id).update(
+            review_count=5, score_total=30
+        )
+        url = f'/api/v1/titles/{title_id}/reviews/'
+        response = user_client.post(url, data={'text': 'Отзыв', 'score': 9})
+        assert response.status_code == HTTPStatus.CREATED
+        user_client.patch(
+            f"{url}{response.json()['id']}/", data={'score': 7}
+        )
+        admin_client.delete(f"{url}{reviews[0]['id']}/")
+        title = Title.objects.get(pk=title_id)
+        assert (title.review_count, title.score_total) == (5, 32), (
+            'Счётчики отзывов должны сдвигаться на изменение, а не '
+            'пересчитываться: пересчёт затирает параллельные записи.'
+        )
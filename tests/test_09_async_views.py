@@ -0,0 +1,84 @@
+from http import HTTPStatus
+
+import pytest
+
+from tests.utils import create_comments, create_titles
+
+
+@pytest.mark.django_db(transaction=True)
+class Test09AsyncReadViews:
+
+    def test_01_titles_match_sync_views(self, admin_client, client):
+        titles, _, _ = create_titles(admin_client)
+        for url in (
+            '/api/v1/titles/',
+            '/api/v1/titles/?year=1984',
+            '/api/v1/titles/?limit=1&offset=1',
+            f"/api/v1/titles/{titles[0]['id']}/",
+        ):
+            sync_response = client.get(url)
+            async_url = url.replace('/api/v1/', '/api/v1/async/')
+            async_response = client.get(async_url)
+            assert async_response.status_code == HTTPStatus.OK, (
+                f'GET-запрос к `{async_url}` должен возвращать ответ со '
+                'статусом 200.'
+            )
+            sync_data = sync_response.json()
+            async_data = async_response.json()
+            for key in ('next', 'previous'):
+                sync_data.pop(key, None)
+                async_data.pop(key, None)
+            assert async_data == sync_data, (
+                f'Ответ асинхронного `{async_url}` должен совпадать с '
+                f'ответом синхронного `{url}`.'
+            )
+
+    def test_02_reviews_and_comments(self, admin_client, admin, client,
+                                     user_client, user):
+        comments, reviews, titles = create_comments(
+            admin_client, {admin: admin_client, user: user_client}
+        )
+        title_id = titles[0]['id']
+        review_id = reviews[0]['id']
+        response = client.get(f'/api/v1/async/titles/{title_id}/reviews/')
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['count'] == len(reviews)
+
+        url = (
+            f'/api/v1/async/titles/{title_id}/reviews/{review_id}/comments/'
+        )
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['count'] == len(comments)
+
+        response = client.get(f"{url}{comments[0]['id']}/")
+        assert response.json()['text'] == comments[0]['text']
+
+    def test_03_missing_objects_and_methods(self, admin_client, client):
+        titles, _, _ = create_titles(admin_client)
+        response = client.get('/api/v1/async/titles/999999/reviews/')
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'Запрос отзывов несуществующего произведения должен '
+            'возвращать ответ со статусом 404.'
+        )
+        response = admin_client.post(
+            '/api/v1/async/titles/', data={'name': 'x'}
+        )
+        assert response.status_code == HTTPStatus.METHOD_NOT_ALLOWED, (
+            'Асинхронные эндпоинты доступны только для чтения.'
+        )
+        response = client.options('/api/v1/async/titles/')
+        assert response.status_code == HTTPStatus.OK, (
+            'OPTIONS к асинхронному эндпоинту должен возвращать описание.'
+        )
+        response = client.head('/api/v1/async/titles/')
+        assert response.status_code == HTTPStatus.OK
+
+    def test_04_authentication_is_checked(self, client):
+        response = client.get(
+            '/api/v1/async/titles/', HTTP_AUTHORIZATION='Bearer broken'
+        )
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'Асинхронные эндпоинты должны проверять токен так же, как '
+            'синхронные.'
+        )
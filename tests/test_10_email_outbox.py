@@ -0,0 +1,113 @@
+from http import HTTPStatus
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+
+from reviews.models import OutgoingEmail
+from reviews.outbox import claim_due_emails, send_due_emails
+
+SIGNUP_URL = '/api/v1/auth/signup/'
+
+
+class BrokenRelayBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages):
+        raise ConnectionError('relay is down')
+
+
+@pytest.fixture
+def queued_settings(settings):
+    settings.EMAIL_OUTBOX_EAGER = False
+    return settings
+
+
+@pytest.mark.django_db(transaction=True)
+class Test10EmailOutbox:
+
+    def test_01_signup_only_enqueues(self, client, queued_settings):
+        data = {'email': 'valid@yamdb.fake', 'username': 'valid_username'}
+        response = client.post(SIGNUP_URL, data=data)
+        assert response.status_code == HTTPStatus.OK
+        assert len(mail.outbox) == 0, (
+            'Регистрация не должна отправлять письмо внутри запроса.'
+        )
+        assert OutgoingEmail.objects.pending().count() == 1, (
+            'Регистрация должна ставить письмо с кодом в очередь.'
+        )
+
+    def test_02_repeated_signup_is_deduplicated(self, client,
+                                                queued_settings):
+        data = {'email': 'valid@yamdb.fake', 'username': 'valid_username'}
+        for _ in range(3):
+            client.post(SIGNUP_URL, data=data)
+        assert OutgoingEmail.objects.pending().count() == 1, (
+            'Повторные регистрации не должны плодить писем в очереди.'
+        )
+        call_command('send_outbox')
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].to == [data['email']]
+        assert not OutgoingEmail.objects.pending().exists()
+
+        client.post(SIGNUP_URL, data=data)
+        assert OutgoingEmail.objects.pending().count() == 1, (
+            'После отправки повторная регистрация должна поставить новое '
+            'письмо.'
+        )
+
+    def test_03_failed_delivery_is_retried(self, client, queued_settings):
+        queued_settings.EMAIL_BACKEND = (
+            'tests.test_10_email_outbox.BrokenRelayBackend'
+        )
+        queued_settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+        client.post(
+            SIGNUP_URL,
+            data={'email': 'valid@yamdb.fake', 'username': 'valid_username'},
+        )
+        call_command('send_outbox')
+        email = OutgoingEmail.objects.get()
+        assert email.attempts == 1
+        assert email.sent_at is None
+        assert email.next_attempt_at is not None, (
+            'Письмо с ошибкой отправки должно быть запланировано повторно.'
+        )
+
+        OutgoingEmail.objects.update(next_attempt_at=email.created_at)
+        call_command('send_outbox')
+        email.refresh_from_db()
+        assert email.attempts == 2
+        assert email.next_attempt_at is None, (
+            'После EMAIL_OUTBOX_MAX_ATTEMPTS попыток письмо больше не '
+            'отправляется.'
+        )
+        assert 'relay is down' in email.last_error
+        assert email.failed_at is not None
+        assert list(OutgoingEmail.objects.failed()) == [email]
+        assert not OutgoingEmail.objects.pending().exists()
+
+    def test_04_signup_does_not_touch_leased_email(
+        self, client, queued_settings, monkeypatch
+    ):
+        data = {'email': 'valid@yamdb.fake', 'username': 'valid_username'}
+        client.post(SIGNUP_URL, data=data)
+        leased = claim_due_emails(10)
+        assert len(leased) == 1
+        monkeypatch.setattr(
+            'reviews.outbox.claim_due_emails', lambda batch_size: leased
+        )
+        client.post(SIGNUP_URL, data=data)
+        assert OutgoingEmail.objects.pending().count() == 2, (
+            'Письмо у воркера не заменяется: новое ставится рядом.'
+        )
+        send_due_emails()
+        assert len(mail.outbox) == 1
+        email = OutgoingEmail.objects.pending().get()
+        assert email.sent_at is None and email.pk != leased[0].pk, (
+            'Новое письмо не должно считаться отправленным вместе со '
+            'старым.'
+        )
+        monkeypatch.undo()
+        call_command('send_outbox')
+        assert len(mail.outbox) == 2
+        assert not OutgoingEmail.objects.pending().exists()
@@ -0,0 +1,144 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from threading import Barrier
+
+import pytest
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.throttling import TokenIPThrottle
+from reviews.models import User
+
+SIGNUP_URL = '/api/v1/auth/signup/'
+TOKEN_URL = '/api/v1/auth/token/'
+ATTACKER_IP = '10.6.6.6'
+USER_IP = '192.168.1.10'
+ATTACK_SIZE = 300
+
+
+@pytest.mark.django_db(transaction=True)
+class Test11AuthThrottling:
+
+    def test_01_token_bruteforce_is_rejected_without_queries(
+            self, client, user
+    ):
+        statuses = []
+        with CaptureQueriesContext(connection) as queries:
+            for code in range(ATTACK_SIZE):
+                response = client.post(
+                    TOKEN_URL,
+                    data={'username': user.username,
+                          'confirmation_code': str(code)},
+                    REMOTE_ADDR=ATTACKER_IP,
+                )
+                statuses.append(response.status_code)
+        rejected = statuses.count(HTTPStatus.TOO_MANY_REQUESTS)
+        assert rejected >= ATTACK_SIZE - 20, (
+            'Перебор кодов подтверждения должен отсекаться троттлингом.'
+        )
+        assert len(queries) <= 2 * (ATTACK_SIZE - rejected), (
+            'Отклонённые троттлингом запросы не должны обращаться к базе.'
+        )
+        assert int(response['Retry-After']) > 0, (
+            'Ответ 429 должен содержать заголовок Retry-After.'
+        )
+
+    def test_02_legitimate_users_are_served_during_attack(self, client):
+        served = 0
+        for number in range(ATTACK_SIZE):
+            client.post(
+                SIGNUP_URL,
+                data={'username': f'bot{number}',
+                      'email': f'bot{number}@yamdb.fake'},
+                REMOTE_ADDR=ATTACKER_IP,
+            )
+            client.post(
+                TOKEN_URL,
+                data={'username': f'bot{number}', 'confirmation_code': '1'},
+                REMOTE_ADDR=ATTACKER_IP,
+            )
+            if number % 50 == 0:
+                served += self.sign_up_and_get_token(client, number)
+        assert served == ATTACK_SIZE // 50, (
+            'Пользователи с других адресов должны регистрироваться и '
+            'получать токен во время атаки.'
+        )
+
+    def test_03_signup_email_bucket(self, client):
+        data = {'username': 'victim', 'email': 'victim@yamdb.fake'}
+        statuses = [
+            client.post(
+                SIGNUP_URL, data=data, REMOTE_ADDR=f'10.0.0.{number}'
+            ).status_code
+            for number in range(10)
+        ]
+        assert HTTPStatus.TOO_MANY_REQUESTS in statuses, (
+            'Повторные письма на один email должны ограничиваться '
+            'независимо от IP-адреса.'
+        )
+
+    def test_04_concurrent_requests_share_one_bucket(self, rf, monkeypatch):
+        request = rf.post(TOKEN_URL, REMOTE_ADDR=ATTACKER_IP)
+        get = LocMemCache.get
+
+        def slow_get(*args, **kwargs):
+            # Переключение потоков между чтением и записью ведра.
+            value = get(*args, **kwargs)
+            time.sleep(0.01)
+            return value
+
+        monkeypatch.setattr(LocMemCache, 'get', slow_get)
+        capacity = TokenIPThrottle().capacity
+        barrier = Barrier(4 * capacity)
+
+        def attempt(_):
+            throttle = TokenIPThrottle()
+            barrier.wait()
+            return throttle.allow_request(request, None)
+
+        with ThreadPoolExecutor(max_workers=4 * capacity) as executor:
+            allowed = sum(executor.map(attempt, range(4 * capacity)))
+        assert allowed == capacity, (
+            'Одновременные запросы не должны проходить все по одному '
+            'прочитанному значению ведра.'
+        )
+
+    def test_05_throttle_fails_closed(self, client, settings, monkeypatch):
+        settings.THROTTLE_REQUIRE_SHARED_CACHE = True
+        response = client.post(TOKEN_URL, data={'username': 'someone'})
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS, (
+            'Без общего кеша троттлинг должен отклонять запросы.'
+        )
+
+        settings.THROTTLE_REQUIRE_SHARED_CACHE = False
+
+        def broken(*args, **kwargs):
+            raise ConnectionError('cache is down')
+
+        monkeypatch.setattr(LocMemCache, 'incr', broken)
+        response = client.post(TOKEN_URL, data={'username': 'someone'})
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS, (
+            'При ошибке кеша троттлинг должен отклонять запросы.'
+        )
+
+    def sign_up_and_get_token(self, client, number):
+        data = {'username': f'human{number}',
+                'email': f'human{number}@yamdb.fake'}
+        response = client.post(SIGNUP_URL, data=data, REMOTE_ADDR=USER_IP)
+        if response.status_code != HTTPStatus.OK:
+            return 0
+        user = User.objects.get(username=data['username'])
+        response = client.post(
+            TOKEN_URL,
+            data={'username': user.username,
+                  'confirmation_code':
+                      default_token_generator.make_token(user)},
+            REMOTE_ADDR=USER_IP,
+        )
+        return int(
+            response.status_code == HTTPStatus.OK
+            and 'token' in response.json()
+        )
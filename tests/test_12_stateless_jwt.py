@@ -0,0 +1,140 @@
+from datetime import timedelta
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.authentication import ClaimsAccessToken, token_cache
+
+CATEGORIES_URL = '/api/v1/categories/'
+
+
+def claims_client(user):
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {ClaimsAccessToken.for_user(user)}'
+    )
+    return client
+
+
+def capture_queries(client, *args, method='get', **kwargs):
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(*args, **kwargs)
+    return response, [query['sql'] for query in queries.captured_queries]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test12StatelessJWT:
+
+    def test_01_token_contains_claims(self, admin):
+        token = ClaimsAccessToken.for_user(admin)
+        assert token['username'] == admin.username
+        assert token['role'] == admin.role
+        assert token['ver'] == admin.token_version
+
+    def test_02_authenticated_read_skips_user_query(self, client, user):
+        user_client = claims_client(user)
+        user_client.get(CATEGORIES_URL)
+        _, anonymous_queries = capture_queries(client, CATEGORIES_URL)
+        response, user_queries = capture_queries(user_client, CATEGORIES_URL)
+        assert response.status_code == HTTPStatus.OK
+        assert len(user_queries) == len(anonymous_queries), (
+            'Аутентификация по токену с claims не должна обращаться к '
+            'базе, пока версия токена есть в кеше.'
+        )
+
+    def test_03_admin_write_uses_role_from_token(self, admin):
+        response, queries = capture_queries(
+            claims_client(admin),
+            CATEGORIES_URL,
+            method='post',
+            data={'name': 'Фильм', 'slug': 'films'},
+        )
+        assert response.status_code == HTTPStatus.CREATED, (
+            'Роль администратора должна браться из claims токена.'
+        )
+        assert not any('reviews_user' in sql for sql in queries), (
+            'Проверка прав не должна загружать пользователя из базы.'
+        )
+
+    def test_04_role_change_revokes_old_tokens(self, admin_client, user):
+        old_client = claims_client(user)
+        assert old_client.get(CATEGORIES_URL).status_code == HTTPStatus.OK
+        response = admin_client.patch(
+            f'/api/v1/users/{user.username}/', data={'role': 'moderator'}
+        )
+        assert response.status_code == HTTPStatus.OK
+        response = old_client.get(CATEGORIES_URL)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'После смены роли ранее выданные токены должны отклоняться.'
+        )
+        user.refresh_from_db()
+        new_client = claims_client(user)
+        assert new_client.get(CATEGORIES_URL).status_code == HTTPStatus.OK
+
+    def test_05_deactivated_user_is_rejected(self, user):
+        user_client = claims_client(user)
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        response = user_client.get(CATEGORIES_URL)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED, (
+            'Токены деактивированного пользователя должны отклоняться.'
+        )
+
+    def test_06_bio_change_keeps_tokens(self, user):
+        user_client = claims_client(user)
+        user.bio = 'новое описание'
+        user.save()
+        assert user_client.get(CATEGORIES_URL).status_code == HTTPStatus.OK, (
+            'Изменение полей, не попавших в токен, не должно его отзывать.'
+        )
+
+    def test_07_me_returns_profile(self, user):
+        response = claims_client(user).get('/api/v1/users/me/')
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['bio'] == user.bio
+
+
+@pytest.mark.django_db(transaction=True)
+class Test12TokenCache:
+
+    def test_01_repeated_token_is_served_from_cache(self, user):
+        user_client = claims_client(user)
+        for _ in range(3):
+            assert user_client.get(CATEGORIES_URL).status_code == (
+                HTTPStatus.OK
+            )
+        assert token_cache.stats()['misses'] == 1
+        assert token_cache.stats()['hits'] == 2, (
+            'Повторные запросы с тем же токеном должны обслуживаться из '
+            'кеша проверенных токенов.'
+        )
+
+    def test_02_cached_token_is_still_revoked(self, user):
+        user_client = claims_client(user)
+        user_client.get(CATEGORIES_URL)
+        user.role = 'moderator'
+        user.save()
+        assert user_client.get(CATEGORIES_URL).status_code == (
+            HTTPStatus.UNAUTHORIZED
+        ), 'Кеш токенов не должен обходить отзыв токена.'
+
+    def test_03_cache_is_bounded(self, settings, user):
+        settings.JWT_CACHE_SIZE = 2
+        for _ in range(4):
+            claims_client(user).get(CATEGORIES_URL)
+        assert token_cache.stats()['size'] == 2, (
+            'Кеш токенов не должен расти больше JWT_CACHE_SIZE.'
+        )
+
+    def test_04_expired_token_is_not_served(self, user):
+        token = ClaimsAccessToken.for_user(user)
+        token.set_exp(lifetime=timedelta(seconds=-1))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        token_cache.set(str(token), token, None)
+        assert client.get(CATEGORIES_URL).status_code == (
+            HTTPStatus.UNAUTHORIZED
+        ), 'Просроченный токен не должен приниматься из кеша.'
@@ -0,0 +1,182 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.bloom import USERNAME, BloomFilter, UserNamesFilter, user_names
+from reviews.models import User
+
+SIGNUP_URL = '/api/v1/auth/signup/'
+
+
+def user_queries(queries):
+    return [
+        query['sql'] for query in queries.captured_queries
+        if '"reviews_user"' in query['sql']
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test13SignupQueries:
+
+    def test_01_new_signup_skips_existence_query(self, client, user):
+        user_names.might_exist(USERNAME, user.username)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(
+                SIGNUP_URL,
+                data={'username': 'newbie', 'email': 'newbie@yamdb.fake'},
+            )
+        assert response.status_code == HTTPStatus.OK
+        sql = user_queries(queries)
+        assert len(sql) == 1 and sql[0].startswith('INSERT'), (
+            'Для заведомо новых username и email регистрация не должна '
+            f'проверять существование в базе, а выполнила: {sql}'
+        )
+
+    def test_02_user_from_other_process_is_found(self, client):
+        User.objects.bulk_create(
+            [User(username='ghost', email='ghost@yamdb.fake')]
+        )
+        response = client.post(
+            SIGNUP_URL,
+            data={'username': 'ghost', 'email': 'GHOST@yamdb.fake'},
+        )
+        assert response.status_code == HTTPStatus.OK, (
+            'Повторная регистрация пользователя, созданного без сигналов '
+            'этого процесса, должна снова отправлять код, а не падать.'
+        )
+        assert User.objects.count() == 1
+
+    def test_03_stale_filter_costs_one_failed_insert(self, client):
+        user_names.might_exist(USERNAME, 'warm-up')
+        User.objects.bulk_create(
+            [User(username='ghost', email='ghost@yamdb.fake')]
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(
+                SIGNUP_URL,
+                data={'username': 'ghost', 'email': 'ghost@yamdb.fake'},
+            )
+        assert response.status_code == HTTPStatus.OK, (
+            'Если фильтр ещё не знает пользователя, регистрация должна '
+            'проверить базу после отказа уникального индекса.'
+        )
+        sql = user_queries(queries)
+        assert [query.split()[0] for query in sql] == ['INSERT', 'SELECT']
+
+    def test_04_repeated_signup_ignores_email_case(self, client, user):
+        user_names.might_exist(USERNAME, user.username)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(
+                SIGNUP_URL,
+                data={'username': user.username,
+                      'email': user.email.upper()},
+            )
+        assert response.status_code == HTTPStatus.OK, (
+            'Повторная регистрация с тем же email в другом регистре должна '
+            'снова отправлять код подтверждения.'
+        )
+        assert len(user_queries(queries)) == 1
+        assert User.objects.count() == 1
+
+    def test_05_email_conflict_is_case_insensitive(self, client, user):
+        response = client.post(
+            SIGNUP_URL,
+            data={'username': 'other', 'email': user.email.upper()},
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert set(response.json()) == {'email'}
+
+    def test_06_both_conflicts_are_reported(self, client, user, admin):
+        response = client.post(
+            SIGNUP_URL,
+            data={'username': user.username, 'email': admin.email},
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert set(response.json()) == {'username', 'email'}
+
+    def test_07_database_rejects_email_in_other_case(self, user):
+        with pytest.raises(IntegrityError):
+            User.objects.create(username='clone', email=user.email.upper())
+
+    def test_08_admin_email_check_uses_lower_index(self, admin_client, user):
+        with CaptureQueriesContext(connection) as queries:
+            response = admin_client.post(
+                '/api/v1/users/',
+                data={'username': 'clone', 'email': user.email.upper()},
+            )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert set(response.json()) == {'email'}
+        email_checks = [
+            sql for sql in user_queries(queries)
+            if 'email' in sql.partition(' WHERE ')[2].lower()
+        ]
+        assert email_checks and all(
+            'LOWER(' in sql.upper() and ' LIKE ' not in sql.upper()
+            for sql in email_checks
+        ), (
+            'Проверка email должна сравнивать lower(email) - так запрос '
+            f'идёт по уникальному индексу: {email_checks}'
+        )
+
+
+class Test13UserNamesFilter:
+
+    def test_01_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for number in range(1000):
+            bloom.add(f'user{number}')
+        assert all(bloom.might_contain(f'user{n}') for n in range(1000))
+        false_positives = sum(
+            bloom.might_contain(f'stranger{n}') for n in range(10000)
+        )
+        assert false_positives < 300, (
+            'Доля ложных срабатываний фильтра Блума должна быть близка к '
+            'заданной.'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_users_from_other_process_are_shared(self, user):
+        other_process = UserNamesFilter()
+        assert other_process.might_exist(USERNAME, 'warm-up')
+        assert other_process.might_exist(USERNAME, user.username)
+        assert not other_process.might_exist(USERNAME, 'newcomer')
+        User.objects.create(username='newcomer', email='new@yamdb.fake')
+        assert other_process.might_exist(USERNAME, 'newcomer'), (
+            'Пользователь, созданный в другом процессе, должен попадать в '
+            'фильтр через журнал добавлений в общем кеше.'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_username_available(self, client, user):
+        url = '/api/v1/auth/username-available/'
+        response = client.get(url, {'username': user.username})
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == {
+            'username': user.username, 'available': False
+        }
+        response = client.get(url, {'username': 'brand_new'})
+        assert response.json()['available'] is True
+        response = client.get(url, {'username': 'me'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_user_from_other_process_is_taken(self, client,
+                                                 admin_client):
+        User.objects.bulk_create(
+            [User(username='ghost', email='ghost@yamdb.fake')]
+        )
+        response = client.get(
+            '/api/v1/auth/username-available/', {'username': 'ghost'}
+        )
+        assert response.json()['available'] is False
+        response = client.post(
+            SIGNUP_URL, data={'username': 'ghost', 'email': 'x@yamdb.fake'}
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = admin_client.post(
+            '/api/v1/users/',
+            data={'username': 'ghost', 'email': 'y@yamdb.fake'},
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
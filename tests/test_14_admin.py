@@ -0,0 +1,83 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Category, Comment, Genre, Review, Title, User
+
+CHANGELISTS = (
+    '/admin/reviews/title/',
+    '/admin/reviews/review/',
+    '/admin/reviews/comment/',
+    '/admin/reviews/user/',
+)
+
+
+@pytest.fixture
+def superuser_client(user_superuser):
+    client = Client()
+    client.force_login(user_superuser)
+    return client
+
+
+def create_content(count):
+    category, _ = Category.objects.get_or_create(name='Фильм', slug='film')
+    genre, _ = Genre.objects.get_or_create(name='Драма', slug='drama')
+    start = Title.objects.count()
+    for number in range(start, start + count):
+        title = Title.objects.create(
+            name=f'Произведение {number}', year=2000, category=category,
+            description='описание ' * 50,
+        )
+        title.genre.add(genre)
+        author = User.objects.create(
+            username=f'author{number}', email=f'author{number}@yamdb.fake'
+        )
+        review = Review.objects.create(
+            title=title, author=author, text='отзыв ' * 100, score=5
+        )
+        Comment.objects.create(review=review, author=author, text='ок')
+
+
+def changelist_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == HTTPStatus.OK
+    return [query['sql'] for query in queries.captured_queries]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test14Admin:
+
+    @pytest.mark.parametrize('url', CHANGELISTS)
+    def test_01_changelist_queries_do_not_grow_with_rows(
+            self, superuser_client, url
+    ):
+        create_content(2)
+        few = len(changelist_queries(superuser_client, url))
+        create_content(10)
+        many = len(changelist_queries(superuser_client, url))
+        assert many == few, (
+            f'Число запросов на странице `{url}` не должно зависеть от '
+            f'числа строк: было {few}, стало {many}.'
+        )
+
+    def test_02_large_tables_use_estimated_count(self, settings,
+                                                 superuser_client):
+        create_content(3)
+        settings.ESTIMATED_COUNT_THRESHOLD = 1
+        queries = changelist_queries(
+            superuser_client, '/admin/reviews/review/'
+        )
+        assert not any(
+            'COUNT(' in sql and 'reviews_review' in sql for sql in queries
+        ), 'Для большой таблицы changelist не должен выполнять COUNT(*).'
+
+    def test_03_long_text_is_truncated(self, superuser_client):
+        create_content(1)
+        content = superuser_client.get('/admin/reviews/review/').content
+        assert ('отзыв ' * 100).encode() not in content, (
+            'Длинный текст отзыва в списке должен обрезаться.'
+        )
@@ -0,0 +1,158 @@
+import json
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import (
+    ChangeReservation,
+    OutgoingEmail,
+    ReviewBucket,
+    SimilarTitle,
+    Tombstone,
+)
+from tests.utils import create_reviews, create_titles
+
+TITLES_URL = '/api/v1/titles/'
+ASYNC_TITLES_URL = '/api/v1/async/titles/'
+
+
+def get_with_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == HTTPStatus.OK
+    return response, [query['sql'] for query in queries.captured_queries]
+
+
+def count_queries(queries):
+    return [sql for sql in queries if 'COUNT(' in sql]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test15CountPagination:
+
+    def test_01_count_is_cached_per_filter(self, admin_client, client):
+        create_titles(admin_client)
+        _, queries = get_with_queries(client, f'{TITLES_URL}?year=1984')
+        assert len(count_queries(queries)) == 1
+        response, queries = get_with_queries(
+            client, f'{TITLES_URL}?year=1984'
+        )
+        assert response.json()['count'] == 1
+        assert not count_queries(queries), (
+            'Повторный запрос с теми же фильтрами должен брать общее число '
+            'объектов из кеша.'
+        )
+        _, queries = get_with_queries(client, f'{TITLES_URL}?year=1988')
+        assert len(count_queries(queries)) == 1, (
+            'Другие фильтры должны считаться отдельно.'
+        )
+
+    def test_02_writes_invalidate_cached_count(self, admin_client, client):
+        titles, categories, genres = create_titles(admin_client)
+        assert client.get(TITLES_URL).json()['count'] == 2
+        admin_client.post(TITLES_URL, data={
+            'name': 'Новое', 'year': 2000,
+            'genre': [genres[0]['slug']], 'category': categories[0]['slug'],
+        })
+        assert client.get(TITLES_URL).json()['count'] == 3, (
+            'Создание объекта должно сбрасывать закешированное число.'
+        )
+        url = f"{TITLES_URL}?genre={genres[2]['slug']}"
+        assert client.get(url).json()['count'] == 1
+        admin_client.patch(
+            f"{TITLES_URL}{titles[0]['id']}/",
+            data={'genre': [genres[2]['slug']]},
+        )
+        assert client.get(url).json()['count'] == 2, (
+            'Изменение связей many-to-many должно сбрасывать '
+            'закешированное число.'
+        )
+
+    @pytest.mark.parametrize('url', (TITLES_URL, ASYNC_TITLES_URL))
+    def test_03_count_can_be_skipped(self, admin_client, client, url):
+        create_titles(admin_client)
+        response, queries = get_with_queries(client, f'{url}?count=false')
+        assert not count_queries(queries), (
+            'С ?count=false общее число объектов считаться не должно.'
+        )
+        data = response.json()
+        assert data['count'] is None
+        assert len(data['results']) == 2 and data['next'] is None
+        data = client.get(f'{url}?count=false&limit=1').json()
+        assert len(data['results']) == 1
+        assert 'offset=1' in data['next'], (
+            'Без общего числа ссылка на следующую страницу должна '
+            'определяться по наличию следующего объекта.'
+        )
+
+    @pytest.mark.parametrize('url', (TITLES_URL, ASYNC_TITLES_URL))
+    def test_04_large_tables_get_estimated_count(self, settings,
+                                                 admin_client, client, url):
+        create_titles(admin_client)
+        settings.ESTIMATED_COUNT_THRESHOLD = 1
+        response, queries = get_with_queries(client, url)
+        assert response['X-Total-Count-Estimated'] == 'true'
+        assert response.json()['count'] >= 2
+        assert not count_queries(queries), (
+            'Для больших таблиц вместо COUNT(*) должна браться оценка.'
+        )
+
+
+    def test_05_other_tables_keep_fast_delete(self):
+        collector = Collector(using='default')
+        for model in (
+            ChangeReservation, OutgoingEmail, ReviewBucket, SimilarTitle,
+            Tombstone,
+        ):
+            assert collector.can_fast_delete(model.objects.all()), (
+                'Сброс кеша COUNT(*) не должен отключать быстрое удаление '
+                f'у {model.__name__}.'
+            )
+
+
+@pytest.mark.django_db(transaction=True)
+class Test15LimitAndStreaming:
+
+    def test_01_limit_is_capped(self, settings, admin_client, client):
+        create_titles(admin_client)
+        settings.PAGINATION_MAX_LIMIT = 1
+        data = client.get(f'{TITLES_URL}?limit=1000000').json()
+        assert len(data['results']) == 1, (
+            '?limit больше PAGINATION_MAX_LIMIT должен урезаться.'
+        )
+
+    @pytest.mark.parametrize('url', (TITLES_URL, ASYNC_TITLES_URL))
+    def test_02_stream_returns_whole_list(self, settings, monkeypatch,
+                                          admin_client, client, url):
+        create_titles(admin_client)
+        expected = client.get(TITLES_URL).json()['results']
+        monkeypatch.setattr('api.mixins.STREAM_CHUNK_SIZE', 1)
+        settings.PAGINATION_MAX_LIMIT = 1
+        response = client.get(f'{url}?stream=true')
+        assert response.status_code == HTTPStatus.OK
+        assert response.streaming, (
+            'С ?stream=true список должен отдаваться потоком.'
+        )
+        chunks = list(response)
+        assert len(chunks) > 2
+        assert json.loads(b''.join(chunks)) == expected, (
+            'Поток должен содержать весь отфильтрованный список в том же '
+            'виде, что и обычные страницы.'
+        )
+
+    def test_03_stream_of_empty_list(self, client):
+        response = client.get(f'{TITLES_URL}?stream=true')
+        assert json.loads(b''.join(response)) == []
+
+    def test_04_stream_nested_reviews(self, admin_client, admin, client,
+                                      user_client, user):
+        _, titles = create_reviews(
+            admin_client, {admin: admin_client, user: user_client}
+        )
+        url = f"{TITLES_URL}{titles[0]['id']}/reviews/"
+        response = client.get(f'{url}?stream=true')
+        streamed = json.loads(b''.join(response))
+        assert streamed == client.get(url).json()['results']
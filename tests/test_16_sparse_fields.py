@@ -0,0 +1,80 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tests.utils import create_comments, create_titles
+
+TITLES_URL = '/api/v1/titles/'
+
+
+def get_with_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    return response, [query['sql'] for query in queries.captured_queries]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test16SparseFields:
+
+    @pytest.mark.parametrize('prefix', ('/api/v1/', '/api/v1/async/'))
+    def test_01_fields_trim_payload_and_sql(self, admin_client, client,
+                                            prefix):
+        create_titles(admin_client)
+        response, queries = get_with_queries(
+            client, f'{prefix}titles/?fields=id,name,rating&count=false'
+        )
+        assert response.status_code == HTTPStatus.OK
+        for title in response.json()['results']:
+            assert set(title) == {'id', 'name', 'rating'}, (
+                'С ?fields= в ответе должны быть только запрошенные поля.'
+            )
+        assert len(queries) == 1, (
+            'Без полей genre и category не должно быть JOIN и prefetch: '
+            f'{queries}'
+        )
+        assert 'description' not in queries[0]
+        assert 'reviews_category' not in queries[0]
+
+    def test_02_omit_keeps_other_relations(self, admin_client, client):
+        create_titles(admin_client)
+        response, queries = get_with_queries(
+            client, f'{TITLES_URL}?omit=genre,description&count=false'
+        )
+        title = response.json()['results'][0]
+        assert 'genre' not in title and 'description' not in title
+        assert title['category']['slug'], (
+            'Поля, не перечисленные в ?omit=, должны остаться в ответе.'
+        )
+        assert not any('reviews_genre' in sql for sql in queries)
+
+    def test_03_unknown_field_is_rejected(self, client):
+        response = client.get(f'{TITLES_URL}?fields=id,secret')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'secret' in response.json()['fields']
+
+    def test_04_nested_and_users(self, admin_client, admin, user_client,
+                                 user):
+        comments, reviews, titles = create_comments(
+            admin_client, {admin: admin_client, user: user_client}
+        )
+        url = f"{TITLES_URL}{titles[0]['id']}/reviews/"
+        review = admin_client.get(f'{url}?fields=id,score').json()
+        assert set(review['results'][0]) == {'id', 'score'}
+        detail = admin_client.get(
+            f"{url}{reviews[0]['id']}/comments/"
+            f"{comments[0]['id']}/?omit=author"
+        ).json()
+        assert 'author' not in detail and detail['text']
+        users = admin_client.get('/api/v1/users/?fields=username').json()
+        assert all(set(row) == {'username'} for row in users['results'])
+
+    def test_05_writes_ignore_fields(self, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        response = admin_client.patch(
+            f"{TITLES_URL}{titles[0]['id']}/?fields=id",
+            data={'name': 'Новое имя'},
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['name'] == 'Новое имя'
@@ -0,0 +1,93 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tests.utils import create_comments, create_single_review
+
+TITLES_URL = '/api/v1/titles/'
+
+
+def get_with_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == HTTPStatus.OK, response.content
+    return response.json(), [q['sql'] for q in queries.captured_queries]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test17Expand:
+
+    @pytest.fixture
+    def content(self, admin_client, admin, user_client, user,
+                moderator_client, moderator):
+        return create_comments(admin_client, {
+            admin: admin_client,
+            user: user_client,
+            moderator: moderator_client,
+        })
+
+    @pytest.mark.parametrize('prefix', ('/api/v1/', '/api/v1/async/'))
+    def test_01_titles_embed_top_reviews_and_comments(self, content, client,
+                                                      prefix):
+        comments, reviews, titles = content
+        data, queries = get_with_queries(
+            client,
+            f'{prefix}titles/{titles[0]["id"]}/'
+            '?expand=reviews:2,reviews.comments:1',
+        )
+        assert len(data['reviews']) == 2, (
+            '?expand=reviews:2 должен встраивать не больше двух отзывов.'
+        )
+        assert data['reviews'][0]['id'] == reviews[-1]['id'], (
+            'Встраиваться должны самые новые отзывы.'
+        )
+        data, _ = get_with_queries(
+            client,
+            f'{prefix}titles/{titles[0]["id"]}/'
+            '?expand=reviews:3,reviews.comments:1',
+        )
+        embedded = {
+            review['id']: review['comments'] for review in data['reviews']
+        }
+        assert [c['id'] for c in embedded[reviews[0]['id']]] == [
+            comments[-1]['id']
+        ]
+        assert any('ROW_NUMBER' in sql for sql in queries), (
+            'Первые N дочерних объектов должны выбираться оконной функцией.'
+        )
+
+    def test_02_query_count_does_not_depend_on_page_size(
+            self, content, admin_client, user_client, client
+    ):
+        _, _, titles = content
+        url = f'{TITLES_URL}?expand=reviews,reviews.comments&count=false'
+        _, before = get_with_queries(client, url)
+        create_single_review(user_client, titles[1]['id'], 'ещё отзыв', 7)
+        data, after = get_with_queries(client, url)
+        assert len(after) == len(before), (
+            'Число запросов не должно расти с числом родителей на странице.'
+        )
+        assert all('reviews' in title for title in data['results'])
+
+    def test_03_reviews_embed_comments(self, content, client):
+        comments, reviews, titles = content
+        data, _ = get_with_queries(
+            client,
+            f"{TITLES_URL}{titles[0]['id']}/reviews/?expand=comments:5",
+        )
+        review = next(
+            r for r in data['results'] if r['id'] == reviews[0]['id']
+        )
+        assert {c['id'] for c in review['comments']} == {
+            c['id'] for c in comments
+        }
+
+    @pytest.mark.parametrize('expand', (
+        'comments', 'reviews:0', 'reviews:abc', 'reviews:1000'
+    ))
+    def test_04_invalid_expand_is_rejected(self, client, expand):
+        response = client.get(f'{TITLES_URL}?expand={expand}')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'expand' in response.json()
@@ -0,0 +1,62 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tests.utils import create_titles
+
+BATCH_URL = '/api/v1/titles/batch/'
+
+
+@pytest.mark.django_db(transaction=True)
+class Test18TitlesBatch:
+
+    def test_01_batch_keeps_order_and_reports_missing(self, admin_client,
+                                                      client):
+        titles, _, _ = create_titles(admin_client)
+        ids = [titles[1]['id'], 9999, titles[0]['id'], titles[1]['id']]
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                f"{BATCH_URL}?ids={','.join(map(str, ids))}"
+            )
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert [title['id'] for title in data['results']] == [
+            titles[1]['id'], titles[0]['id']
+        ], 'Произведения должны идти в порядке ?ids= и без повторов.'
+        assert data['missing'] == [9999], (
+            'Несуществующие id должны перечисляться в missing.'
+        )
+        assert len(queries) == 2, (
+            'Пачка должна загружаться одним запросом и одним prefetch '
+            f'жанров: {[query["sql"] for query in queries.captured_queries]}'
+        )
+        assert data['results'][0] == client.get(
+            f"/api/v1/titles/{titles[1]['id']}/"
+        ).json()
+
+    def test_02_batch_supports_sparse_fields(self, admin_client, client):
+        titles, _, _ = create_titles(admin_client)
+        data = client.get(
+            f"{BATCH_URL}?ids={titles[0]['id']}&fields=id,name"
+        ).json()
+        assert data['results'] == [
+            {'id': titles[0]['id'], 'name': titles[0]['name']}
+        ]
+
+    @pytest.mark.parametrize('ids', ('', '1,abc', ',,'))
+    def test_03_invalid_ids_are_rejected(self, client, ids):
+        response = client.get(f'{BATCH_URL}?ids={ids}')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'ids' in response.json()
+
+    def test_04_batch_size_is_capped(self, settings, client):
+        settings.TITLES_BATCH_MAX_SIZE = 2
+        response = client.get(f'{BATCH_URL}?ids=1,2,3')
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Пачка больше TITLES_BATCH_MAX_SIZE должна отклоняться.'
+        )
+        assert client.get(f'{BATCH_URL}?ids=1,2,2').status_code == (
+            HTTPStatus.OK
+        )
@@ -0,0 +1,105 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reviews.models import Review
+from tests.utils import create_single_review, create_titles
+
+MY_REVIEWS_URL = '/api/v1/users/me/reviews/'
+
+
+def walk_pages(client, url):
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK, response.content
+        data = response.json()
+        pages.append(data['results'])
+        url = data['next']
+    return pages
+
+
+@pytest.mark.django_db(transaction=True)
+class Test19UserReviews:
+
+    @pytest.fixture
+    def reviews(self, admin_client, user_client, admin):
+        titles, _, _ = create_titles(admin_client)
+        result = [
+            create_single_review(
+                user_client, title['id'], f'Отзыв {title["name"]}', 7
+            ).json()
+            for title in titles
+        ]
+        create_single_review(admin_client, titles[0]['id'], 'Чужой', 3)
+        return result, titles
+
+    def test_01_my_reviews_newest_first_with_titles(self, reviews,
+                                                    user_client):
+        created, titles = reviews
+        with CaptureQueriesContext(connection) as queries:
+            response = user_client.get(MY_REVIEWS_URL)
+        assert response.status_code == HTTPStatus.OK
+        review_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'reviews_review' in query['sql']
+        ]
+        data = response.json()
+        assert [review['id'] for review in data['results']] == [
+            created[1]['id'], created[0]['id']
+        ], 'Отзывы пользователя должны идти от новых к старым.'
+        assert data['results'][0]['title'] == {
+            'id': titles[1]['id'],
+            'name': titles[1]['name'],
+            'year': titles[1]['year'],
+        }
+        assert data['next'] is None
+        assert len(review_queries) == 1 and 'reviews_title' in (
+            review_queries[0]
+        ), 'Произведения должны подгружаться JOIN в том же запросе.'
+        assert 'OFFSET' not in review_queries[0]
+
+    def test_02_cursor_walks_all_pages_with_ties(self, reviews, user_client):
+        created, _ = reviews
+        Review.objects.update(pub_date=timezone.now())
+        pages = walk_pages(user_client, f'{MY_REVIEWS_URL}?limit=1')
+        assert [len(page) for page in pages] == [1, 1], (
+            'Курсор не должен терять и повторять отзывы с одинаковой датой.'
+        )
+        assert sorted(page[0]['id'] for page in pages) == sorted(
+            review['id'] for review in created
+        )
+
+    def test_03_admin_reads_any_user_feed(self, reviews, admin_client,
+                                          user_client, user):
+        created, _ = reviews
+        url = f'/api/v1/users/{user.username}/reviews/'
+        data = admin_client.get(url).json()
+        assert {review['author'] for review in data['results']} == {
+            user.username
+        }
+        assert len(data['results']) == len(created)
+        assert user_client.get(url).status_code == HTTPStatus.FORBIDDEN
+        assert admin_client.get(
+            '/api/v1/users/nobody/reviews/'
+        ).status_code == HTTPStatus.NOT_FOUND
+
+    def test_04_invalid_cursor(self, user_client, client):
+        response = user_client.get(f'{MY_REVIEWS_URL}?cursor=garbage')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        assert client.get(MY_REVIEWS_URL).status_code == (
+            HTTPStatus.UNAUTHORIZED
+        )
+
+    def test_05_limit_is_validated(self, reviews, user_client, settings):
+        settings.PAGINATION_MAX_LIMIT = 1
+        for limit, size in (('0', 2), ('-1', 2), ('x', 2), ('5', 1)):
+            response = user_client.get(MY_REVIEWS_URL, {'limit': limit})
+            assert response.status_code == HTTPStatus.OK
+            assert len(response.json()['results']) == size, (
+                'Некорректный ?limit заменяется размером страницы по '
+                'умолчанию, слишком большой - урезается.'
+            )
@@ -0,0 +1,82 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reviews.models import Comment, Review
+from tests.utils import create_comments
+
+ACTIVITY_URL = '/api/v1/activity/'
+
+
+def get_with_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == HTTPStatus.OK, response.content
+    return response.json(), [q['sql'] for q in queries.captured_queries]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test20Activity:
+
+    @pytest.fixture
+    def content(self, admin_client, admin, user_client, user):
+        return create_comments(
+            admin_client, {admin: admin_client, user: user_client}
+        )
+
+    def test_01_reviews_and_comments_are_merged(self, content, client):
+        comments, reviews, titles = content
+        data, queries = get_with_queries(client, ACTIVITY_URL)
+        items = data['results']
+        assert {(item['type'], item['id']) for item in items} == {
+            *(('review', review['id']) for review in reviews),
+            *(('comment', comment['id']) for comment in comments),
+        }
+        dates = [item['pub_date'] for item in items]
+        assert dates == sorted(dates, reverse=True), (
+            'Лента должна идти от новых записей к старым.'
+        )
+        comment = next(item for item in items if item['type'] == 'comment')
+        assert comment['title'] == titles[0]['id'] and comment['review']
+        assert len(queries) == 2, (
+            'Отзывы и комментарии должны читаться по одному запросу: '
+            f'{queries}'
+        )
+        assert not any('UNION' in sql or 'OFFSET' in sql for sql in queries)
+
+    def test_02_cursor_walks_merged_stream_with_ties(self, content, client):
+        comments, reviews, _ = content
+        now = timezone.now()
+        Review.objects.update(pub_date=now)
+        Comment.objects.update(pub_date=now)
+        url, seen = f'{ACTIVITY_URL}?limit=1', []
+        while url:
+            data = client.get(url).json()
+            seen += [(item['type'], item['id']) for item in data['results']]
+            url = data['next']
+        assert len(seen) == len(reviews) + len(comments), (
+            'Курсор не должен терять и повторять записи с одинаковой датой.'
+        )
+        assert len(set(seen)) == len(seen)
+
+    def test_03_first_page_is_cached(self, content, client):
+        data, _ = get_with_queries(client, f'{ACTIVITY_URL}?limit=1')
+        cached, queries = get_with_queries(client, f'{ACTIVITY_URL}?limit=1')
+        assert cached == data and not queries, (
+            'Первая страница ленты должна браться из кеша.'
+        )
+        _, queries = get_with_queries(client, data['next'])
+        assert queries, 'Следующие страницы не кешируются.'
+        _, queries = get_with_queries(
+            client, f'{ACTIVITY_URL}?limit=1&utm_source=x&_=123'
+        )
+        assert not queries, (
+            'Посторонние параметры запроса не должны обходить кеш.'
+        )
+
+    def test_04_invalid_cursor(self, client):
+        response = client.get(f'{ACTIVITY_URL}?cursor=bm9wZQ==')
+        assert response.status_code == HTTPStatus.NOT_FOUND
@@ -0,0 +1,194 @@
+from datetime import timedelta
+from http import HTTPStatus
+
+import pytest
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.utils import timezone
+
+from reviews.constants import CHANGE_SEQUENCE
+from reviews.models import Category, ChangeReservation, Genre, Sequence
+from tests.utils import create_comments, create_titles
+
+SYNC_URL = '/api/v1/sync/'
+
+
+def sync(client, since=None, limit=None):
+    params = {}
+    if since is not None:
+        params['since'] = since
+    if limit is not None:
+        params['limit'] = limit
+    response = client.get(SYNC_URL, params)
+    assert response.status_code == HTTPStatus.OK, response.content
+    return response.json()
+
+
+def sync_all(client, since=None, limit=None):
+    '''Все пачки от since до конца: изменения и удаления по id.'''
+    changes, deleted = {}, {}
+    while True:
+        data = sync(client, since, limit)
+        for name, objs in data['changes'].items():
+            changes.setdefault(name, {}).update(
+                (obj['id'], obj) for obj in objs
+            )
+        for name, ids in data['deleted'].items():
+            deleted.setdefault(name, set()).update(ids)
+        since = data['cursor']
+        if not data['has_more']:
+            return changes, deleted, since
+
+
+@pytest.mark.django_db(transaction=True)
+class Test21Sync:
+
+    def test_01_full_sync_then_only_deltas(self, admin_client, client):
+        titles, categories, genres = create_titles(admin_client)
+        changes, _, cursor = sync_all(client)
+        assert set(changes['titles']) == {title['id'] for title in titles}
+        assert len(changes['categories']) == len(categories)
+        assert len(changes['genres']) == len(genres)
+        title = changes['titles'][titles[0]['id']]
+        assert title['category'] == next(
+            obj['id'] for obj in changes['categories'].values()
+            if obj['slug'] == titles[0]['category']
+        ), 'Связи в /sync/ должны передаваться по id.'
+
+        data = sync(client, cursor)
+        assert not any(data['changes'].values()), (
+            'Без изменений /sync/ не должен ничего возвращать.'
+        )
+        assert data['cursor'] == cursor and not data['has_more']
+
+        admin_client.patch(
+            f"/api/v1/titles/{titles[1]['id']}/", data={'name': 'Новое'}
+        )
+        data = sync(client, cursor)
+        assert [obj['name'] for obj in data['changes']['titles']] == [
+            'Новое'
+        ]
+        assert not data['changes']['genres']
+        assert data['cursor'] > cursor
+
+    def test_02_deletes_leave_tombstones(self, admin_client, client):
+        titles, _, genres = create_titles(admin_client)
+        _, _, cursor = sync_all(client)
+        admin_client.delete(f"/api/v1/genres/{genres[2]['slug']}/")
+        admin_client.delete(f"/api/v1/titles/{titles[0]['id']}/")
+        changes, deleted, _ = sync_all(client, cursor)
+        assert deleted['titles'] == {titles[0]['id']}
+        assert len(deleted['genres']) == 1
+        assert changes['titles'][titles[1]['id']]['genre'] == [], (
+            'Удаление жанра меняет список жанров его произведений.'
+        )
+
+    def test_03_batches_cover_every_change_once(self, admin_client, admin,
+                                                user_client, user, client):
+        comments, reviews, titles = create_comments(
+            admin_client, {admin: admin_client, user: user_client}
+        )
+        changes, _, _ = sync_all(client)
+        batched, _, _ = sync_all(client, limit=1)
+        assert batched == changes, (
+            'Пачки по одному изменению должны дать тот же результат.'
+        )
+        assert set(changes['reviews']) == {review['id'] for review in reviews}
+        assert set(changes['comments']) == {
+            comment['id'] for comment in comments
+        }
+        assert changes['titles'][titles[0]['id']]['rating'] == 5, (
+            'Изменение рейтинга должно попадать в /sync/.'
+        )
+        review = changes['reviews'][reviews[0]['id']]
+        assert review['title'] == titles[0]['id']
+        assert 'change_seq' not in reviews[0], (
+            'Служебный номер изменения не должен попадать в ответ API.'
+        )
+
+    def test_04_pruned_cursor_is_gone(self, admin_client, client):
+        _, _, genres = create_titles(admin_client)
+        admin_client.delete(f"/api/v1/genres/{genres[0]['slug']}/")
+        call_command('prune_tombstones', days=0)
+        response = client.get(SYNC_URL, {'since': 1})
+        assert response.status_code == HTTPStatus.GONE, (
+            'Курсор старше удалённых записей об удалениях должен '
+            'отправлять клиента на полную загрузку.'
+        )
+        assert client.get(SYNC_URL).status_code == HTTPStatus.OK
+
+    def test_05_uncommitted_change_holds_cursor(self, admin_client, client):
+        titles, _, genres = create_titles(admin_client)
+        assert not ChangeReservation.objects.exists(), (
+            'После коммита записи отметка о номере изменения снимается.'
+        )
+        _, _, cursor = sync_all(client)
+        # Запись получила номер, но ещё не закоммичена.
+        change_seq = Sequence.reserve(CHANGE_SEQUENCE)[0]
+        reservation = ChangeReservation.objects.create(
+            change_seq=change_seq,
+            expires_at=timezone.now() + timedelta(minutes=1),
+        )
+        admin_client.patch(
+            f"/api/v1/titles/{titles[1]['id']}/", data={'name': 'Новое'}
+        )
+        data = sync(client, cursor)
+        assert not any(data['changes'].values()) and (
+            data['cursor'] == cursor
+        ), (
+            'Изменения после незакоммиченного номера не должны отдаваться: '
+            'курсор перешагнул бы его.'
+        )
+
+        Genre.objects.filter(slug=genres[0]['slug']).update(
+            name='Поздний', change_seq=change_seq
+        )
+        reservation.release()
+        changes, _, _ = sync_all(client, cursor)
+        assert [obj['name'] for obj in changes['genres'].values()] == [
+            'Поздний'
+        ]
+        assert changes['titles'][titles[1]['id']]['name'] == 'Новое'
+
+    def test_06_expired_and_rolled_back_reservations(self, admin_client,
+                                                     client):
+        _, categories, _ = create_titles(admin_client)
+        with pytest.raises(IntegrityError):
+            Category(name='Дубль', slug=categories[0]['slug']).save()
+        assert not ChangeReservation.objects.exists(), (
+            'При откате записи отметка о номере изменения снимается.'
+        )
+        _, _, cursor = sync_all(client)
+        ChangeReservation.objects.create(
+            change_seq=Sequence.reserve(CHANGE_SEQUENCE)[0],
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        Category.objects.create(name='Новая', slug='new')
+        changes, _, _ = sync_all(client, cursor)
+        assert [obj['slug'] for obj in changes['categories'].values()] == [
+            'new'
+        ], 'Просроченная отметка считается откатившейся транзакцией.'
+        call_command('prune_tombstones')
+        assert not ChangeReservation.objects.exists()
+
+    def test_07_service_fields_stay_private(self, admin_client, admin,
+                                            user_client, user, client):
+        comments, reviews, titles = create_comments(
+            admin_client, {admin: admin_client, user: user_client}
+        )
+        title_url = f"/api/v1/titles/{titles[0]['id']}/"
+        review_url = f"{title_url}reviews/{reviews[0]['id']}/"
+        responses = [
+            client.get(title_url).json(),
+            client.get(review_url).json(),
+            client.get(f"{review_url}comments/{comments[0]['id']}/").json(),
+            *client.get('/api/v1/categories/').json()['results'],
+            *client.get('/api/v1/genres/').json()['results'],
+            *titles,
+            *reviews,
+        ]
+        for data in responses:
+            leaked = {'change_seq', 'pending_deletion'} & set(data)
+            assert not leaked, (
+                f'Служебные поля {leaked} не должны попадать в ответ API.'
+            )
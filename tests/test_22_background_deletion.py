@@ -0,0 +1,127 @@
+from http import HTTPStatus
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+
+from reviews.models import (
+    Comment,
+    DeletionJob,
+    Review,
+    Title,
+    Tombstone,
+    User,
+)
+from tests.utils import create_comments
+
+TITLES_URL = '/api/v1/titles/'
+
+
+@pytest.mark.django_db(transaction=True)
+class Test22BackgroundDeletion:
+
+    @pytest.fixture
+    def content(self, admin_client, admin, user_client, user):
+        return create_comments(
+            admin_client, {admin: admin_client, user: user_client}
+        )
+
+    def test_01_title_is_hidden_then_deleted_in_batches(self, content,
+                                                        admin_client,
+                                                        client):
+        comments, reviews, titles = content
+        url = f"{TITLES_URL}{titles[0]['id']}/"
+        response = admin_client.delete(f'{url}?background=true')
+        assert response.status_code == HTTPStatus.ACCEPTED
+        job = DeletionJob.objects.get(pk=response.json()['deletion_job'])
+        assert job.status == DeletionJob.PENDING
+        assert client.get(url).status_code == HTTPStatus.NOT_FOUND, (
+            'Произведение должно скрываться сразу.'
+        )
+        assert client.get(f'{url}reviews/').status_code == (
+            HTTPStatus.NOT_FOUND
+        )
+        assert [t['id'] for t in client.get(TITLES_URL).json()['results']] == [
+            titles[1]['id']
+        ]
+        assert Review.objects.exists(), (
+            'Содержимое удаляет воркер, а не запрос.'
+        )
+
+        call_command('run_deletions', batch_size=1)
+        job.refresh_from_db()
+        assert job.status == DeletionJob.DONE and job.finished_at
+        assert job.deleted_objects == len(reviews) + len(comments) + 1
+        assert not Title.objects.filter(pk=titles[0]['id']).exists()
+        assert not Review.objects.exists() and not Comment.objects.exists()
+        assert Tombstone.objects.filter(model='reviews.comment').count() == (
+            len(comments)
+        ), 'Порции удаления должны попадать в журнал /sync/.'
+        deleted = client.get('/api/v1/sync/', {'since': 1}).json()['deleted']
+        assert set(deleted['reviews']) == {r['id'] for r in reviews}
+        assert deleted['titles'] == [titles[0]['id']]
+
+    def test_02_user_is_deactivated_then_content_deleted(
+            self, content, admin_client, user_client, user, admin
+    ):
+        _, _, titles = content
+        url = f'/api/v1/users/{user.username}/'
+        response = admin_client.delete(f'{url}?background=true')
+        assert response.status_code == HTTPStatus.ACCEPTED
+        assert user_client.get('/api/v1/users/me/').status_code == (
+            HTTPStatus.UNAUTHORIZED
+        ), 'Токены удаляемого пользователя должны отзываться сразу.'
+        assert admin_client.get(url).status_code == HTTPStatus.NOT_FOUND
+
+        call_command('run_deletions')
+        assert not User.objects.filter(pk=user.pk).exists()
+        assert not Review.objects.filter(author=user.pk).exists()
+        assert not Comment.objects.filter(author=user.pk).exists()
+        assert Comment.objects.filter(author=admin).exists()
+        title = Title.objects.get(pk=titles[0]['id'])
+        assert title.review_count == 1, (
+            'Счётчики рейтинга должны пересчитываться после порции.'
+        )
+
+    def test_03_plain_destroy_is_unchanged(self, content, admin_client):
+        _, _, titles = content
+        response = admin_client.delete(f"{TITLES_URL}{titles[0]['id']}/")
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert not DeletionJob.objects.exists()
+        assert not Review.objects.exists()
+
+    def test_04_failed_job_keeps_error(self, content, admin_client):
+        _, _, titles = content
+        admin_client.delete(f"{TITLES_URL}{titles[0]['id']}/?background=1")
+        with patch(
+            'reviews.deletion.delete_content', side_effect=RuntimeError('boom')
+        ):
+            call_command('run_deletions')
+        job = DeletionJob.objects.get()
+        assert job.status == DeletionJob.FAILED
+        assert job.last_error == 'boom'
+        assert Title.objects.filter(pk=titles[0]['id']).exists()
+
+    def test_05_hidden_title_content_is_hidden(self, content, admin_client,
+                                               user_client, client):
+        comments, reviews, titles = content
+        title_url = f"{TITLES_URL}{titles[0]['id']}/"
+        comments_url = f"{title_url}reviews/{reviews[0]['id']}/comments/"
+        admin_client.delete(f'{title_url}?background=true')
+        for url in (
+            comments_url,
+            f"{comments_url}{comments[0]['id']}/",
+            comments_url.replace('/api/v1/', '/api/v1/async/'),
+        ):
+            assert client.get(url).status_code == HTTPStatus.NOT_FOUND, (
+                'Комментарии скрытого произведения должны быть недоступны.'
+            )
+        response = user_client.post(comments_url, data={'text': 'Поздно'})
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            'К отзыву скрытого произведения нельзя добавить комментарий.'
+        )
+        assert not client.get('/api/v1/activity/').json()['results'], (
+            'Лента не должна показывать содержимое скрытого произведения.'
+        )
+        changes = client.get('/api/v1/sync/').json()['changes']
+        assert not changes['reviews'] and not changes['comments']
@@ -0,0 +1,151 @@
+from http import HTTPStatus
+
+import numpy as np
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews.models import Category, Review, SimilarTitle, Title, User
+from reviews.similarity import RatingMatrix, build_similar_titles
+
+TITLES_URL = '/api/v1/titles/'
+
+# Оценки пользователей: первые два произведения нравятся одним и тем же
+# зрителям, третье - наоборот, четвёртое без отзывов.
+SCORES = (
+    (9, 8, 2),
+    (8, 9, 3),
+    (3, 2, 9),
+    (2, 3, 8),
+)
+
+
+def dense_similarities(title_ids, user_ids, scores):
+    '''Adjusted cosine по плотной матрице - эталон для RatingMatrix.'''
+    titles, rows = np.unique(title_ids, return_inverse=True)
+    _, cols = np.unique(user_ids, return_inverse=True)
+    matrix = np.full((len(titles), cols.max() + 1), np.nan)
+    matrix[rows, cols] = scores
+    centered = np.nan_to_num(matrix - np.nanmean(matrix, axis=0))
+    norms = np.linalg.norm(centered, axis=1)
+    dots = centered @ centered.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        similarities = np.nan_to_num(dots / np.outer(norms, norms))
+    np.fill_diagonal(similarities, 0)
+    return similarities
+
+
+class Test23RatingMatrix:
+
+    def test_01_blocked_product_matches_dense(self, monkeypatch):
+        rng = np.random.default_rng(23)
+        pairs = rng.choice(40 * 30, size=500, replace=False)
+        title_ids, user_ids = pairs // 30 * 7 + 1, pairs % 30
+        scores = rng.integers(1, 11, size=len(pairs)).astype(float)
+        # Маленькие блоки, чтобы строки считались по частям.
+        monkeypatch.setattr('reviews.similarity.BLOCK_CELLS', 100)
+        monkeypatch.setattr('reviews.similarity.BLOCK_PAIRS', 300)
+        matrix = RatingMatrix(title_ids, user_ids, scores)
+        expected = dense_similarities(title_ids, user_ids, scores)
+        blocks = list(matrix.blocks(np.arange(len(matrix))))
+        assert len(blocks) > 1
+        actual = np.vstack([matrix.similarities(rows) for rows in blocks])
+        np.testing.assert_allclose(actual, expected, atol=1e-12)
+
+        for block_ids, neighbours, similarities in matrix.neighbours(
+            np.arange(len(matrix)), 5
+        ):
+            for title_id, similar_ids, values in zip(
+                block_ids, neighbours, similarities
+            ):
+                row = np.searchsorted(matrix.title_ids, title_id)
+                best = np.sort(expected[row][expected[row] > 0])[::-1][:5]
+                np.testing.assert_allclose(values, best)
+                assert title_id not in similar_ids
+
+
+@pytest.mark.django_db(transaction=True)
+class Test23SimilarTitles:
+
+    @pytest.fixture
+    def titles(self):
+        category = Category.objects.create(name='Фильм', slug='film')
+        titles = [
+            Title.objects.create(
+                name=f'Фильм {i}', year=2000, category=category
+            )
+            for i in range(4)
+        ]
+        for i, user_scores in enumerate(SCORES):
+            author = User.objects.create(
+                username=f'viewer{i}', email=f'viewer{i}@yamdb.fake'
+            )
+            for title, score in zip(titles, user_scores):
+                Review.objects.create(
+                    title=title, author=author, text='Отзыв', score=score
+                )
+        return titles
+
+    def test_01_similar_titles_in_one_query(self, titles, client):
+        call_command('build_similar_titles')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'{TITLES_URL}{titles[0].pk}/similar/')
+        assert response.status_code == HTTPStatus.OK
+        assert [title['id'] for title in response.json()] == [titles[1].pk], (
+            'Похожими должны быть только произведения с положительным '
+            'сходством оценок.'
+        )
+        assert len(queries) == 2, (
+            'Соседи должны читаться одним запросом и prefetch жанров: '
+            f'{[query["sql"] for query in queries.captured_queries]}'
+        )
+        assert response.json()[0] == client.get(
+            f'{TITLES_URL}{titles[1].pk}/'
+        ).json()
+
+    def test_02_unknown_or_unrated_title(self, titles, client):
+        call_command('build_similar_titles')
+        response = client.get(f'{TITLES_URL}{titles[3].pk}/similar/')
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == []
+        for pk in (9999, 'abc'):
+            response = client.get(f'{TITLES_URL}{pk}/similar/')
+            assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_03_rebuild_is_incremental(self, titles):
+        assert build_similar_titles() == 3
+        with CaptureQueriesContext(connection) as queries:
+            assert build_similar_titles() == 0, (
+                'Без новых отзывов повторная сборка ничего не пересчитывает.'
+            )
+        assert not any(
+            '"reviews_review"."score"' in query['sql']
+            for query in queries.captured_queries
+        ), 'Без изменений оценки не читаются.'
+        newcomer = User.objects.create(
+            username='newcomer', email='newcomer@yamdb.fake'
+        )
+        Review.objects.create(
+            title=titles[2], author=newcomer, text='Отзыв', score=9
+        )
+        Review.objects.create(
+            title=titles[3], author=newcomer, text='Отзыв', score=1
+        )
+        assert build_similar_titles() == 2, (
+            'Пересчитываются только произведения с оценками '
+            'изменившихся пользователей.'
+        )
+        assert list(
+            SimilarTitle.objects.filter(title=titles[3])
+            .values_list('similar', flat=True)
+        ) == []
+        assert build_similar_titles(full=True) == 4
+
+    def test_04_titles_without_reviews_lose_neighbours(self, titles):
+        build_similar_titles()
+        assert SimilarTitle.objects.filter(title=titles[0]).exists()
+        Review.objects.filter(title=titles[0]).delete()
+        build_similar_titles()
+        assert not SimilarTitle.objects.filter(title=titles[0]).exists()
+        assert not SimilarTitle.objects.filter(similar=titles[0]).exists()
@@ -0,0 +1,162 @@
+from http import HTTPStatus
+
+import numpy as np
+import pytest
+from django.core.management import call_command
+
+from reviews.models import Category, Review, Title, User
+from reviews.recommendations import (
+    KEEP_VERSIONS,
+    factorize,
+    least_squares,
+    load_factors,
+    row_blocks,
+)
+
+RECOMMENDATIONS_URL = '/api/v1/users/me/recommendations/'
+
+# Две группы зрителей с противоположными вкусами: первые три
+# произведения нравятся первой группе, последние три - второй.
+TASTES = (
+    (9, 8, 9, 2, 1, 2),
+    (8, 9, 8, 1, 2, 3),
+    (9, 9, 7, 2, 2, 1),
+    (2, 1, 2, 9, 8, 9),
+    (1, 2, 3, 8, 9, 8),
+    (2, 2, 1, 9, 9, 7),
+)
+
+
+class Test24Factorization:
+
+    def test_01_als_recovers_low_rank_scores(self, monkeypatch):
+        rng = np.random.default_rng(24)
+        users, titles = rng.normal(size=(300, 3)), rng.normal(size=(60, 3))
+        pairs = rng.choice(300 * 60, size=6000, replace=False)
+        user_ids, title_ids = pairs // 60, pairs % 60
+        scores = 5 + np.sum(users[user_ids] * titles[title_ids], axis=1)
+        # Маленькие блоки, чтобы потоки решали их по частям.
+        monkeypatch.setattr('reviews.recommendations.BLOCK_CELLS', 100)
+        results = [
+            factorize(
+                title_ids, user_ids, scores, rank=3, iterations=15,
+                regularization=0.01, workers=workers,
+            )
+            for workers in (1, 4)
+        ]
+        assert results[0][-1] < 0.3, 'ALS должен приближать оценки.'
+        np.testing.assert_allclose(results[0][1], results[1][1])
+        np.testing.assert_array_equal(results[0][0], np.arange(60))
+
+    def test_02_long_rows_are_summed_in_chunks(self, monkeypatch):
+        rng = np.random.default_rng(46)
+        other = rng.normal(size=(50, 4))
+        lengths = np.array([3, 40, 2, 1, 25])
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        cols = rng.integers(0, len(other), size=indptr[-1])
+        values = rng.normal(size=indptr[-1])
+        monkeypatch.setattr('reviews.recommendations.BLOCK_CELLS', 40)
+        assert max(
+            indptr[stop] - indptr[start]
+            for start, stop in row_blocks(indptr, 4)
+            if stop - start > 1
+        ) <= 10, 'Блок из нескольких строк не должен превышать предел.'
+        factors = least_squares(indptr, cols, values, other, 0.1, 2)
+        for row, length in enumerate(lengths):
+            vectors = other[cols[indptr[row]:indptr[row + 1]]]
+            expected = np.linalg.solve(
+                vectors.T @ vectors + 0.1 * length * np.eye(4),
+                vectors.T @ values[indptr[row]:indptr[row + 1]],
+            )
+            np.testing.assert_allclose(factors[row], expected)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test24Recommendations:
+
+    @pytest.fixture(autouse=True)
+    def factors_dir(self, settings, tmp_path):
+        settings.RECOMMENDATIONS_DIR = tmp_path
+
+    @pytest.fixture
+    def titles(self):
+        category = Category.objects.create(name='Фильм', slug='film')
+        titles = [
+            Title.objects.create(
+                name=f'Фильм {i}', year=2000, category=category
+            )
+            for i in range(len(TASTES[0]))
+        ]
+        for i, scores in enumerate(TASTES):
+            author = User.objects.create(
+                username=f'viewer{i}', email=f'viewer{i}@yamdb.fake'
+            )
+            for title, score in zip(titles, scores):
+                Review.objects.create(
+                    title=title, author=author, text='Отзыв', score=score
+                )
+        return titles
+
+    def rate(self, user, titles, scores):
+        for title, score in zip(titles, scores):
+            Review.objects.create(
+                title=title, author=user, text='Отзыв', score=score
+            )
+
+    def recommended(self, client):
+        response = client.get(RECOMMENDATIONS_URL)
+        assert response.status_code == HTTPStatus.OK, response.content
+        return [title['id'] for title in response.json()]
+
+    def test_01_unseen_titles_by_taste(self, titles, user, user_client):
+        self.rate(user, (titles[0], titles[3]), (10, 1))
+        call_command('train_recommendations', factors=2, iterations=10)
+        titles_factors, _ = load_factors()
+        assert titles_factors.dtype['factors'].base == np.float32
+        ids = self.recommended(user_client)
+        assert set(ids) == {title.pk for title in titles[1:3] + titles[4:]}, (
+            'Рекомендуются только непросмотренные произведения.'
+        )
+        assert set(ids[:2]) == {titles[1].pk, titles[2].pk}, (
+            'Первыми должны идти произведения, которые любят зрители '
+            'с похожим вкусом.'
+        )
+
+    def test_02_new_user_is_folded_in(self, titles, user, user_client):
+        call_command('train_recommendations', factors=2, iterations=10)
+        assert self.recommended(user_client) == [], (
+            'Без отзывов и факторов рекомендовать нечего.'
+        )
+        self.rate(user, (titles[3], titles[0]), (10, 1))
+        ids = self.recommended(user_client)
+        assert set(ids[:2]) == {titles[4].pk, titles[5].pk}, (
+            'Пользователь, появившийся после обучения, получает '
+            'рекомендации по своим отзывам.'
+        )
+
+    def test_03_without_model(self, titles, user_client, client):
+        assert self.recommended(user_client) == []
+        response = client.get(RECOMMENDATIONS_URL)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    def test_04_retraining_switches_both_matrices_at_once(
+            self, titles, user, user_client, settings
+    ):
+        self.rate(user, (titles[0], titles[3]), (10, 1))
+        call_command('train_recommendations', factors=2, iterations=10)
+        call_command('train_recommendations', factors=3, iterations=10)
+        title_factors, user_factors = load_factors()
+        assert title_factors.dtype == user_factors.dtype, (
+            'Факторы произведений и пользователей должны читаться из одной '
+            'версии обучения.'
+        )
+        assert title_factors.dtype['factors'].shape == (3,)
+        call_command('train_recommendations', factors=2, iterations=10)
+        versions = [
+            path for path in settings.RECOMMENDATIONS_DIR.iterdir()
+            if path.is_dir()
+        ]
+        assert len(versions) == KEEP_VERSIONS, (
+            'Старые версии факторов должны удаляться.'
+        )
+        assert len(self.recommended(user_client)) == 4
@@ -0,0 +1,84 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from reviews.models import Category, Review, Title, User
+
+TITLES_URL = '/api/v1/titles/'
+
+# Одна десятка, много девяток, без отзывов и много троек.
+SCORES = ((10,), (9, 9, 9, 9), (), (3, 3, 3, 3))
+
+
+@pytest.mark.django_db(transaction=True)
+class Test25WeightedRating:
+
+    @pytest.fixture(autouse=True)
+    def min_reviews(self, settings):
+        settings.WEIGHTED_RATING_MIN_REVIEWS = 2
+
+    @pytest.fixture
+    def titles(self):
+        category = Category.objects.create(name='Фильм', slug='film')
+        authors = [
+            User.objects.create(
+                username=f'viewer{i}', email=f'viewer{i}@yamdb.fake'
+            )
+            for i in range(4)
+        ]
+        titles = []
+        for i, scores in enumerate(SCORES):
+            title = Title.objects.create(
+                name=f'Фильм {i}', year=2000 + i, category=category
+            )
+            for author, score in zip(authors, scores):
+                Review.objects.create(
+                    title=title, author=author, text='Отзыв', score=score
+                )
+            titles.append(title)
+        return titles
+
+    def ordered(self, client, ordering):
+        response = client.get(TITLES_URL, {'ordering': ordering})
+        return [title['id'] for title in response.json()['results']]
+
+    def test_01_many_reviews_beat_single_high_score(self, titles, client):
+        single, many, unrated, low = (title.pk for title in titles)
+        assert self.ordered(client, '-rating')[0] == single
+        assert self.ordered(client, '-weighted_rating') == [
+            many, single, unrated, low
+        ], (
+            'Взвешенный рейтинг должен ставить произведение с одной '
+            'оценкой ниже произведения с множеством высоких.'
+        )
+        data = client.get(f'{TITLES_URL}{many}/').json()
+        assert 'weighted_rating' in data
+        assert 'change_seq' not in data and 'pending_deletion' not in data
+
+    def test_02_recompute_uses_global_prior(self, titles):
+        out = StringIO()
+        call_command('recompute_weighted_ratings', stdout=out)
+        prior = (10 + 9 * 4 + 3 * 4) / 9
+        for title, scores in zip(titles, SCORES):
+            title.refresh_from_db()
+            assert title.weighted_rating == pytest.approx(
+                (sum(scores) + 2 * prior) / (len(scores) + 2)
+            )
+        call_command('recompute_weighted_ratings', stdout=out)
+        assert out.getvalue().splitlines()[-1].endswith(
+            'обновлён взвешенный рейтинг 0 произведений'
+        ), 'Без изменений команда ничего не должна записывать.'
+
+        new = Title.objects.create(
+            name='Новый', year=2024, category=titles[0].category
+        )
+        assert new.weighted_rating == pytest.approx(prior), (
+            'Новое произведение без отзывов получает среднюю оценку.'
+        )
+
+    def test_03_ordering_uses_index(self, titles):
+        plan = Title.objects.order_by('-weighted_rating')[:10].explain()
+        assert 'weighted_rating' in plan and 'TEMP B-TREE' not in plan, (
+            f'Сортировка должна идти по индексу: {plan}'
+        )
@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reviews.models import Category, Comment, Review, Title, User
+from reviews.trending import (
+    activity_scores,
+    event_score,
+    recompute_trending,
+)
+
+TITLES_URL = '/api/v1/titles/'
+TRENDING_URL = f'{TITLES_URL}trending/'
+
+
+@pytest.mark.django_db(transaction=True)
+class Test26Trending:
+
+    @pytest.fixture
+    def titles(self):
+        category = Category.objects.create(name='Фильм', slug='film')
+        return [
+            Title.objects.create(
+                name=f'Фильм {i}', year=2000, category=category
+            )
+            for i in range(3)
+        ]
+
+    @pytest.fixture
+    def authors(self):
+        return [
+            User.objects.create(
+                username=f'viewer{i}', email=f'viewer{i}@yamdb.fake'
+            )
+            for i in range(3)
+        ]
+
+    def review(self, title, author):
+        return Review.objects.create(
+            title=title, author=author, text='Отзыв', score=5
+        )
+
+    def test_01_each_event_is_added_in_log_space(self, titles, authors):
+        first = self.review(titles[0], authors[0])
+        second = self.review(titles[0], authors[1])
+        comment = Comment.objects.create(
+            review=first, author=authors[2], text='Комментарий'
+        )
+        titles[0].refresh_from_db()
+        expected = np.logaddexp.reduce([
+            event_score(obj.pub_date) for obj in (first, second, comment)
+        ])
+        assert titles[0].trending_score == pytest.approx(expected), (
+            'Каждый отзыв и комментарий добавляет свой вес к счёту.'
+        )
+        score = titles[0].trending_score
+        recompute_trending()
+        titles[0].refresh_from_db()
+        assert titles[0].trending_score == pytest.approx(score), (
+            'Полный пересчёт должен совпадать с накопленным счётом.'
+        )
+
+    def test_02_old_activity_decays(self, titles, authors, client):
+        for author in authors:
+            self.review(titles[0], author)
+        self.review(titles[1], authors[0])
+        Review.objects.filter(title=titles[0]).update(
+            pub_date=timezone.now() - timedelta(days=10)
+        )
+        recompute_trending()
+        ids = [title['id'] for title in client.get(TRENDING_URL).json()]
+        assert ids == [titles[1].pk, titles[0].pk], (
+            'Три отзыва десятидневной давности весят меньше одного нового; '
+            'произведения без активности в список не попадают.'
+        )
+        response = client.get(TITLES_URL, {'ordering': '-trending_score'})
+        assert [
+            title['id'] for title in response.json()['results']
+        ][:2] == ids
+
+    def test_03_trending_is_cached(self, titles, authors, client):
+        self.review(titles[2], authors[0])
+        data = client.get(TRENDING_URL).json()
+        self.review(titles[1], authors[0])
+        with CaptureQueriesContext(connection) as queries:
+            cached = client.get(TRENDING_URL).json()
+        assert cached == data and not queries, (
+            'Список популярных должен браться из кеша.'
+        )
+        assert 'trending_score' not in data[0]
+        with CaptureQueriesContext(connection) as queries:
+            client.get(TRENDING_URL, {'_': '123', 'ordering': 'name'})
+        assert not queries, (
+            'Посторонние параметры запроса не должны обходить кеш.'
+        )
+        names = client.get(TRENDING_URL, {'fields': 'name,id'}).json()
+        assert set(names[0]) == {'id', 'name'}
+        with CaptureQueriesContext(connection) as queries:
+            same = client.get(TRENDING_URL, {'fields': 'id,name'}).json()
+        assert same == names and not queries, (
+            'Тот же набор полей в другом порядке берётся из того же кеша.'
+        )
+
+    def test_04_activity_is_folded_chunk_by_chunk(self, titles, authors):
+        for author in authors:
+            first = self.review(titles[0], author)
+            self.review(titles[2], author)
+            Comment.objects.create(
+                review=first, author=author, text='Комментарий'
+            )
+        whole = activity_scores(DEFAULT_DB_ALIAS, 1)
+        chunked = activity_scores(DEFAULT_DB_ALIAS, 1, chunk_size=2)
+        assert len(whole) == titles[2].pk + 1, (
+            'Массив счётов должен расти до id новых произведений.'
+        )
+        np.testing.assert_allclose(chunked, whole)
+        titles[0].refresh_from_db()
+        assert whole[titles[0].pk] == pytest.approx(titles[0].trending_score)
+        assert whole[titles[1].pk] == -np.inf
@@ -0,0 +1,120 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews import aggregates
+from reviews.aggregates import audit_titles
+from reviews.models import Category, Comment, Review, Title, User
+
+
+def audit(*args):
+    out = StringIO()
+    call_command('audit_aggregates', '--chunk-size=2', *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+class Test27AuditAggregates:
+
+    @pytest.fixture
+    def titles(self):
+        category = Category.objects.create(name='Фильм', slug='film')
+        titles = [
+            Title.objects.create(
+                name=f'Фильм {i}', year=2000, category=category
+            )
+            for i in range(3)
+        ]
+        authors = [
+            User.objects.create(
+                username=f'viewer{i}', email=f'viewer{i}@yamdb.fake'
+            )
+            for i in range(3)
+        ]
+        for score, author in enumerate(authors, 3):
+            for title in titles[:2]:
+                review = Review.objects.create(
+                    title=title, author=author, text='Отзыв', score=score
+                )
+                Comment.objects.create(
+                    review=review, author=authors[0], text='Комментарий'
+                )
+        return titles
+
+    def test_01_consistent_counters_pass(self, titles):
+        assert 'Расхождений нет' in audit()
+
+    def test_02_drift_is_reported_then_fixed(self, titles):
+        expected = {
+            title.pk: (title.review_count, title.score_total)
+            for title in Title.objects.all()
+        }
+        Title.objects.filter(pk=titles[0].pk).update(review_count=99)
+        Title.objects.filter(pk=titles[1].pk).update(
+            score_total=1, trending_score=0
+        )
+        Title.objects.filter(pk=titles[2].pk).update(trending_score=1)
+
+        report = audit()
+        assert f'review_count: расхождений 1, id: {titles[0].pk}' in report
+        assert f'score_total: расхождений 1, id: {titles[1].pk}' in report
+        assert 'trending_score: расхождений 2' in report
+        assert Title.objects.get(pk=titles[0].pk).review_count == 99, (
+            'Без --fix команда только сообщает о расхождениях.'
+        )
+
+        audit('--fix')
+        assert {
+            title.pk: (title.review_count, title.score_total)
+            for title in Title.objects.all()
+        } == expected
+        assert Title.objects.get(pk=titles[2].pk).trending_score == 0
+        assert Title.objects.get(pk=titles[1].pk).trending_score > 0
+        checked, mismatches, orphans, stale = audit_titles()
+        assert checked == 3 and orphans == 0 and not len(stale)
+        assert not any(len(ids) for ids in mismatches.values())
+
+    def test_03_concurrent_write_is_not_overwritten(self, titles,
+                                                    monkeypatch):
+        Title.objects.filter(pk=titles[0].pk).update(review_count=99)
+        Title.objects.filter(pk=titles[1].pk).update(review_count=98)
+        collect_totals = aggregates.collect_totals
+
+        def collect_during_write(*args):
+            totals = collect_totals(*args)
+            # Пока сверка читала отзывы, счётчики произведения обновились.
+            Title.objects.filter(pk=titles[0].pk).update(review_count=7)
+            return totals
+
+        monkeypatch.setattr(
+            aggregates, 'collect_totals', collect_during_write
+        )
+        report = audit('--fix')
+        assert Title.objects.get(pk=titles[0].pk).review_count == 7, (
+            'Исправление не должно затирать запись, сделанную во время '
+            'сверки.'
+        )
+        assert Title.objects.get(pk=titles[1].pk).review_count == 3
+        assert (
+            f'Изменились во время сверки и не исправлены: 1, '
+            f'id: {titles[0].pk}'
+        ) in report
+
+    def test_04_batch_is_repaired_by_one_update(self, titles):
+        Title.objects.update(review_count=99)
+        with CaptureQueriesContext(connection) as queries:
+            audit_titles(fix=True)
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "reviews_title"')
+        ]
+        assert len(updates) == 1 and 'CASE' in updates[0], (
+            'Порция исправлений должна записываться одним UPDATE с CASE, '
+            f'а выполнено: {updates}'
+        )
+        assert [
+            title.review_count for title in Title.objects.order_by('pk')
+        ] == [3, 3, 0]
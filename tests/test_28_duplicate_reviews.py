@@ -0,0 +1,121 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from reviews.minhash import signature, similarity
+from reviews.models import (
+    Category,
+    DuplicateReview,
+    Review,
+    ReviewBucket,
+    ReviewSignature,
+    Title,
+    User,
+)
+
+DUPLICATES_URL = '/api/v1/moderation/duplicates/'
+SPAM = (
+    'Лучший фильм года, смотрите бесплатно и без регистрации на нашем '
+    'сайте, ссылка в профиле, там же скидки на все премьеры недели'
+)
+OTHER = (
+    'Неторопливая драма о семье, которая переезжает в маленький город и '
+    'заново учится разговаривать друг с другом после долгой ссоры'
+)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test28DuplicateReviews:
+
+    @pytest.fixture
+    def reviews(self):
+        category = Category.objects.create(name='Фильм', slug='film')
+        titles = [
+            Title.objects.create(
+                name=f'Фильм {i}', year=2000, category=category
+            )
+            for i in range(3)
+        ]
+        authors = [
+            User.objects.create(
+                username=f'spammer{i}', email=f'spammer{i}@yamdb.fake'
+            )
+            for i in range(3)
+        ]
+        return [
+            Review.objects.create(
+                title=titles[0], author=authors[0], text=SPAM, score=10
+            ),
+            Review.objects.create(
+                title=titles[1], author=authors[1], text=f'{SPAM}!!!',
+                score=10,
+            ),
+            Review.objects.create(
+                title=titles[2], author=authors[2], text=OTHER, score=7
+            ),
+        ]
+
+    def test_01_signature_estimates_similarity(self):
+        spam = signature(SPAM, 8)
+        assert similarity(spam, signature(SPAM.upper(), 8)) == 1
+        assert similarity(
+            spam, signature(SPAM.replace('недели', 'месяца'), 8)
+        ) > 0.7
+        assert similarity(spam, signature(OTHER, 8)) < 0.2
+        assert signature('Отличный фильм, всем советую', 8) is None, (
+            'Короткие отзывы не проверяются: одинаковые короткие '
+            'отзывы - не спам.'
+        )
+
+    def test_02_moderators_see_new_duplicates(
+        self, reviews, moderator_client, user_client, client
+    ):
+        response = moderator_client.get(DUPLICATES_URL)
+        assert response.status_code == 200
+        pairs = response.json()['results']
+        assert len(pairs) == 1, 'Похожи только два первых отзыва.'
+        pair = pairs[0]
+        assert pair['review']['id'] == reviews[1].pk
+        assert pair['duplicate']['id'] == reviews[0].pk
+        assert pair['duplicate']['title']['id'] == reviews[0].title_id
+        assert pair['similarity'] == 1
+        assert user_client.get(DUPLICATES_URL).status_code == 403
+        assert client.get(DUPLICATES_URL).status_code == 401
+
+        response = moderator_client.delete(f'{DUPLICATES_URL}{pair["id"]}/')
+        assert response.status_code == 204
+        reviews[1].save()
+        assert not moderator_client.get(DUPLICATES_URL).json()['results'], (
+            'Отклонённая модератором пара не должна возвращаться.'
+        )
+
+    def test_03_deleted_review_leaves_index(self, reviews):
+        reviews[0].delete()
+        assert not DuplicateReview.objects.exists()
+        assert not ReviewSignature.objects.filter(
+            review_id=reviews[0].pk
+        ).exists()
+        assert not ReviewBucket.objects.filter(
+            review_id=reviews[0].pk
+        ).exists()
+
+    def test_04_backfill_rebuilds_index(self, reviews):
+        signatures = dict(
+            ReviewSignature.objects.values_list('review_id', 'signature')
+        )
+        for model in (ReviewSignature, ReviewBucket, DuplicateReview):
+            model.objects.all().delete()
+        out = StringIO()
+        call_command(
+            'backfill_review_signatures',
+            '--workers=2',
+            '--batch-size=2',
+            stdout=out,
+        )
+        assert 'Подписано отзывов: 3, похожих пар: 1' in out.getvalue()
+        assert dict(
+            ReviewSignature.objects.values_list('review_id', 'signature')
+        ) == signatures
+        assert ReviewBucket.objects.count() == 16 * 3
+        assert DuplicateReview.objects.get().review_id == reviews[1].pk
@@ -0,0 +1,162 @@
+from http import HTTPStatus
+
+import pytest
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+
+from api_yamdb.db_routers import shard_for_title
+from reviews.models import Comment, Review, Title
+from tests.conftest import TEST_REVIEW_SHARDS
+from tests.utils import create_comments
+
+
+@pytest.fixture
+def review_shards(settings):
+    settings.REVIEW_SHARD_ALIASES = TEST_REVIEW_SHARDS
+    # Миграции тестовых баз снова включили проверку внешних ключей, а
+    # disable_shard_foreign_keys срабатывает только на новом соединении.
+    for alias in TEST_REVIEW_SHARDS:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = OFF')
+    return TEST_REVIEW_SHARDS
+
+
+@pytest.fixture
+def superuser_client(user_superuser):
+    client = Client()
+    client.force_login(user_superuser)
+    return client
+
+
+@pytest.fixture
+def content(review_shards, admin_client, admin, user_client, user):
+    return create_comments(
+        admin_client, {admin: admin_client, user: user_client}
+    )
+
+
+def title_url(title):
+    return f"/api/v1/titles/{title['id']}/"
+
+
+def stored(model, title_id):
+    # Отзывы и комментарии по базам: (шард произведения, остальные).
+    lookup = 'title_id' if model is Review else 'review__title_id'
+    shard = shard_for_title(title_id)
+    counts = {
+        alias: model.objects.using(alias).filter(
+            **{lookup: title_id}
+        ).count()
+        for alias in [DEFAULT_DB_ALIAS, *TEST_REVIEW_SHARDS]
+    }
+    return counts.pop(shard), sum(counts.values())
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+class Test29ShardedApi:
+
+    def test_01_content_is_written_to_title_shard(self, content, client):
+        comments, reviews, titles = content
+        title_id = titles[0]['id']
+        assert stored(Review, title_id) == (len(reviews), 0), (
+            'Отзывы должны записываться только в шард произведения.'
+        )
+        assert stored(Comment, title_id) == (len(comments), 0), (
+            'Комментарии должны записываться в шард произведения отзыва.'
+        )
+        reviews_url = f'{title_url(titles[0])}reviews/'
+        response = client.get(reviews_url)
+        assert response.status_code == HTTPStatus.OK
+        assert {r['id'] for r in response.json()['results']} == {
+            r['id'] for r in reviews
+        }
+        response = client.get(f"{reviews_url}{reviews[0]['id']}/comments/")
+        assert response.status_code == HTTPStatus.OK
+        assert {c['id'] for c in response.json()['results']} == {
+            c['id'] for c in comments
+        }
+        response = client.get('/api/v1/activity/')
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.json()['results']) == (
+            len(reviews) + len(comments)
+        ), 'Лента должна собираться из всех шардов.'
+        title = Title.objects.get(pk=title_id)
+        assert (title.review_count, title.score_total) == (len(reviews), 10)
+
+    def test_02_review_and_comment_delete(self, content, admin_client,
+                                          user_client):
+        comments, reviews, titles = content
+        title_id = titles[0]['id']
+        reviews_url = f'{title_url(titles[0])}reviews/'
+        response = user_client.delete(
+            f"{reviews_url}{reviews[0]['id']}/comments/{comments[1]['id']}/"
+        )
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert stored(Comment, title_id) == (len(comments) - 1, 0)
+        response = admin_client.delete(f"{reviews_url}{reviews[0]['id']}/")
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert stored(Review, title_id) == (len(reviews) - 1, 0)
+        assert stored(Comment, title_id) == (0, 0), (
+            'Комментарии удалённого отзыва должны удаляться в шарде.'
+        )
+        title = Title.objects.get(pk=title_id)
+        assert (title.review_count, title.score_total) == (1, 5)
+
+    @pytest.mark.parametrize('background', (False, True))
+    def test_03_title_delete(self, content, admin_client, client,
+                             background):
+        _, _, titles = content
+        title_id = titles[0]['id']
+        url = title_url(titles[0])
+        if background:
+            url = f'{url}?background=true'
+        response = admin_client.delete(url)
+        assert response.status_code in (
+            HTTPStatus.NO_CONTENT, HTTPStatus.ACCEPTED
+        )
+        call_command('run_deletions')
+        assert not Title.objects.filter(pk=title_id).exists()
+        assert stored(Review, title_id) == (0, 0), (
+            'Удаление произведения должно удалять его отзывы в шарде.'
+        )
+        assert stored(Comment, title_id) == (0, 0)
+        deleted = client.get(
+            '/api/v1/sync/', {'since': 1}
+        ).json()['deleted']
+        assert deleted['titles'] == [title_id]
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+class Test29ShardedAdmin:
+
+    @pytest.mark.parametrize('model', ('review', 'comment'))
+    def test_01_changelist_reads_selected_shard(self, content,
+                                                superuser_client, model):
+        comments, reviews, titles = content
+        shard = shard_for_title(titles[0]['id'])
+        objects = {'review': reviews, 'comment': comments}[model]
+        url = f'/admin/reviews/{model}/'
+        response = superuser_client.get(url, {'shard': shard, 'q': 'number'})
+        assert response.status_code == HTTPStatus.OK, (
+            'С шардами changelist должен читать шард из фильтра.'
+        )
+        assert response.context['cl'].result_count == len(objects)
+        for alias in review_shards_except(shard):
+            response = superuser_client.get(url, {'shard': alias})
+            assert response.status_code == HTTPStatus.OK
+            assert response.context['cl'].result_count == 0
+        assert superuser_client.get(url).status_code == HTTPStatus.OK, (
+            'Без выбранного шарда changelist должен открывать первый.'
+        )
+        for action in ('change', 'delete'):
+            response = superuser_client.get(
+                f"{url}{objects[0]['id']}/{action}/"
+            )
+            assert response.status_code == HTTPStatus.OK, (
+                'Объект должен находиться по id в любом шарде.'
+            )
+
+
+def review_shards_except(alias):
+    return [shard for shard in TEST_REVIEW_SHARDS if shard != alias]